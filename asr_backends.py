@@ -0,0 +1,108 @@
+# asr_backends.py
+"""
+Các bộ máy nhận diện giọng nói (ASR) dùng được cho pipeline phụ đề.
+
+Mỗi bộ máy có cùng giao diện: tai_mo_hinh, thiet_bi, phat_hien_ngon_ngu, phien_am. Kết quả phiên âm
+luôn là danh sách đoạn {"start", "end", "text"} (mốc giây tương đối với âm thanh truyền vào).
+openai-whisper là mặc định; faster-whisper (CTranslate2, lượng tử hóa int8) được dùng khi đã cài
+và nhanh hơn nhiều lần trên CPU. Thư viện của mỗi bộ máy chỉ được import khi thật sự dùng.
+"""
+import importlib.util
+import os
+
+import numpy as np
+
+BO_MAY_WHISPER = "whisper"
+BO_MAY_FASTER_WHISPER = "faster-whisper"
+BO_MAY_MAC_DINH = os.environ.get("ZENTASK_ASR_BACKEND", BO_MAY_WHISPER)
+TAN_SO_LAY_MAU = 16000
+
+
+class BoMayWhisper:
+    """openai-whisper chạy PyTorch (fp32 trên CPU, fp16 trên GPU)."""
+    ten = BO_MAY_WHISPER
+    ten_goi = "whisper"
+
+    def tai_mo_hinh(self, ten_mo_hinh, thiet_bi=None, so_luong=None):
+        if so_luong:
+            import torch
+            torch.set_num_threads(max(1, so_luong))
+        import whisper
+        return whisper.load_model(ten_mo_hinh, device=thiet_bi)  # thiet_bi None: tự chọn cuda nếu có
+
+    def thiet_bi(self, mo_hinh):
+        return str(mo_hinh.device)
+
+    def phat_hien_ngon_ngu(self, mo_hinh, am_thanh):
+        import whisper
+        mau = whisper.pad_or_trim(np.asarray(am_thanh[:30 * TAN_SO_LAY_MAU], dtype=np.float32))
+        mel = whisper.log_mel_spectrogram(mau, n_mels=mo_hinh.dims.n_mels).to(mo_hinh.device)
+        _, xac_suat = mo_hinh.detect_language(mel)
+        return max(xac_suat, key=xac_suat.get)
+
+    def phien_am(self, mo_hinh, am_thanh, ngon_ngu=None):
+        ket_qua = mo_hinh.transcribe(np.asarray(am_thanh, dtype=np.float32), language=ngon_ngu,
+                                     verbose=None, condition_on_previous_text=True)
+        return [{"start": float(doan["start"]), "end": float(doan["end"]), "text": doan["text"]}
+                for doan in ket_qua["segments"]]
+
+
+class BoMayFasterWhisper:
+    """
+    faster-whisper (CTranslate2). Trên CPU dùng trọng số int8, trên GPU dùng float16.
+    Giải mã tham lam (beam_size=1) như mặc định của openai-whisper để hai bộ máy so sánh được với nhau.
+    """
+    ten = BO_MAY_FASTER_WHISPER
+    ten_goi = "faster_whisper"
+
+    def tai_mo_hinh(self, ten_mo_hinh, thiet_bi=None, so_luong=None):
+        from faster_whisper import WhisperModel
+        thiet_bi = thiet_bi or ("cuda" if self._co_cuda() else "cpu")
+        kieu_tinh_toan = "int8" if thiet_bi == "cpu" else "float16"
+        return WhisperModel(ten_mo_hinh, device=thiet_bi, compute_type=kieu_tinh_toan, cpu_threads=so_luong or 0)
+
+    @staticmethod
+    def _co_cuda():
+        try:
+            import ctranslate2
+            return ctranslate2.get_cuda_device_count() > 0
+        except Exception:
+            return False
+
+    def thiet_bi(self, mo_hinh):
+        return str(getattr(mo_hinh.model, "device", "cpu"))
+
+    def phat_hien_ngon_ngu(self, mo_hinh, am_thanh):
+        # transcribe() phát hiện ngôn ngữ ngay khi gọi; các đoạn chỉ được giải mã khi duyệt generator
+        _, thong_tin = mo_hinh.transcribe(np.asarray(am_thanh[:30 * TAN_SO_LAY_MAU], dtype=np.float32))
+        return thong_tin.language
+
+    def phien_am(self, mo_hinh, am_thanh, ngon_ngu=None):
+        cac_doan, _ = mo_hinh.transcribe(np.asarray(am_thanh, dtype=np.float32), language=ngon_ngu,
+                                         beam_size=1, condition_on_previous_text=True)
+        return [{"start": float(doan.start), "end": float(doan.end), "text": doan.text} for doan in cac_doan]
+
+
+CAC_BO_MAY = {bo_may.ten: bo_may for bo_may in (BoMayWhisper(), BoMayFasterWhisper())}
+
+
+def da_cai_dat(ten_bo_may):
+    bo_may = CAC_BO_MAY.get(ten_bo_may)
+    return bo_may is not None and importlib.util.find_spec(bo_may.ten_goi) is not None
+
+
+def cac_bo_may_co_san():
+    """Tên các bộ máy đã cài thư viện, bộ máy mặc định đứng đầu."""
+    cac_ten = [ten for ten in CAC_BO_MAY if da_cai_dat(ten)]
+    return sorted(cac_ten, key=lambda ten: ten != BO_MAY_MAC_DINH)
+
+
+def lay_bo_may(ten_bo_may=None):
+    """Trả về bộ máy theo tên (None: mặc định). Tên lạ hoặc chưa cài thư viện thì nâng ValueError."""
+    ten_bo_may = ten_bo_may or BO_MAY_MAC_DINH
+    if ten_bo_may not in CAC_BO_MAY:
+        raise ValueError(f"Bộ máy nhận diện giọng nói không hợp lệ: {ten_bo_may} "
+                         f"(chọn một trong: {', '.join(CAC_BO_MAY)})")
+    if not da_cai_dat(ten_bo_may):
+        raise ValueError(f"Chưa cài thư viện '{CAC_BO_MAY[ten_bo_may].ten_goi}' cho bộ máy {ten_bo_may}.")
+    return CAC_BO_MAY[ten_bo_may]
@@ -0,0 +1,115 @@
+# bench_asr.py
+"""
+So sánh tốc độ các bộ máy nhận diện giọng nói (asr_backends) trên cùng một đoạn âm thanh.
+
+Với mỗi bộ máy và mô hình, đo thời gian tải mô hình và thời gian phiên âm qua đúng đường đi của
+pipeline phụ đề (phien_am_song_song), rồi tính hệ số thời gian thực RTF = thời gian phiên âm /
+độ dài âm thanh (RTF < 1 là nhanh hơn thời gian thực). Kết quả in dưới dạng JSON.
+
+Không truyền --input thì âm thanh được tạo bằng nguồn thử của ffmpeg (tiếng bíp trên nền nhiễu);
+với giọng nói thật, số đoạn và RTF sát thực tế hơn. Chạy từ thư mục gốc của dự án:
+    python benchmarks/bench_asr.py --input sample.mp4 --models base small --processes 1 4
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+THU_MUC_DU_AN = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def tao_am_thanh_thu(duong_dan, do_dai_giay):
+    """Tạo file WAV thử bằng lavfi của ffmpeg, không cần mạng hay file mẫu."""
+    subprocess.run([
+        "ffmpeg", "-nostdin", "-v", "error", "-y",
+        "-f", "lavfi", "-i", f"sine=frequency=220:beep_factor=4:duration={do_dai_giay}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.02:duration={do_dai_giay}",
+        "-filter_complex", "amix=inputs=2:duration=shortest",
+        "-ac", "1", "-ar", "16000", duong_dan
+    ], check=True)
+
+
+def do_mot_cau_hinh(am_thanh, bo_may, ten_mo_hinh, so_tien_trinh, so_lan):
+    from subtitle_transcribe import phien_am_song_song, TAN_SO_LAY_MAU
+    from whisper_models import lay_quan_ly_whisper
+
+    quan_ly = lay_quan_ly_whisper()
+    bat_dau = time.perf_counter()
+    quan_ly.lay_mo_hinh(ten_mo_hinh, bo_may)
+    thoi_gian_tai = time.perf_counter() - bat_dau
+
+    mau = []
+    cac_doan = []
+    for _ in range(so_lan):
+        bat_dau = time.perf_counter()
+        cac_doan = phien_am_song_song(am_thanh, ten_mo_hinh=ten_mo_hinh, so_tien_trinh=so_tien_trinh, bo_may=bo_may)
+        mau.append(time.perf_counter() - bat_dau)
+    quan_ly.giai_phong(ten_mo_hinh, bo_may)
+
+    do_dai_giay = len(am_thanh) / TAN_SO_LAY_MAU
+    tot_nhat = min(mau)
+    return {
+        "backend": bo_may,
+        "model": ten_mo_hinh,
+        "processes": so_tien_trinh,
+        "audio_s": round(do_dai_giay, 2),
+        "load_s": round(thoi_gian_tai, 3),
+        "transcribe_s": round(tot_nhat, 3),
+        "transcribe_mean_s": round(sum(mau) / len(mau), 3),
+        "rtf": round(tot_nhat / do_dai_giay, 4),
+        "segments": len(cac_doan),
+        "characters": sum(len(doan["text"].strip()) for doan in cac_doan)
+    }
+
+
+def main_benchmark():
+    sys.path.insert(0, THU_MUC_DU_AN)
+    from asr_backends import cac_bo_may_co_san
+    from subtitle_audio import trich_xuat_am_thanh
+
+    parser = argparse.ArgumentParser(description="Đo hệ số thời gian thực (RTF) của các bộ máy nhận diện giọng nói.")
+    parser.add_argument("--input", help="File âm thanh/video cần phiên âm (mặc định: âm thanh thử của ffmpeg)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Độ dài âm thanh thử (giây) khi không có --input")
+    parser.add_argument("--backends", nargs="+", default=cac_bo_may_co_san(),
+                        help="Các bộ máy cần đo (mặc định: mọi bộ máy đã cài)")
+    parser.add_argument("--models", nargs="+", default=["base"], help="Các mô hình cần đo (tiny, base, small...)")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1], help="Số tiến trình phiên âm song song")
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần phiên âm cho mỗi cấu hình (lấy lần nhanh nhất)")
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file thay vì stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="zentask_bench_asr_") as thu_muc:
+        duong_dan = args.input
+        if not duong_dan:
+            duong_dan = os.path.join(thu_muc, "synthetic.wav")
+            tao_am_thanh_thu(duong_dan, args.duration)
+        am_thanh = trich_xuat_am_thanh(duong_dan)
+
+        ket_qua = {
+            "benchmark": "asr",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "input": args.input or f"synthetic:{args.duration}s",
+            "results": []
+        }
+        for bo_may in args.backends:
+            for ten_mo_hinh in args.models:
+                for so_tien_trinh in args.processes:
+                    ket_qua["results"].append(
+                        do_mot_cau_hinh(am_thanh, bo_may, ten_mo_hinh, so_tien_trinh, max(1, args.repeat)))
+
+    du_lieu_json = json.dumps(ket_qua, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(du_lieu_json)
+    else:
+        print(du_lieu_json)
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,228 @@
+# bench_flashcard.py
+"""
+Đo hiệu năng FlashcardQuanLy và FlashcardHoc trên nền tảng offscreen của Qt.
+
+Tạo dữ liệu người dùng giả với bộ thẻ từ 1k đến 1M thẻ trong một thư mục tạm (thẻ chưa có
+mã ngôn ngữ như dữ liệu cũ), đo việc nạp file người dùng, load_flashcards, filter_flashcards,
+display_flashcards, evaluate_card và show_current_card, rồi in kết quả p50/p99 và bộ nhớ đỉnh
+dưới dạng JSON.
+
+Chạy từ thư mục gốc của dự án:
+    python benchmarks/bench_flashcard.py --sizes 1000 10000 --output bench_output.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+THU_MUC_DU_AN = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KICH_THUOC_MAC_DINH = [1000, 10000, 100000]
+TRANG_THAI = ["new", "known", "unknown"]
+
+
+def tao_tu_ngau_nhien(rng, do_dai_toi_thieu=3, do_dai_toi_da=12):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(do_dai_toi_thieu, do_dai_toi_da)))
+
+
+def tao_bo_the(rng, so_the):
+    return [{
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "front_text": tao_tu_ngau_nhien(rng),
+        "back_text": " ".join(tao_tu_ngau_nhien(rng) for _ in range(rng.randint(1, 4))),
+        "image_front_path": None,
+        "image_back_path": None,
+        "status": rng.choice(TRANG_THAI)
+        # Không có front_lang/back_lang như thẻ cũ: đo đúng chi phí nạp dữ liệu lúc đăng nhập
+    } for _ in range(so_the)]
+
+
+def tao_nguoi_dung(rng, ten, so_the):
+    return {
+        "username": ten,
+        "password": "bench",
+        "email": f"{ten}@bench.local",
+        "dob": "",
+        "phone": "",
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "flashcards": tao_bo_the(rng, so_the),
+        "study_methods": []
+    }
+
+
+def chuan_bi_thu_muc_lam_viec(so_the, so_nguoi_dung_phu, seed):
+    """Tạo thư mục tạm có ui/ (liên kết tới ui của dự án) và data/user.json giả."""
+    rng = random.Random(seed)
+    thu_muc = tempfile.mkdtemp(prefix="zentask_bench_")
+    os.symlink(os.path.join(THU_MUC_DU_AN, "ui"), os.path.join(thu_muc, "ui"))
+    os.makedirs(os.path.join(thu_muc, "data"))
+
+    nguoi_dung = [tao_nguoi_dung(rng, "bench", so_the)]
+    for i in range(so_nguoi_dung_phu):
+        nguoi_dung.append(tao_nguoi_dung(rng, f"user{i}", rng.randint(10, 200)))
+    with open(os.path.join(thu_muc, "data", "user.json"), "w", encoding="utf-8") as f:
+        json.dump(nguoi_dung, f, ensure_ascii=False)
+    return thu_muc, nguoi_dung[0]["id"]
+
+
+def phan_vi(mau_da_sap_xep, p):
+    """Phân vị theo thứ hạng gần nhất."""
+    if not mau_da_sap_xep:
+        return None
+    chi_so = max(0, min(len(mau_da_sap_xep) - 1, math.ceil(p / 100.0 * len(mau_da_sap_xep)) - 1))
+    return mau_da_sap_xep[chi_so]
+
+
+def do_thao_tac(ten, ham, so_lan, ngan_sach_giay, chuan_bi=None):
+    """Chạy ham nhiều lần, dừng sớm khi vượt ngân sách thời gian (nhưng luôn có ít nhất 3 mẫu)."""
+    mau = []
+    bat_dau_tong = time.perf_counter()
+    for i in range(so_lan):
+        if chuan_bi:
+            chuan_bi(i)
+        bat_dau = time.perf_counter()
+        ham(i)
+        mau.append((time.perf_counter() - bat_dau) * 1000.0)
+        if len(mau) >= 3 and time.perf_counter() - bat_dau_tong > ngan_sach_giay:
+            break
+
+    # Đo bộ nhớ cấp phát đỉnh ở một lần chạy riêng để tracemalloc không làm sai lệch thời gian
+    if chuan_bi:
+        chuan_bi(0)
+    tracemalloc.start()
+    ham(0)
+    _, dinh = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mau.sort()
+    return {
+        "operation": ten,
+        "samples": len(mau),
+        "p50_ms": round(phan_vi(mau, 50), 3),
+        "p99_ms": round(phan_vi(mau, 99), 3),
+        "mean_ms": round(sum(mau) / len(mau), 3),
+        "max_ms": round(mau[-1], 3),
+        "peak_alloc_kb": round(dinh / 1024.0, 1)
+    }
+
+
+def bo_nho_dinh_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    dinh = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS trả về byte, Linux trả về KB
+    return dinh // 1024 if sys.platform == "darwin" else dinh
+
+
+def chay_mot_kich_thuoc(main, so_the, args):
+    thu_muc, user_id = chuan_bi_thu_muc_lam_viec(so_the, args.extra_users, args.seed)
+    thu_muc_cu = os.getcwd()
+    os.chdir(thu_muc)
+    ket_qua = []
+    try:
+        ket_qua.append(do_thao_tac("load_user_database", lambda i: main.CoSoDuLieuNguoiDung(), args.repeat, args.budget))
+        db = main.CoSoDuLieuNguoiDung()
+        db.tai_du_lieu()
+        ket_qua.append(do_thao_tac(
+            "collect_missing_languages", lambda i: db.lay_van_ban_chua_co_ngon_ngu(user_id), args.repeat, args.budget
+        ))
+
+        quan_ly = main.FlashcardQuanLy(user_id, db)
+        ket_qua.append(do_thao_tac("load_flashcards", lambda i: quan_ly.load_flashcards(), args.repeat, args.budget))
+        ket_qua.append(do_thao_tac("display_flashcards", lambda i: quan_ly.display_flashcards(), args.repeat, args.budget))
+
+        rng = random.Random(args.seed)
+        tu_khoa = [quan_ly.flashcards[rng.randrange(len(quan_ly.flashcards))].front_text[:3] for _ in range(args.repeat)]
+        ket_qua.append(do_thao_tac(
+            "filter_flashcards",
+            lambda i: quan_ly.filter_flashcards(search_text=tu_khoa[i % len(tu_khoa)]),
+            args.repeat, args.budget
+        ))
+
+        the_hoc = list(quan_ly.flashcards)
+        hoc = main.FlashcardHoc(the_hoc, user_id, db)
+
+        def chon_the(i):
+            hoc.current_card_index = i % len(the_hoc)
+            hoc.is_front_side = (i % 2 == 0)
+
+        ket_qua.append(do_thao_tac("show_current_card", lambda i: hoc.show_current_card(), args.repeat, args.budget, chon_the))
+
+        # evaluate_card chuyển sang thẻ kế tiếp; không để chạm thẻ cuối vì sẽ bật hộp thoại "Hoàn thành"
+        so_lan_danh_gia = max(1, min(args.repeat, len(the_hoc) - 2))
+
+        def ve_the_dau(i):
+            hoc.current_card_index = i % so_lan_danh_gia
+
+        ket_qua.append(do_thao_tac(
+            "evaluate_card",
+            lambda i: hoc.evaluate_card(TRANG_THAI[i % len(TRANG_THAI)]),
+            so_lan_danh_gia, args.budget, ve_the_dau
+        ))
+
+        hoc.flip_overlay.stop_flip()
+        hoc.deleteLater()
+        quan_ly.deleteLater()
+    finally:
+        os.chdir(thu_muc_cu)
+        shutil.rmtree(thu_muc, ignore_errors=True)
+
+    for muc in ket_qua:
+        muc["size"] = so_the
+    return ket_qua, bo_nho_dinh_kb()
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark offscreen cho FlashcardQuanLy và FlashcardHoc.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=KICH_THUOC_MAC_DINH,
+                        help="Số thẻ trong bộ thẻ cần đo (ví dụ: 1000 10000 100000 1000000)")
+    parser.add_argument("--repeat", type=int, default=20, help="Số lần lặp tối đa cho mỗi thao tác")
+    parser.add_argument("--budget", type=float, default=30.0, help="Ngân sách thời gian (giây) cho mỗi thao tác")
+    parser.add_argument("--extra-users", type=int, default=5, help="Số người dùng phụ trong file dữ liệu")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file thay vì stdout")
+    args = parser.parse_args()
+
+    sys.path.insert(0, THU_MUC_DU_AN)
+    from PyQt6.QtWidgets import QApplication
+    import main
+
+    ung_dung = QApplication.instance() or QApplication(sys.argv)
+
+    ket_qua = {
+        "benchmark": "flashcard",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "qt_platform": os.environ.get("QT_QPA_PLATFORM"),
+        "repeat": args.repeat,
+        "results": [],
+        "peak_rss_kb": {}
+    }
+    for so_the in sorted(args.sizes):
+        cac_muc, dinh_rss = chay_mot_kich_thuoc(main, so_the, args)
+        ket_qua["results"].extend(cac_muc)
+        ket_qua["peak_rss_kb"][str(so_the)] = dinh_rss
+        ung_dung.processEvents()
+
+    du_lieu_json = json.dumps(ket_qua, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(du_lieu_json)
+    else:
+        print(du_lieu_json)
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,123 @@
+# bench_subtitles.py
+"""
+Đo thời gian từng giai đoạn của pipeline phụ đề (subtitles.BoTaoPhuDe) mà không cần mạng.
+
+Video thử được tạo bằng nguồn thử của ffmpeg (hình testsrc2, tiếng bíp trên nền nhiễu) và bản dịch
+dùng một hàm dịch giả có độ trễ cố định thay cho Google Translate. Bộ nhớ đệm phụ đề và bộ nhớ dịch
+nằm trong thư mục tạm nên lần chạy đầu luôn "nguội"; lần chạy với ngôn ngữ thứ hai dùng lại âm thanh
+và kết quả phiên âm như khi người dùng dịch lại cùng video. Mỗi lần chạy in các sự kiện "stage"
+(thời gian, số byte, RTF) dưới dạng JSON. Mô hình Whisper cần có sẵn trong bộ nhớ đệm của máy
+(vd: đã chạy bench_asr.py một lần). Chạy từ thư mục gốc của dự án:
+    python benchmarks/bench_subtitles.py --duration 60 --model tiny --mode soft burn
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+THU_MUC_DU_AN = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def tao_video_thu(duong_dan, do_dai_giay):
+    """Tạo video MP4 thử (H.264 + AAC) bằng lavfi của ffmpeg."""
+    subprocess.run([
+        "ffmpeg", "-nostdin", "-v", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size=640x360:rate=25:duration={do_dai_giay}",
+        "-f", "lavfi", "-i", f"sine=frequency=220:beep_factor=4:duration={do_dai_giay}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.02:duration={do_dai_giay}",
+        "-filter_complex", "[1:a][2:a]amix=inputs=2:duration=shortest[a]",
+        "-map", "0:v", "-map", "[a]",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", "50", "-c:a", "aac", "-shortest", duong_dan
+    ], check=True)
+
+
+def tao_ham_dich_gia(ma_ngon_ngu, do_tre_giay):
+    """Hàm dịch giả: chờ do_tre_giay như một yêu cầu mạng rồi gắn mã ngôn ngữ vào từng dòng."""
+    def dich(van_ban):
+        time.sleep(do_tre_giay)
+        return "\n".join(f"[{ma_ngon_ngu}] {dong}" for dong in van_ban.split("\n"))
+
+    return dich
+
+
+def chay_mot_lan(duong_dan_video, thu_muc_ra, ma_ngon_ngu, che_do, bo_may_asr, do_tre_giay):
+    from subtitles import BoTaoPhuDe
+    from subtitle_video import duoi_tep_dau_ra
+
+    ten = f"{che_do}_{ma_ngon_ngu}"
+    bo_tao = BoTaoPhuDe(
+        duong_dan_video, os.path.join(thu_muc_ra, ten + ".srt"),
+        os.path.join(thu_muc_ra, ten + duoi_tep_dau_ra(che_do, duong_dan_video)), ma_ngon_ngu,
+        che_do_dau_ra=che_do, bo_may_asr=bo_may_asr, ham_dich=tao_ham_dich_gia(ma_ngon_ngu, do_tre_giay)
+    )
+    bo_tao.chay()
+    return {"mode": che_do, "language": ma_ngon_ngu, "stages": bo_tao.cac_giai_doan}
+
+
+def main_benchmark():
+    sys.path.insert(0, THU_MUC_DU_AN)
+    from asr_backends import CAC_BO_MAY, BO_MAY_MAC_DINH
+    from subtitle_video import CAC_CHE_DO_DAU_RA
+    from whisper_models import lay_quan_ly_whisper
+
+    parser = argparse.ArgumentParser(description="Đo thời gian từng giai đoạn của pipeline phụ đề (không cần mạng).")
+    parser.add_argument("--input", help="Video cần xử lý (mặc định: video thử của ffmpeg)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Độ dài video thử (giây) khi không có --input")
+    parser.add_argument("--model", default="tiny", help="Mô hình Whisper (phải có sẵn trong bộ nhớ đệm của máy)")
+    parser.add_argument("--asr", choices=list(CAC_BO_MAY), default=BO_MAY_MAC_DINH, help="Bộ máy nhận diện giọng nói")
+    cac_che_do = [ma for ma, _ in CAC_CHE_DO_DAU_RA]
+    parser.add_argument("--mode", nargs="+", choices=cac_che_do, default=cac_che_do,
+                        help="Các chế độ ghép phụ đề cần đo")
+    parser.add_argument("--languages", nargs="+", default=["vi", "es"],
+                        help="Ngôn ngữ đích; từ ngôn ngữ thứ hai trở đi dùng lại kết quả phiên âm")
+    parser.add_argument("--translate-latency-ms", type=float, default=200.0,
+                        help="Độ trễ giả lập của mỗi yêu cầu dịch (mili giây)")
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file thay vì stdout")
+    args = parser.parse_args()
+
+    duong_dan_vao = os.path.abspath(args.input) if args.input else None
+    thu_muc_goc = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="zentask_bench_subtitles_") as thu_muc:
+        # data/ (bộ nhớ đệm phụ đề, bộ nhớ dịch) được tạo trong thư mục tạm, không đụng tới dữ liệu thật
+        os.chdir(thu_muc)
+        try:
+            duong_dan_video = duong_dan_vao
+            if not duong_dan_video:
+                duong_dan_video = os.path.join(thu_muc, "synthetic.mp4")
+                tao_video_thu(duong_dan_video, args.duration)
+            lay_quan_ly_whisper().ten_mo_hinh = args.model
+
+            ket_qua = {
+                "benchmark": "subtitles",
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "input": args.input or f"synthetic:{args.duration}s",
+                "model": args.model,
+                "asr_backend": args.asr,
+                "translate_latency_ms": args.translate_latency_ms,
+                "runs": []
+            }
+            for che_do in args.mode:
+                for ma_ngon_ngu in args.languages:
+                    ket_qua["runs"].append(chay_mot_lan(duong_dan_video, thu_muc, ma_ngon_ngu, che_do, args.asr,
+                                                        args.translate_latency_ms / 1000))
+        finally:
+            os.chdir(thu_muc_goc)
+
+    du_lieu_json = json.dumps(ket_qua, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(du_lieu_json)
+    else:
+        print(du_lieu_json)
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    main_benchmark()
@@ -0,0 +1,224 @@
+# flashcard_image_store.py
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+THU_MUC_ANH_FLASHCARD = os.path.join("data", "flashcard_images")
+KICH_THUOC_KHOI_DOC = 1024 * 1024
+THOI_GIAN_AN_TOAN_GIAY = 600  # Không xóa ảnh mới ghi trong 10 phút (có thể đang được chọn trong cửa sổ sửa)
+CHU_KY_DON_DEP_GIAY = 300
+MAU_TEN_ANH = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+def bam_tep(duong_dan):
+    """Tính SHA-256 của tệp theo từng khối, không đọc toàn bộ tệp vào bộ nhớ."""
+    bo_bam = hashlib.sha256()
+    with open(duong_dan, "rb") as f:
+        for khoi in iter(lambda: f.read(KICH_THUOC_KHOI_DOC), b""):
+            bo_bam.update(khoi)
+    return bo_bam.hexdigest()
+
+
+def _duoi_tep(ten_tep):
+    duoi = os.path.splitext(ten_tep)[1].lower().lstrip(".")
+    return duoi if duoi else "bin"
+
+
+class KhoAnhFlashcard:
+    """
+    Kho ảnh flashcard đánh địa chỉ theo nội dung: mỗi ảnh được lưu một lần duy nhất
+    với tên là mã băm SHA-256 của nội dung. Số tham chiếu được đếm từ các thẻ,
+    ảnh không còn thẻ nào dùng (và không được ghim) sẽ được luồng dọn dẹp xóa.
+    """
+    def __init__(self, thu_muc=THU_MUC_ANH_FLASHCARD, thoi_gian_an_toan=THOI_GIAN_AN_TOAN_GIAY):
+        # Đường dẫn tuyệt đối để luồng dọn dẹp không phụ thuộc thư mục làm việc hiện tại
+        self.thu_muc = os.path.abspath(thu_muc)
+        self.thoi_gian_an_toan = thoi_gian_an_toan
+        self._so_tham_chieu = {}
+        self._cac_nguon_du_lieu = {}  # khóa (vd: đường dẫn file người dùng) -> hàm trả về danh sách người dùng
+        self._da_ghim = {}  # tên ảnh -> số lần ghim (ảnh đã nhập nhưng thẻ chưa được lưu)
+        self._khoa = threading.Lock()
+        self._luong_don_dep = None
+        self._su_kien_dung = threading.Event()
+
+    def duong_dan_day_du(self, ten_anh):
+        return os.path.join(self.thu_muc, ten_anh)
+
+    def la_ten_trong_kho(self, ten_anh):
+        return bool(ten_anh) and MAU_TEN_ANH.match(ten_anh) is not None
+
+    def _danh_dau_vua_dung(self, duong_dan):
+        # Làm mới mtime để ảnh vừa được chọn lại không bị dọn trước khi thẻ được lưu
+        try:
+            os.utime(duong_dan, None)
+        except OSError:
+            pass
+
+    def luu_anh(self, duong_dan_nguon):
+        """
+        Lưu ảnh vào kho và trả về tên file (mã băm + đuôi).
+        Nếu ảnh cùng nội dung đã có thì không sao chép lại.
+        """
+        if not duong_dan_nguon or not os.path.exists(duong_dan_nguon):
+            return None
+
+        abs_nguon = os.path.abspath(duong_dan_nguon)
+        abs_thu_muc = os.path.abspath(self.thu_muc)
+        ten_nguon = os.path.basename(abs_nguon)
+        if os.path.dirname(abs_nguon) == abs_thu_muc and self.la_ten_trong_kho(ten_nguon):
+            self._danh_dau_vua_dung(abs_nguon)
+            return ten_nguon
+
+        ten_anh = f"{bam_tep(abs_nguon)}.{_duoi_tep(ten_nguon)}"
+        duong_dan_dich = self.duong_dan_day_du(ten_anh)
+        if os.path.exists(duong_dan_dich):
+            self._danh_dau_vua_dung(duong_dan_dich)
+            return ten_anh
+
+        os.makedirs(self.thu_muc, exist_ok=True)
+        # Ghi ra file tạm trong cùng thư mục rồi đổi tên để không bao giờ để lại ảnh ghi dở
+        fd, duong_dan_tam = tempfile.mkstemp(dir=self.thu_muc, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(abs_nguon, duong_dan_tam)
+            os.replace(duong_dan_tam, duong_dan_dich)
+        finally:
+            if os.path.exists(duong_dan_tam):
+                os.remove(duong_dan_tam)
+        return ten_anh
+
+    def luu_du_lieu_anh(self, du_lieu, duoi):
+        """Lưu ảnh đã có sẵn trong bộ nhớ (bytes) vào kho, trả về tên file."""
+        ten_anh = f"{hashlib.sha256(du_lieu).hexdigest()}.{duoi.lower().lstrip('.')}"
+        duong_dan_dich = self.duong_dan_day_du(ten_anh)
+        if os.path.exists(duong_dan_dich):
+            self._danh_dau_vua_dung(duong_dan_dich)
+            return ten_anh
+
+        os.makedirs(self.thu_muc, exist_ok=True)
+        fd, duong_dan_tam = tempfile.mkstemp(dir=self.thu_muc, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(du_lieu)
+            os.replace(duong_dan_tam, duong_dan_dich)
+        finally:
+            if os.path.exists(duong_dan_tam):
+                os.remove(duong_dan_tam)
+        return ten_anh
+
+    def dang_ky_nguon_du_lieu(self, khoa, nguon_du_lieu):
+        """
+        Đăng ký một hàm trả về danh sách người dùng (dữ liệu trong bộ nhớ).
+        Mỗi khóa chỉ giữ một nguồn: đăng ký lại cùng khóa sẽ thay nguồn cũ.
+        Ảnh được coi là còn dùng nếu bất kỳ nguồn nào còn tham chiếu tới nó.
+        """
+        with self._khoa:
+            self._cac_nguon_du_lieu[khoa] = nguon_du_lieu
+
+    def huy_dang_ky_nguon_du_lieu(self, khoa, nguon_du_lieu=None):
+        """Bỏ nguồn của khóa; có nguon_du_lieu thì chỉ bỏ khi đó vẫn là nguồn đang đăng ký (chưa bị thay)."""
+        with self._khoa:
+            if nguon_du_lieu is None or self._cac_nguon_du_lieu.get(khoa) == nguon_du_lieu:
+                self._cac_nguon_du_lieu.pop(khoa, None)
+
+    def dem_tham_chieu(self):
+        """Đếm lại số thẻ tham chiếu tới từng ảnh từ dữ liệu của tất cả người dùng."""
+        with self._khoa:
+            cac_nguon = list(self._cac_nguon_du_lieu.values())
+        so_tham_chieu = {}
+        for nguon_du_lieu in cac_nguon:
+            for user in list(nguon_du_lieu()):
+                for card in list(user.get("flashcards", [])):
+                    for khoa in ("image_front_path", "image_back_path"):
+                        ten_anh = card.get(khoa)
+                        if ten_anh:
+                            so_tham_chieu[ten_anh] = so_tham_chieu.get(ten_anh, 0) + 1
+        with self._khoa:
+            self._so_tham_chieu = so_tham_chieu
+        return so_tham_chieu
+
+    def ghim(self, ten_anh):
+        """Giữ ảnh chưa có thẻ nào tham chiếu (vd: vừa chọn trong cửa sổ sửa thẻ) không bị dọn tới khi bo_ghim."""
+        with self._khoa:
+            self._da_ghim[ten_anh] = self._da_ghim.get(ten_anh, 0) + 1
+
+    def bo_ghim(self, ten_anh):
+        with self._khoa:
+            so_lan = self._da_ghim.get(ten_anh, 0) - 1
+            if so_lan > 0:
+                self._da_ghim[ten_anh] = so_lan
+            else:
+                self._da_ghim.pop(ten_anh, None)
+
+    def tim_anh_mo_coi(self):
+        """Liệt kê các file trong kho không còn thẻ nào tham chiếu, không được ghim và đã quá thời gian an toàn."""
+        if not os.path.isdir(self.thu_muc):
+            return []
+        with self._khoa:
+            dang_dung = set(self._so_tham_chieu) | set(self._da_ghim)
+        bay_gio = time.time()
+        mo_coi = []
+        with os.scandir(self.thu_muc) as cac_muc:
+            for muc in cac_muc:
+                if not muc.is_file() or muc.name in dang_dung:
+                    continue
+                try:
+                    if bay_gio - muc.stat().st_mtime < self.thoi_gian_an_toan:
+                        continue
+                except OSError:
+                    continue
+                mo_coi.append(muc.name)
+        return mo_coi
+
+    def don_dep(self):
+        """Đếm lại tham chiếu rồi xóa ảnh mồ côi. Chưa có nguồn dữ liệu nào thì không xóa gì."""
+        with self._khoa:
+            if not self._cac_nguon_du_lieu:
+                return []
+        self.dem_tham_chieu()
+        da_xoa = []
+        for ten_anh in self.tim_anh_mo_coi():
+            try:
+                os.remove(self.duong_dan_day_du(ten_anh))
+                da_xoa.append(ten_anh)
+            except OSError as e:
+                print(f"Lỗi khi xóa ảnh mồ côi '{ten_anh}': {e}")
+        return da_xoa
+
+    def khoi_dong_don_dep(self, chu_ky=CHU_KY_DON_DEP_GIAY):
+        """Chạy luồng nền định kỳ dọn ảnh mồ côi. Gọi nhiều lần chỉ khởi động một luồng."""
+        if self._luong_don_dep and self._luong_don_dep.is_alive():
+            return
+
+        def vong_lap():
+            while not self._su_kien_dung.wait(chu_ky):
+                try:
+                    self.don_dep()
+                except Exception as e:
+                    print(f"Lỗi khi dọn dẹp kho ảnh: {e}")
+
+        self._su_kien_dung.clear()
+        self._luong_don_dep = threading.Thread(target=vong_lap, name="DonDepAnhFlashcard", daemon=True)
+        self._luong_don_dep.start()
+
+    def dung_don_dep(self):
+        """Dừng luồng dọn dẹp và chờ lượt dọn đang chạy (nếu có) xong."""
+        self._su_kien_dung.set()
+        if self._luong_don_dep is not None:
+            self._luong_don_dep.join()
+            self._luong_don_dep = None
+
+
+_kho_anh = None
+
+
+def lay_kho_anh():
+    """Trả về kho ảnh dùng chung cho toàn ứng dụng."""
+    global _kho_anh
+    if _kho_anh is None:
+        _kho_anh = KhoAnhFlashcard()
+    return _kho_anh
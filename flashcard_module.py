@@ -2,13 +2,16 @@
 import uuid
 
 class Flashcard:
-    def __init__(self, card_id=None, front_text="", back_text="", image_front_path=None, image_back_path=None, status="new"):
+    def __init__(self, card_id=None, front_text="", back_text="", image_front_path=None, image_back_path=None, status="new",
+                 front_lang=None, back_lang=None):
         self.id = card_id if card_id else str(uuid.uuid4())
         self.front_text = front_text
         self.back_text = back_text
         self.image_front_path = image_front_path
         self.image_back_path = image_back_path
         self.status = status # "new", "known", "unknown"
+        self.front_lang = front_lang # Mã ngôn ngữ phát hiện khi lưu thẻ, dùng để chọn giọng đọc
+        self.back_lang = back_lang
 
     def to_dict(self):
         return {
@@ -17,5 +20,7 @@ class Flashcard:
             "back_text": self.back_text,
             "image_front_path": self.image_front_path,
             "image_back_path": self.image_back_path,
-            "status": self.status
+            "status": self.status,
+            "front_lang": self.front_lang,
+            "back_lang": self.back_lang
         }
\ No newline at end of file
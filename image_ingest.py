@@ -0,0 +1,157 @@
+# image_ingest.py
+import os
+import uuid
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QBuffer, QByteArray, QIODevice, QSize, Qt, pyqtSignal
+from PyQt6.QtGui import QImageReader, QImageIOHandler
+
+from flashcard_image_store import lay_kho_anh
+
+KICH_THUOC_TOI_DA_ANH = 1600  # Cạnh dài tối đa (pixel) của ảnh lưu trong kho
+CHAT_LUONG_JPEG = 90
+DINH_DANG_GIU_NGUYEN = {b"png", b"jpeg", b"jpg"}
+
+
+class LoiNhapAnh(Exception):
+    pass
+
+
+def xu_ly_anh(duong_dan_nguon, kich_thuoc_toi_da=KICH_THUOC_TOI_DA_ANH):
+    """
+    Kiểm tra, xoay theo EXIF, thu nhỏ và mã hóa lại một ảnh rồi lưu vào kho ảnh.
+    Chạy được trên luồng phụ (chỉ dùng QImage, không dùng QPixmap). Trả về tên file trong kho.
+    """
+    if not os.path.isfile(duong_dan_nguon):
+        raise LoiNhapAnh(f"Không tìm thấy tệp ảnh: {duong_dan_nguon}")
+
+    reader = QImageReader(duong_dan_nguon)
+    reader.setAutoTransform(True)  # Áp dụng hướng xoay trong EXIF (ảnh chụp điện thoại)
+    if not reader.canRead():
+        raise LoiNhapAnh(f"Tệp không phải ảnh hợp lệ: {os.path.basename(duong_dan_nguon)}")
+
+    dinh_dang = bytes(reader.format()).lower()
+    kich_thuoc = reader.size()
+    can_thu_nho = kich_thuoc.isValid() and max(kich_thuoc.width(), kich_thuoc.height()) > kich_thuoc_toi_da
+    can_xoay = reader.transformation() != QImageIOHandler.Transformation.TransformationNone
+
+    # Ảnh đã nhỏ, đúng hướng và đúng định dạng thì lưu nguyên bản, không mã hóa lại
+    if not can_thu_nho and not can_xoay and dinh_dang in DINH_DANG_GIU_NGUYEN:
+        return lay_kho_anh().luu_anh(duong_dan_nguon)
+
+    if can_thu_nho:
+        # Giải mã thẳng ở kích thước nhỏ (JPEG giải mã nhanh hơn nhiều so với giải mã đủ rồi thu nhỏ)
+        reader.setScaledSize(kich_thuoc.scaled(
+            QSize(kich_thuoc_toi_da, kich_thuoc_toi_da), Qt.AspectRatioMode.KeepAspectRatio
+        ))
+
+    anh = reader.read()
+    if anh.isNull():
+        raise LoiNhapAnh(f"Không thể đọc ảnh '{os.path.basename(duong_dan_nguon)}': {reader.errorString()}")
+
+    co_trong_suot = anh.hasAlphaChannel()
+    duoi = "png" if co_trong_suot else "jpg"
+    du_lieu = QByteArray()
+    bo_dem = QBuffer(du_lieu)
+    bo_dem.open(QIODevice.OpenModeFlag.WriteOnly)
+    if not anh.save(bo_dem, "PNG" if co_trong_suot else "JPEG", -1 if co_trong_suot else CHAT_LUONG_JPEG):
+        raise LoiNhapAnh(f"Không thể mã hóa lại ảnh '{os.path.basename(duong_dan_nguon)}'.")
+    bo_dem.close()
+
+    return lay_kho_anh().luu_du_lieu_anh(bytes(du_lieu), duoi)
+
+
+class _TramTinHieu(QObject):
+    """
+    Chuyển kết quả từ thread pool về luồng giao diện. Chỉ có một trạm, sống suốt ứng dụng, nên tác vụ
+    không phải giữ BoNhapAnh (có thể đã bị xóa cùng cửa sổ khi ảnh còn đang xử lý).
+    """
+    tac_vu_xong = pyqtSignal(str, str, str)  # mã tác vụ, tên ảnh trong kho, thông báo lỗi
+
+
+_tram_tin_hieu = None
+
+
+def _lay_tram_tin_hieu():
+    # Tạo ở lần dùng đầu tiên trên luồng giao diện (BoNhapAnh.__init__)
+    global _tram_tin_hieu
+    if _tram_tin_hieu is None:
+        _tram_tin_hieu = _TramTinHieu()
+    return _tram_tin_hieu
+
+
+class TacVuNhapAnh(QRunnable):
+    def __init__(self, ma_tac_vu, duong_dan_nguon, kich_thuoc_toi_da, tram_tin_hieu):
+        super().__init__()
+        self.ma_tac_vu = ma_tac_vu
+        self.duong_dan_nguon = duong_dan_nguon
+        self.kich_thuoc_toi_da = kich_thuoc_toi_da
+        self.tram_tin_hieu = tram_tin_hieu
+
+    def run(self):
+        try:
+            ten_anh = xu_ly_anh(self.duong_dan_nguon, self.kich_thuoc_toi_da)
+            self.tram_tin_hieu.tac_vu_xong.emit(self.ma_tac_vu, ten_anh, "")
+        except Exception as e:
+            self.tram_tin_hieu.tac_vu_xong.emit(self.ma_tac_vu, "", str(e))
+
+
+class BoNhapAnh(QObject):
+    """
+    Nhập ảnh vào kho trên thread pool (mặc định dùng hết số nhân CPU).
+    Các tín hiệu được phát trên luồng giao diện. Ảnh đã vào kho nhưng chưa có thẻ nào dùng có thể bị
+    luồng dọn dẹp xóa sau thời gian an toàn, nên bên nhận anh_xong cần ghim ảnh (KhoAnhFlashcard.ghim)
+    tới khi thẻ được lưu hoặc bị bỏ.
+    """
+    tien_do = pyqtSignal(int, int)  # số ảnh đã xong, tổng số ảnh
+    anh_xong = pyqtSignal(str, str, str)  # mã tác vụ, đường dẫn nguồn, tên ảnh trong kho
+    anh_loi = pyqtSignal(str, str, str)  # mã tác vụ, đường dẫn nguồn, thông báo lỗi
+    hoan_tat = pyqtSignal()
+
+    def __init__(self, kich_thuoc_toi_da=KICH_THUOC_TOI_DA_ANH, thread_pool=None, parent=None):
+        super().__init__(parent)
+        self.kich_thuoc_toi_da = kich_thuoc_toi_da
+        self.thread_pool = thread_pool if thread_pool else QThreadPool.globalInstance()
+        self._dang_cho = {}
+        self._so_da_xong = 0
+        self._tong_so = 0
+        self._tram_tin_hieu = _lay_tram_tin_hieu()
+        # Qt tự ngắt kết nối khi đối tượng này bị xóa; trạm nhận kết quả của mọi BoNhapAnh nên lọc theo mã tác vụ
+        self._tram_tin_hieu.tac_vu_xong.connect(self._xu_ly_tac_vu_xong)
+
+    def dang_xu_ly(self):
+        return bool(self._dang_cho)
+
+    def huy(self):
+        """Bỏ qua kết quả của các ảnh đang xử lý (vd: cửa sổ đã đóng); tác vụ đang chạy vẫn chạy hết."""
+        self._dang_cho.clear()
+
+    def nhap(self, danh_sach_duong_dan):
+        """Đưa một hoặc nhiều ảnh vào hàng đợi, trả về danh sách mã tác vụ theo đúng thứ tự."""
+        if isinstance(danh_sach_duong_dan, str):
+            danh_sach_duong_dan = [danh_sach_duong_dan]
+        if not self._dang_cho:
+            self._so_da_xong = 0
+            self._tong_so = 0
+
+        cac_ma = []
+        for duong_dan in danh_sach_duong_dan:
+            ma_tac_vu = uuid.uuid4().hex
+            self._dang_cho[ma_tac_vu] = duong_dan
+            self._tong_so += 1
+            self.thread_pool.start(TacVuNhapAnh(ma_tac_vu, duong_dan, self.kich_thuoc_toi_da, self._tram_tin_hieu))
+            cac_ma.append(ma_tac_vu)
+        self.tien_do.emit(self._so_da_xong, self._tong_so)
+        return cac_ma
+
+    def _xu_ly_tac_vu_xong(self, ma_tac_vu, ten_anh, loi):
+        duong_dan_nguon = self._dang_cho.pop(ma_tac_vu, None)
+        if duong_dan_nguon is None:
+            return
+        self._so_da_xong += 1
+        if loi:
+            self.anh_loi.emit(ma_tac_vu, duong_dan_nguon, loi)
+        else:
+            self.anh_xong.emit(ma_tac_vu, duong_dan_nguon, ten_anh)
+        self.tien_do.emit(self._so_da_xong, self._tong_so)
+        if not self._dang_cho:
+            self.hoan_tat.emit()
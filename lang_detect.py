@@ -0,0 +1,29 @@
+# lang_detect.py
+import functools
+
+from langdetect import DetectorFactory, detect, LangDetectException
+
+from text_utils import chuan_hoa_van_ban
+
+# langdetect dùng ngẫu nhiên khi phân loại; cố định seed để cùng một câu luôn cho cùng kết quả
+DetectorFactory.seed = 0
+
+SO_MUC_NHO_TOI_DA = 4096
+
+
+@functools.lru_cache(maxsize=SO_MUC_NHO_TOI_DA)
+def _phat_hien_da_chuan_hoa(van_ban):
+    try:
+        return detect(van_ban)
+    except LangDetectException:
+        return None
+
+
+def phat_hien_ngon_ngu(van_ban):
+    """Trả về mã ngôn ngữ (vd: 'en', 'vi') của văn bản, hoặc None nếu không xác định được. Có ghi nhớ kết quả."""
+    if not van_ban:
+        return None
+    van_ban = chuan_hoa_van_ban(van_ban)
+    if not van_ban:
+        return None
+    return _phat_hien_da_chuan_hoa(van_ban)
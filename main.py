@@ -5,43 +5,57 @@ import sys
 import uuid
 import shutil
 import datetime
-import subprocess
 import urllib.parse
 import webbrowser
-import tempfile
 import asyncio
-import io 
+import threading
+import multiprocessing
+import concurrent.futures
 # === MODULE NGOÀI - AUDIO, VIDEO, NGÔN NGỮ ===
 import pygame
-import whisper
 import pytz
-import srt
-import pyttsx3
-from pydub import AudioSegment
 import edge_tts
 from deep_translator import GoogleTranslator
-from langdetect import detect, LangDetectException
 
 # === PyQt6 ===
 from PyQt6 import uic
 from PyQt6.QtCore import (
-    Qt, QTimer, QPoint, QThread, pyqtSignal, QPropertyAnimation, QRect,
-    QEasingCurve, QWaitCondition, QMutex, QUrl, QAbstractAnimation
+    Qt, QTimer, QPoint, QThread, pyqtSignal, QVariantAnimation,
+    QEasingCurve, QUrl, QAbstractAnimation
 )
 from PyQt6.QtGui import (
-    QPainter, QPen, QPixmap, QColor, QFont, QTextCursor
+    QPainter, QPen, QPixmap, QColor, QFont, QTextCursor, QTransform, QDesktopServices
 )
 from PyQt6.QtWidgets import (
-    QApplication, QMainWindow, QMessageBox, QDialog, QLabel,
+    QApplication, QMainWindow, QMessageBox, QDialog, QLabel, QWidget,
     QFileDialog, QColorDialog, QPushButton, QComboBox, QTextEdit,
     QProgressBar, QTableWidget, QTableWidgetItem, QGroupBox,
-    QHBoxLayout, QVBoxLayout, QHeaderView, QAbstractItemView
+    QHBoxLayout, QVBoxLayout, QHeaderView, QAbstractItemView, QListWidgetItem
 )
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 
 # === MODULE CỤC BỘ ===
 from data_json import tai_du_lieu_json, ghi_du_lieu_json  # quản lý file JSON
 from flashcard_module import Flashcard  # quản lý flashcard
+from flashcard_image_store import lay_kho_anh  # kho ảnh flashcard theo mã băm
+from lang_detect import phat_hien_ngon_ngu  # phát hiện ngôn ngữ có ghi nhớ, kết quả cố định
+from image_ingest import BoNhapAnh  # xử lý ảnh trên thread pool
+from tts_cache import lay_bo_nho_dem_tts  # bộ nhớ đệm âm thanh TTS trên đĩa
+from tts_audio import BoDemAmThanh, TrinhPhatLuongMp3, tao_sound_tu_mp3  # giải mã và phát âm thanh TTS trong bộ nhớ
+from offline_tts import DongCoDocOffline  # engine pyttsx3 dùng chung khi không có mạng
+from whisper_models import lay_quan_ly_whisper  # giữ mô hình Whisper trong bộ nhớ giữa các video
+from asr_backends import cac_bo_may_co_san  # các bộ máy nhận diện giọng nói đã cài
+from translation_memory import lay_bo_nho_dich  # bộ nhớ dịch SQLite dùng chung
+from subtitle_jobs import (  # hàng đợi việc tạo phụ đề lưu trên đĩa
+    lay_hang_doi_phu_de, TRANG_THAI_CHO, TRANG_THAI_DANG_CHAY, TRANG_THAI_TAM_DUNG,
+    TRANG_THAI_XONG, TRANG_THAI_LOI, TRANG_THAI_DA_HUY, CAC_TRANG_THAI_KET_THUC
+)
+from subtitle_video import (  # lệnh ffmpeg ghép phụ đề mềm / ghép cứng
+    CHE_DO_PHU_DE_MEM, CAC_CHE_DO_DAU_RA, CAC_PRESET_GHEP_CUNG, PRESET_GHEP_CUNG_MAC_DINH,
+    duoi_tep_dau_ra, tao_xem_truoc
+)
+from subtitles import BoTaoPhuDe, ma_ngon_ngu, mo_ta_loi, SU_KIEN_TIEN_DO, SU_KIEN_NHAT_KY, SU_KIEN_GIAI_DOAN  # pipeline phụ đề không dùng Qt
+from tts_prepare import chuan_bi_am_thanh, SO_YEU_CAU_DONG_THOI, KHOANG_CACH_TOI_THIEU_GIAY  # tổng hợp trước âm thanh
 
 
 class ProcessingThread(QThread):
@@ -50,144 +64,54 @@ class ProcessingThread(QThread):
     log_message = pyqtSignal(str)
     processing_finished = pyqtSignal(str) # Gửi đường dẫn video đầu ra khi xong
     processing_failed = pyqtSignal(str)
+    processing_cancelled = pyqtSignal()
+    stage_timing = pyqtSignal(object) # dict thời gian/byte/RTF của một giai đoạn
 
-    def __init__(self, video_path, output_srt_path, output_video_path, selected_language, parent=None):
+    def __init__(self, video_path, output_srt_path, output_video_path, selected_language,
+                 output_mode=CHE_DO_PHU_DE_MEM, burn_preset=PRESET_GHEP_CUNG_MAC_DINH, asr_backend=None, parent=None):
         super().__init__(parent)
         self.video_path = video_path
         self.output_srt_path = output_srt_path
         self.output_video_path = output_video_path
         self.selected_language = selected_language
-        # Đường dẫn cho file âm thanh tạm thời
-        self.temp_audio_path = os.path.join(os.path.dirname(output_video_path), "temp_audio.mp3")
+        self.output_mode = output_mode
+        self.burn_preset = burn_preset
+        self.asr_backend = asr_backend
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """Yêu cầu dừng xử lý; tiến trình ffmpeg và các cửa sổ Whisper chưa chạy bị hủy, không chặn luồng gọi."""
+        self._cancel_event.set()
 
     def run(self):
+        # Toàn bộ pipeline nằm trong subtitles.BoTaoPhuDe (không dùng Qt, chạy được từ dòng lệnh);
+        # luồng này chỉ chuyển sự kiện tiến độ/nhật ký thành tín hiệu Qt
         try:
-            self.log_message.emit("Bắt đầu xử lý video...")
-            self.progress_updated.emit(5)
-
-            # 1. Trích xuất âm thanh từ video bằng FFmpeg
-            self.log_message.emit("Trích xuất âm thanh từ video bằng FFmpeg...")
-            self.progress_updated.emit(10)
-            
-            ffmpeg_extract_audio_command = [
-                "ffmpeg",
-                "-i", self.video_path,
-                "-q:a", "0", # Chất lượng âm thanh cao nhất (lossless)
-                "-map", "a", # Chỉ trích xuất luồng âm thanh (audio stream)
-                "-y", # Ghi đè file nếu đã tồn tại
-                self.temp_audio_path
-            ]
-            
-            # Sử dụng check=True để tự động nâng lỗi nếu lệnh thất bại
-            subprocess.run(ffmpeg_extract_audio_command, capture_output=True, text=True, check=True)
-            self.log_message.emit("Đã trích xuất âm thanh thành công.")
-            self.progress_updated.emit(20)
-
-            # 2. Nhận diện giọng nói bằng Whisper
-            self.log_message.emit("Nhận diện giọng nói bằng Whisper (quá trình này có thể mất thời gian)...")
-            self.progress_updated.emit(30)
-            # Có thể truyền device='cuda' nếu có GPU để tăng tốc
-            model = whisper.load_model("base") # Bạn có thể chọn "small", "medium", "large"
-            result = model.transcribe(self.temp_audio_path, verbose=False) 
-            segments = result["segments"]
-            self.log_message.emit("Đã nhận diện giọng nói.")
-            self.progress_updated.emit(50)
-
-            # 3. Dịch phụ đề (nếu ngôn ngữ được chọn không phải tiếng Anh)
-            translated_segments = []
-            if self.selected_language != "English":
-                self.log_message.emit(f"Dịch phụ đề sang {self.selected_language}...")
-                self.progress_updated.emit(60)
-                translator = GoogleTranslator(source='auto', target=self.map_language_to_code(self.selected_language))
-
-                for i, segment in enumerate(segments):
-                    try:
-                        translated_text = translator.translate(segment["text"])
-                        translated_segments.append({
-                            "start": segment["start"],
-                            "end": segment["end"],
-                            "text": translated_text if translated_text else segment["text"] # Đảm bảo có nội dung
-                        })
-                    except Exception as translate_err:
-                        self.log_message.emit(f"Cảnh báo: Không thể dịch đoạn '{segment['text']}'. Lỗi: {translate_err}")
-                        translated_segments.append(segment) # Giữ nguyên bản gốc nếu dịch lỗi
-                    # Cập nhật tiến độ dịch
-                    self.progress_updated.emit(60 + int(20 * (i + 1) / len(segments)))
-                self.log_message.emit("Đã dịch phụ đề.")
-            else:
-                self.log_message.emit("Ngôn ngữ là Tiếng Anh, không cần dịch.")
-                translated_segments = segments
-            self.progress_updated.emit(80)
-
-            # 4. Tạo file SRT
-            self.log_message.emit("Tạo file SRT...")
-            self.progress_updated.emit(85)
-            subtitles = []
-            for i, segment in enumerate(translated_segments):
-                # Sửa lỗi: Chuyển đổi trực tiếp giây sang timedelta
-                start_timedelta = datetime.timedelta(seconds=segment["start"])
-                end_timedelta = datetime.timedelta(seconds=segment["end"])
-                subtitles.append(srt.Subtitle(
-                    index=i+1,
-                    start=start_timedelta,
-                    end=end_timedelta,
-                    content=segment["text"].strip()
-                ))
-
-            with open(self.output_srt_path, "w", encoding="utf-8") as f:
-                f.write(srt.compose(subtitles))
-            self.log_message.emit(f"Đã tạo file SRT: {os.path.basename(self.output_srt_path)}")
-            self.progress_updated.emit(90)
-
-            # 5. Ghép phụ đề vào video bằng FFmpeg
-            self.log_message.emit("Ghép phụ đề vào video (quá trình này có thể mất thời gian)...")
-            self.progress_updated.emit(95)
-
-            # Đảm bảo đường dẫn tuyệt đối cho FFmpeg
-            input_video_abs = os.path.abspath(self.video_path)
-            output_video_abs = os.path.abspath(self.output_video_path)
-            srt_abs = os.path.abspath(self.output_srt_path)
-
-            # Quan trọng: Trên Windows, đường dẫn phụ đề trong -vf phải dùng dấu /
-            # hoặc escaped backslashes. os.sep là '\' trên Windows.
-            formatted_srt_path_for_ffmpeg = srt_abs.replace(os.sep, '/')
-
-            ffmpeg_command = [
-                "ffmpeg",
-                "-i", input_video_abs,
-                "-vf", f"subtitles='{formatted_srt_path_for_ffmpeg}'",
-                "-c:v", "libx264",
-                "-preset", "medium", # Có thể dùng "fast" hoặc "medium" tùy nhu cầu
-                "-crf", "23", # Chất lượng (thấp hơn = tốt hơn, lớn hơn = nén nhiều hơn)
-                "-c:a", "copy", # Sao chép luồng âm thanh gốc mà không mã hóa lại
-                "-y", # Ghi đè file đầu ra nếu đã tồn tại
-                output_video_abs
-            ]
-            
-            process = subprocess.run(ffmpeg_command, capture_output=True, text=True, check=True)
-            # Bạn có thể log stderr/stdout của ffmpeg để debug nếu cần
-            # self.log_message.emit(f"FFmpeg stdout:\n{process.stdout}")
-            # self.log_message.emit(f"FFmpeg stderr:\n{process.stderr}")
-            self.log_message.emit("Lệnh FFmpeg đã chạy hoàn tất để ghép phụ đề.")
-
-            self.log_message.emit("Đã ghép phụ đề vào video.")
-            self.progress_updated.emit(100)
-            self.processing_finished.emit(self.output_video_path)
-
-        except subprocess.CalledProcessError as e:
-            error_message = f"Lỗi FFmpeg: Lệnh: {' '.join(e.cmd)}\nStderr: {e.stderr}"
-            self.log_message.emit(error_message)
-            self.processing_failed.emit(error_message)
+            subtitle_job = BoTaoPhuDe(
+                self.video_path, self.output_srt_path, self.output_video_path,
+                self.map_language_to_code(self.selected_language),
+                che_do_dau_ra=self.output_mode, preset_ghep_cung=self.burn_preset,
+                bao_su_kien=self._on_pipeline_event, da_huy=self._cancel_event,
+                bo_may_asr=self.asr_backend
+            )
+            output_path = subtitle_job.chay()
+            self.processing_finished.emit(output_path)
+        except concurrent.futures.CancelledError:
+            self.log_message.emit("Đã dừng xử lý.")
+            self.processing_cancelled.emit()
         except Exception as e:
-            error_message = f"Đã xảy ra lỗi trong quá trình xử lý: {type(e).__name__}: {e}"
+            error_message = mo_ta_loi(e)
             self.log_message.emit(error_message)
             self.processing_failed.emit(error_message)
-        finally:
-            # Dọn dẹp file audio tạm thời
-            if os.path.exists(self.temp_audio_path):
-                os.remove(self.temp_audio_path)
-                self.log_message.emit(f"Đã xóa file audio tạm thời: {os.path.basename(self.temp_audio_path)}")
-                
+
+    def _on_pipeline_event(self, event):
+        if event["type"] == SU_KIEN_TIEN_DO:
+            self.progress_updated.emit(event["percent"])
+        elif event["type"] == SU_KIEN_NHAT_KY:
+            self.log_message.emit(event["message"])
+        elif event["type"] == SU_KIEN_GIAI_DOAN:
+            self.stage_timing.emit({key: value for key, value in event.items() if key != "type"})
+
     def format_timestamp(self, seconds):
         """Định dạng thời gian từ giây sang HH:MM:SS,ms cho file SRT. (Không còn dùng trực tiếp để tạo Subtitle)"""
         milliseconds = int((seconds - int(seconds)) * 1000)
@@ -198,18 +122,45 @@ class ProcessingThread(QThread):
 
     def map_language_to_code(self, lang_name):
         """Ánh xạ tên ngôn ngữ sang mã ISO 639-1 cho DeepTranslator."""
-        lang_map = {
-            "English": "en",
-            "Tiếng Việt": "vi",
-            "Español": "es",
-            "Français": "fr",
-            "Deutsch": "de",
-            "中文": "zh-CN", # Mã tiếng Trung giản thể cho GoogleTranslator
-            # Thêm các ngôn ngữ khác nếu cần
-        }
-        return lang_map.get(lang_name, "en") # Mặc định là tiếng Anh nếu không tìm thấy
+        return ma_ngon_ngu(lang_name) # ValueError nếu ngôn ngữ chưa hỗ trợ
+
+class PreviewThread(QThread):
+    """Ghép cứng một đoạn ngắn của video với file SRT đã có (kể cả SRT đang được ghi dần) để xem trước."""
+
+    preview_ready = pyqtSignal(str)
+    preview_failed = pyqtSignal(str)
+
+    def __init__(self, video_path, srt_path, output_path, timestamp, parent=None):
+        super().__init__(parent)
+        self.video_path = video_path
+        self.srt_path = srt_path
+        self.output_path = output_path
+        self.timestamp = timestamp
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def run(self):
+        try:
+            tao_xem_truoc(self.video_path, self.srt_path, self.output_path, self.timestamp,
+                          da_huy=self._cancel_event)
+            self.preview_ready.emit(self.output_path)
+        except concurrent.futures.CancelledError:
+            pass
+        except Exception as e:
+            self.preview_failed.emit(mo_ta_loi(e))
 
 class SubtitleDialog(QDialog):
+    JOB_STATUS_LABELS = {
+        TRANG_THAI_CHO: "Đang chờ",
+        TRANG_THAI_DANG_CHAY: "Đang xử lý",
+        TRANG_THAI_TAM_DUNG: "Tạm dừng",
+        TRANG_THAI_XONG: "Hoàn tất",
+        TRANG_THAI_LOI: "Lỗi",
+        TRANG_THAI_DA_HUY: "Đã hủy",
+    }
+
     def __init__(self):
         super().__init__()
 
@@ -218,20 +169,25 @@ class SubtitleDialog(QDialog):
         self.setWindowTitle("Ứng Dụng Tạo Phụ Đề Video")
 
         self.current_video_path = None
+        self.selected_video_paths = []
         self.final_output_video_path = None
-        self.temp_dir = "temp_subtitle_files"
-
-        # Tạo thư mục tạm nếu chưa tồn tại
-        if not os.path.exists(self.temp_dir):
-            os.makedirs(self.temp_dir)
 
-        self.generated_srt_path = os.path.join(self.temp_dir, "generated_output_temp.srt")
-        self.temp_output_video_path = os.path.join(self.temp_dir, "vietsub_temp.mp4")
+        # Hàng đợi việc lưu trên đĩa (data/subtitle_jobs.json); mỗi việc có thư mục làm việc riêng
+        self.job_queue = lay_hang_doi_phu_de()
+        self.job_threads = {} # id việc -> ProcessingThread đang chạy
 
         # --- Kết nối các tín hiệu với các khe ---
         self.btn_select_video.clicked.connect(self.select_video_file)
         self.btn_process.clicked.connect(self.start_processing)
         self.btn_download.clicked.connect(self.download_output_video)
+        self.btn_pause_job.clicked.connect(self.pause_selected_job)
+        self.btn_resume_job.clicked.connect(self.resume_selected_job)
+        self.btn_cancel_job.clicked.connect(self.cancel_selected_job)
+        self.btn_remove_job.clicked.connect(self.remove_selected_job)
+        self.btn_clear_finished.clicked.connect(self.clear_finished_jobs)
+        self.list_jobs.currentRowChanged.connect(self._update_job_buttons)
+        self.btn_preview.clicked.connect(self.preview_selected_job)
+        self.preview_thread = None
 
         # Cài đặt ban đầu cho các widget
         self.btn_download.setEnabled(False)
@@ -242,6 +198,17 @@ class SubtitleDialog(QDialog):
         # Thêm các ngôn ngữ vào ComboBox
         self.cb_language.addItems(["English", "Tiếng Việt", "Español", "Français", "Deutsch", "中文"])
 
+        # Chế độ đầu ra: mặc định phụ đề mềm; preset chỉ dùng khi ghép cứng
+        for mode, label in CAC_CHE_DO_DAU_RA:
+            self.cb_output_mode.addItem(label, mode)
+        self.cb_burn_preset.addItems(list(CAC_PRESET_GHEP_CUNG))
+        self.cb_burn_preset.setCurrentText(PRESET_GHEP_CUNG_MAC_DINH)
+        self.cb_output_mode.currentIndexChanged.connect(self._update_burn_preset_state)
+        self._update_burn_preset_state()
+
+        # Bộ máy nhận diện giọng nói: chỉ liệt kê các bộ máy đã cài, mặc định đứng đầu
+        self.cb_asr_backend.addItems(cac_bo_may_co_san())
+
         # Kiểm tra xem txt_log có tồn tại trong UI không
         if hasattr(self, 'txt_log'):
             self.txt_log.setReadOnly(True)
@@ -251,36 +218,47 @@ class SubtitleDialog(QDialog):
             self.txt_log = QTextEdit(self)
             self.txt_log.setReadOnly(True) # Đảm bảo nó là chỉ đọc
 
-        self.processing_thread = None
+        self.spin_concurrency.setValue(self.job_queue.so_viec_dong_thoi)
+        self.spin_concurrency.valueChanged.connect(self._on_concurrency_changed)
+
+        # Tải trước mô hình Whisper trong nền để lúc bấm "Bắt đầu" có thể nhận diện ngay
+        lay_quan_ly_whisper().tai_truoc_nen()
+
+        # Hiển thị các việc còn lại từ lần trước và chạy tiếp các việc đang chờ
+        self._refresh_job_list()
+        self._schedule_jobs()
+
+    def _update_burn_preset_state(self):
+        self.cb_burn_preset.setEnabled(self.cb_output_mode.currentData() != CHE_DO_PHU_DE_MEM)
 
     def select_video_file(self):
-        """Mở hộp thoại chọn file video."""
+        """Mở hộp thoại chọn một hoặc nhiều file video."""
         file_dialog = QFileDialog()
         video_filters = "Video Files (*.mp4 *.avi *.mkv *.mov);;All Files (*)"
-        file_path, _ = file_dialog.getOpenFileName(
+        file_paths, _ = file_dialog.getOpenFileNames(
             self,
             "Chọn Video",
             "", # Thư mục mặc định
             video_filters
         )
 
-        if file_path:
-            self.current_video_path = file_path
-            QMessageBox.information(self, "Thông báo", f"Đã chọn video:\n{os.path.basename(file_path)}")
-            self.log_message(f"Đã tải video: {os.path.basename(file_path)}")
-            
+        if file_paths:
+            self.selected_video_paths = file_paths
+            self.current_video_path = file_paths[0]
+            names = "\n".join(os.path.basename(path) for path in file_paths)
+            QMessageBox.information(self, "Thông báo", f"Đã chọn {len(file_paths)} video:\n{names}")
+            self.txt_log.clear() # Xóa log cũ
+            self.log_message(f"Đã tải {len(file_paths)} video.")
+
             self.btn_process.setEnabled(True)
             self.cb_language.setEnabled(True)
-            self.btn_download.setEnabled(False) # Reset nút download
-            self.progress_bar.setValue(0)
-            self.txt_log.clear() # Xóa log cũ
         else:
             QMessageBox.warning(self, "Cảnh báo", "Bạn chưa chọn file video nào.")
+            self.selected_video_paths = []
             self.current_video_path = None
-            
+
             self.btn_process.setEnabled(False)
             self.cb_language.setEnabled(False)
-            self.btn_download.setEnabled(False)
             self.log_message("Chưa có video nào được chọn.")
 
     def log_message(self, message):
@@ -293,67 +271,259 @@ class SubtitleDialog(QDialog):
             print(f"Log: {message}") # In ra console nếu không có txt_log
 
     def start_processing(self):
-        """Bắt đầu quá trình xử lý trong một luồng riêng."""
-        if not self.current_video_path or not os.path.exists(self.current_video_path):
+        """Đưa các video đã chọn vào hàng đợi với ngôn ngữ và chế độ đầu ra hiện tại."""
+        video_paths = [path for path in self.selected_video_paths if os.path.exists(path)]
+        if not video_paths:
             QMessageBox.warning(self, "Lỗi", "Vui lòng chọn video trước khi xử lý.")
             return
 
-        # Vô hiệu hóa nút để tránh xử lý trùng lặp
+        for video_path in video_paths:
+            self.job_queue.them_viec(
+                video_path,
+                self.cb_language.currentText(),
+                self.cb_output_mode.currentData(),
+                self.cb_burn_preset.currentText(),
+                self.cb_asr_backend.currentText() or None
+            )
+        self.log_message(f"Đã thêm {len(video_paths)} video vào hàng đợi.")
+
+        # Tránh thêm trùng khi bấm lại; chọn video mới để thêm việc khác
+        self.selected_video_paths = []
         self.btn_process.setEnabled(False)
-        self.btn_download.setEnabled(False)
-        self.progress_bar.setValue(0)
-        self.log_message("Đang chuẩn bị quá trình xử lý...")
-
-        # Khởi tạo và kết nối luồng xử lý
-        self.processing_thread = ProcessingThread(
-            video_path=self.current_video_path,
-            output_srt_path=self.generated_srt_path,
-            output_video_path=self.temp_output_video_path,
-            selected_language=self.cb_language.currentText()
-        )
-        self.processing_thread.progress_updated.connect(self.progress_bar.setValue)
-        self.processing_thread.log_message.connect(self.log_message)
-        self.processing_thread.processing_finished.connect(self._on_processing_finished)
-        self.processing_thread.processing_failed.connect(self._on_processing_failed)
+        self._refresh_job_list()
+        self._schedule_jobs()
 
-        # Bắt đầu luồng
-        self.processing_thread.start()
+    # --- Hàng đợi việc ---
 
-    def _on_processing_finished(self, output_video_path):
-        """Hàm được gọi khi luồng xử lý hoàn tất thành công."""
-        self.log_message("Xử lý hoàn tất!")
+    def _schedule_jobs(self):
+        """Chạy các việc đang chờ cho tới khi đủ số việc đồng thời."""
+        while True:
+            job = self.job_queue.lay_viec_ke_tiep()
+            if job is None:
+                break
+            self._start_job(job)
+        self._refresh_job_list()
+
+    def _start_job(self, job):
+        job_id = job["id"]
+        output_video_path = os.path.join(
+            job["work_dir"], "output" + duoi_tep_dau_ra(job["output_mode"], job["video_path"])
+        )
+        name = os.path.basename(job["video_path"])
+        self.log_message(f"Bắt đầu xử lý: {name} ({job['language']})")
+
+        thread = ProcessingThread(
+            video_path=job["video_path"],
+            output_srt_path=job["srt_path"],
+            output_video_path=output_video_path,
+            selected_language=job["language"],
+            output_mode=job["output_mode"],
+            burn_preset=job["burn_preset"],
+            asr_backend=job.get("asr_backend") # Việc tạo từ phiên bản cũ không có trường này
+        )
+        thread.progress_updated.connect(lambda value, job_id=job_id: self._on_job_progress(job_id, value))
+        thread.log_message.connect(lambda message, name=name: self.log_message(f"[{name}] {message}"))
+        thread.processing_finished.connect(lambda path, job_id=job_id: self._on_processing_finished(job_id, path))
+        thread.processing_failed.connect(lambda message, job_id=job_id: self._on_processing_failed(job_id, message))
+        thread.stage_timing.connect(lambda stage, job_id=job_id: self._on_stage_timing(job_id, stage))
+        thread.finished.connect(lambda job_id=job_id: self._on_job_thread_finished(job_id))
+        self.job_threads[job_id] = thread
+        thread.start()
+
+    def _on_job_progress(self, job_id, value):
+        # Tiến độ chỉ ghi xuống đĩa cùng các lần đổi trạng thái, không ghi file ở mỗi phần trăm
+        self.job_queue.cap_nhat(job_id, luu_ngay=False, progress=value)
+        if self._selected_job_id() in (job_id, None):
+            self.progress_bar.setValue(value)
+        self._refresh_job_list()
+
+    def _on_stage_timing(self, job_id, stage):
+        # Lưu cùng việc (ghi xuống đĩa ở lần đổi trạng thái kế tiếp) để so sánh các lần chạy
+        job = self.job_queue.lay_viec(job_id)
+        if job is None:
+            return
+        metrics = job.get("metrics", []) + [stage]
+        self.job_queue.cap_nhat(job_id, luu_ngay=False, metrics=metrics)
+        if stage["stage"] == "total":
+            summary = ", ".join(f"{item['stage']} {item['seconds']:.1f}s" for item in metrics
+                                if item["stage"] != "total")
+            self.log_message(f"[{os.path.basename(job['video_path'])}] Thời gian: {summary} "
+                             f"(tổng {stage['seconds']:.1f}s)")
+
+    def _on_processing_finished(self, job_id, output_video_path):
+        """Hàm được gọi khi một việc hoàn tất thành công."""
+        job = self.job_queue.cap_nhat(job_id, status=TRANG_THAI_XONG, progress=100, output_path=output_video_path)
+        self.log_message(f"Xử lý hoàn tất: {os.path.basename(job['video_path'])}")
         self.final_output_video_path = output_video_path
-        QMessageBox.information(self, "Hoàn tất", "Video đã được xử lý xong.")
-        self.btn_download.setEnabled(True)
-        self.btn_process.setEnabled(True) # Kích hoạt lại nút xử lý
-
-    def _on_processing_failed(self, error_message):
-        """Hàm được gọi khi luồng xử lý gặp lỗi."""
-        self.log_message(f"Xử lý thất bại: {error_message}")
-        QMessageBox.critical(self, "Lỗi", f"Đã xảy ra lỗi trong quá trình xử lý:\n{error_message}")
-        self.btn_process.setEnabled(True) # Kích hoạt lại nút xử lý
-        self.btn_download.setEnabled(False)
-        self.progress_bar.setValue(0)
+        self._refresh_job_list()
+
+    def _on_processing_failed(self, job_id, error_message):
+        """Hàm được gọi khi một việc gặp lỗi."""
+        job = self.job_queue.lay_viec(job_id)
+        if job is None or job["status"] != TRANG_THAI_DANG_CHAY:
+            return # Lỗi do chính việc tạm dừng/hủy gây ra
+        self.job_queue.cap_nhat(job_id, status=TRANG_THAI_LOI, error=error_message)
+        self.log_message(f"Xử lý thất bại: {os.path.basename(job['video_path'])}: {error_message}")
+        self._refresh_job_list()
+
+    def _on_job_thread_finished(self, job_id):
+        thread = self.job_threads.pop(job_id, None)
+        if thread is not None:
+            thread.deleteLater()
+        self._schedule_jobs()
+
+    def _on_concurrency_changed(self, value):
+        self.job_queue.dat_so_viec_dong_thoi(value) # Lưu cùng hàng đợi để giữ sau khi khởi động lại
+        self._schedule_jobs()
+
+    def _selected_job_id(self):
+        item = self.list_jobs.currentItem()
+        return item.data(Qt.ItemDataRole.UserRole) if item else None
+
+    def _refresh_job_list(self):
+        selected_id = self._selected_job_id()
+        self.list_jobs.blockSignals(True)
+        self.list_jobs.clear()
+        for job in self.job_queue.cac_viec:
+            status = self.JOB_STATUS_LABELS.get(job["status"], job["status"])
+            text = f"{os.path.basename(job['video_path'])} → {job['language']} — {status}"
+            if job["status"] == TRANG_THAI_DANG_CHAY:
+                text += f" ({job.get('progress', 0)}%)"
+            item = QListWidgetItem(text)
+            item.setData(Qt.ItemDataRole.UserRole, job["id"])
+            if job.get("error"):
+                item.setToolTip(job["error"])
+            self.list_jobs.addItem(item)
+            if job["id"] == selected_id:
+                self.list_jobs.setCurrentItem(item)
+        self.list_jobs.blockSignals(False)
+        self._update_job_buttons()
+
+    def _update_job_buttons(self):
+        job = self.job_queue.lay_viec(self._selected_job_id()) if self._selected_job_id() else None
+        status = job["status"] if job else None
+        self.btn_pause_job.setEnabled(status in (TRANG_THAI_CHO, TRANG_THAI_DANG_CHAY))
+        self.btn_resume_job.setEnabled(status in (TRANG_THAI_TAM_DUNG, TRANG_THAI_LOI, TRANG_THAI_DA_HUY))
+        self.btn_cancel_job.setEnabled(status in (TRANG_THAI_CHO, TRANG_THAI_DANG_CHAY, TRANG_THAI_TAM_DUNG))
+        # Bản xem trước được ghi vào thư mục của việc nên không xóa việc khi đang tạo xem trước
+        self.btn_remove_job.setEnabled(bool(job) and status != TRANG_THAI_DANG_CHAY and self.preview_thread is None)
+        self.btn_clear_finished.setEnabled(self.preview_thread is None and any(
+            item["status"] in CAC_TRANG_THAI_KET_THUC for item in self.job_queue.cac_viec))
+        if status == TRANG_THAI_XONG:
+            self.final_output_video_path = job.get("output_path")
+        self.btn_download.setEnabled(bool(self.final_output_video_path and os.path.exists(self.final_output_video_path)))
+        if job:
+            self.progress_bar.setValue(job.get("progress", 0))
+        # SRT được ghi dần nên việc đang chạy cũng xem trước được phần đã có phụ đề
+        can_preview = bool(job and os.path.exists(job["srt_path"]) and os.path.exists(job["video_path"]))
+        self.btn_preview.setEnabled(can_preview and self.preview_thread is None)
+
+    def preview_selected_job(self):
+        """Ghép cứng 15 giây quanh thời điểm đã chọn của việc đang chọn và mở bằng trình phát mặc định."""
+        job = self.job_queue.lay_viec(self._selected_job_id()) if self._selected_job_id() else None
+        if not job or not os.path.exists(job["srt_path"]) or self.preview_thread is not None:
+            return
+        timestamp = self.spin_preview_time.value()
+        self.log_message(f"Tạo bản xem trước quanh giây {timestamp:g}: {os.path.basename(job['video_path'])}")
+        self.preview_thread = PreviewThread(
+            job["video_path"], job["srt_path"], os.path.join(job["work_dir"], "preview.mp4"), timestamp
+        )
+        self.preview_thread.preview_ready.connect(self._on_preview_ready)
+        self.preview_thread.preview_failed.connect(self._on_preview_failed)
+        self.preview_thread.finished.connect(self._on_preview_thread_finished)
+        self.btn_preview.setEnabled(False)
+        self.preview_thread.start()
+
+    def _on_preview_ready(self, path):
+        self.log_message(f"Đã tạo bản xem trước: {path}")
+        QDesktopServices.openUrl(QUrl.fromLocalFile(path))
+
+    def _on_preview_failed(self, message):
+        self.log_message(message)
+        QMessageBox.critical(self, "Lỗi Xem Trước", message)
+
+    def _on_preview_thread_finished(self):
+        self.preview_thread.deleteLater()
+        self.preview_thread = None
+        self._update_job_buttons()
+
+    def pause_selected_job(self):
+        job_id = self._selected_job_id()
+        if job_id and self.job_queue.tam_dung(job_id):
+            if job_id in self.job_threads:
+                self.job_threads[job_id].cancel() # Tiếp tục sẽ chạy lại, các bước đã xong được lấy từ bộ nhớ dịch
+            self.log_message("Đã tạm dừng việc đã chọn.")
+        self._refresh_job_list()
+
+    def resume_selected_job(self):
+        job_id = self._selected_job_id()
+        if job_id and self.job_queue.tiep_tuc(job_id):
+            self.log_message("Đã đưa việc trở lại hàng đợi.")
+        self._schedule_jobs()
+
+    def cancel_selected_job(self):
+        job_id = self._selected_job_id()
+        if job_id and self.job_queue.huy(job_id):
+            if job_id in self.job_threads:
+                self.job_threads[job_id].cancel()
+            self.log_message("Đã hủy việc đã chọn.")
+        self._refresh_job_list()
+
+    def remove_selected_job(self):
+        job_id = self._selected_job_id()
+        if job_id and self.preview_thread is None and self._remove_job(job_id):
+            self.log_message("Đã xóa việc đã chọn và các file tạm của nó.")
+        self._refresh_job_list()
+
+    def clear_finished_jobs(self):
+        if self.preview_thread is not None:
+            return
+        if self.final_output_video_path and os.path.dirname(self.final_output_video_path) in {
+                job["work_dir"] for job in self.job_queue.cac_viec if job["status"] in CAC_TRANG_THAI_KET_THUC}:
+            self.final_output_video_path = None
+        count = self.job_queue.xoa_viec_da_xong()
+        if count:
+            self.log_message(f"Đã xóa {count} việc đã xong cùng các file tạm.")
+        self._refresh_job_list()
+
+    def _remove_job(self, job_id):
+        """Xóa việc (và thư mục làm việc của nó); bỏ luôn đường dẫn tải xuống nếu nó nằm trong thư mục đó."""
+        job = self.job_queue.lay_viec(job_id)
+        if job is None or not self.job_queue.xoa(job_id):
+            return False
+        if self.final_output_video_path and os.path.dirname(self.final_output_video_path) == job["work_dir"]:
+            self.final_output_video_path = None
+        return True
 
     def download_output_video(self):
         """Hàm này sẽ được gọi khi nút tải xuống được nhấn."""
+        job = self.job_queue.lay_viec(self._selected_job_id()) if self._selected_job_id() else None
+        if job and job["status"] == TRANG_THAI_XONG:
+            self.final_output_video_path = job.get("output_path")
         if self.final_output_video_path and os.path.exists(self.final_output_video_path):
             # Tạo tên file gợi ý dựa trên tên video gốc và ngôn ngữ
-            base_name = os.path.basename(self.current_video_path)
+            source_path = job["video_path"] if job else self.current_video_path
+            language = job["language"] if job else self.cb_language.currentText()
+            base_name = os.path.basename(source_path)
             name_without_ext = os.path.splitext(base_name)[0]
-            suggested_name = f"{name_without_ext}_subtitle_{self.cb_language.currentText().lower()}.mp4"
+            output_ext = os.path.splitext(self.final_output_video_path)[1] # .mp4 hoặc .mkv/.mov khi dùng phụ đề mềm
+            suggested_name = f"{name_without_ext}_subtitle_{language.lower()}{output_ext}"
 
             save_path, _ = QFileDialog.getSaveFileName(
                 self,
                 "Lưu Video Đã Có Phụ Đề",
                 os.path.join(os.path.expanduser("~"), "Videos", suggested_name), # Thư mục mặc định là Videos của người dùng
-                "Video Files (*.mp4);;All Files (*)"
+                f"Video Files (*{output_ext});;All Files (*)"
             )
             if save_path:
                 try:
                     shutil.copy(self.final_output_video_path, save_path)
                     QMessageBox.information(self, "Thành công", f"Video đã được lưu tại:\n{save_path}")
                     self.log_message(f"Video đã được tải xuống: {os.path.basename(save_path)}")
+                    # Đã có bản lưu của người dùng: xóa việc cùng video đầu ra, bản xem trước và SRT trong data/
+                    if job and job["status"] == TRANG_THAI_XONG and self.preview_thread is None:
+                        self._remove_job(job["id"])
+                        self._refresh_job_list()
                 except Exception as e:
                     QMessageBox.critical(self, "Lỗi Lưu File", f"Không thể lưu file: {e}")
                     self.log_message(f"Lỗi khi lưu file: {e}")
@@ -364,30 +534,29 @@ class SubtitleDialog(QDialog):
 
     def closeEvent(self, event):
         """
-        Xử lý sự kiện khi cửa sổ ứng dụng đóng.
-        Xóa tất cả các file tạm và thư mục tạm.
+        Xử lý sự kiện khi cửa sổ đóng.
+        Dừng các việc đang chạy và đưa chúng về hàng chờ để lần mở sau chạy tiếp.
         """
-        print("\nỨng dụng đang đóng. Đang dọn dẹp các file tạm...")
-        self.log_message("Đang dọn dẹp các file tạm...")
-
-        # Đảm bảo luồng đang chạy được dừng
-        if self.processing_thread and self.processing_thread.isRunning():
-            self.processing_thread.quit()
-            self.processing_thread.wait() # Chờ luồng kết thúc
-            self.log_message("Luồng xử lý đã được dừng.")
-
-        # Xóa thư mục tạm thời
-        if os.path.exists(self.temp_dir):
-            try:
-                shutil.rmtree(self.temp_dir)
-                print(f"Đã xóa thư mục tạm: {self.temp_dir}")
-                self.log_message(f"Đã xóa thư mục tạm: {self.temp_dir}")
-            except OSError as e:
-                print(f"Lỗi khi xóa thư mục tạm '{self.temp_dir}': {e}")
-                self.log_message(f"Lỗi khi xóa thư mục tạm: {e}")
-
-        # Hỏi người dùng có muốn xóa video gốc đã tải lên không
-        if self.current_video_path and os.path.exists(self.current_video_path):
+        # Dừng các luồng đang chạy; việc vẫn giữ trong data/subtitle_jobs.json
+        for thread in list(self.job_threads.values()):
+            thread.cancel()
+        for thread in list(self.job_threads.values()):
+            thread.wait() # Chờ luồng kết thúc (ffmpeg bị dừng ngay khi hủy)
+        self.job_threads.clear()
+        if self.preview_thread is not None:
+            self.preview_thread.cancel()
+            self.preview_thread.wait()
+        self.job_queue.dua_ve_hang_cho()
+        if self.job_queue.cac_viec:
+            self.log_message("Các việc chưa xong sẽ tiếp tục ở lần mở sau.")
+
+        # Hỏi người dùng có muốn xóa video gốc đã tải lên không (chỉ khi không còn việc nào cần tới nó)
+        unfinished_sources = {
+            job["video_path"] for job in self.job_queue.cac_viec
+            if job["status"] not in CAC_TRANG_THAI_KET_THUC
+        }
+        if (self.current_video_path and os.path.exists(self.current_video_path)
+                and os.path.abspath(self.current_video_path) not in unfinished_sources):
             reply = QMessageBox.question(
                 self,
                 "Xác nhận đóng ứng dụng",
@@ -440,111 +609,276 @@ DEFAULT_EDGE_TTS_VOICE = "en-US-JennyNeural"
 DEFAULT_PYTTSX3_VOICE = "english"
 
 
+def choose_voices(text, lang=None):
+    """
+    Chọn giọng Edge TTS và pyttsx3. Thẻ đã lưu sẵn mã ngôn ngữ nên chỉ cần tra VOICE_MAP,
+    văn bản tự do mới phải phát hiện ngôn ngữ (có ghi nhớ).
+    """
+    detected_lang = lang if lang else phat_hien_ngon_ngu(text)
+
+    if detected_lang and detected_lang in VOICE_MAP:
+        return VOICE_MAP[detected_lang]["edge_tts"], VOICE_MAP[detected_lang]["pyttsx3"]
+    return DEFAULT_EDGE_TTS_VOICE, DEFAULT_PYTTSX3_VOICE
+
+
+async def synthesize_edge_tts(text, edge_tts_voice):
+    """Tổng hợp văn bản thành MP3 bằng Edge TTS, trả về bytes."""
+    communicate = edge_tts.Communicate(text=text, voice=edge_tts_voice)
+    audio_buffer = BoDemAmThanh.cho_van_ban(text)
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            audio_buffer.them(chunk["data"])
+
+    if not len(audio_buffer):
+        raise Exception("No audio was received from Edge TTS.")
+
+    return audio_buffer.lay_bytes()
+
+
 # --- Lớp SpeakService để quản lý việc phát âm thanh ---
 class SpeakService(QThread):
-    finished = pyqtSignal()
+    """
+    Dịch vụ phát âm sống suốt vòng đời ứng dụng: một luồng với một event loop asyncio cố định
+    và một yêu cầu đang chạy. Yêu cầu mới thay thế yêu cầu cũ (yêu cầu sau cùng thắng),
+    việc hủy không bao giờ chặn luồng giao diện.
+    """
+    speech_finished = pyqtSignal()
     error = pyqtSignal(str)
 
-    def __init__(self, text, parent=None):
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.text = text
-        self._is_running = True
-        self._wait_condition = QWaitCondition()
-        self._mutex = QMutex()
-        self.current_edge_tts_voice = DEFAULT_EDGE_TTS_VOICE
-        self.current_pyttsx3_voice = DEFAULT_PYTTSX3_VOICE
+        self._loop = None
+        self._loop_ready = threading.Event()
+        self._current_task = None
+        self._channel = None
+        self._player = None
 
     def run(self):
-        detected_lang = None
-        try:
-            if self.text.strip():
-                detected_lang = detect(self.text)
-        except LangDetectException:
-            detected_lang = None
-
-        if detected_lang and detected_lang in VOICE_MAP:
-            self.current_edge_tts_voice = VOICE_MAP[detected_lang]["edge_tts"]
-            self.current_pyttsx3_voice = VOICE_MAP[detected_lang]["pyttsx3"]
-        else:
-            self.current_edge_tts_voice = DEFAULT_EDGE_TTS_VOICE
-            self.current_pyttsx3_voice = DEFAULT_PYTTSX3_VOICE
-        
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop_ready.set()
         try:
-            temp_mp3_path = None
-            async def get_audio_from_edge_tts():
-                nonlocal temp_mp3_path
-                communicate = edge_tts.Communicate(text=self.text, voice=self.current_edge_tts_voice)
-                audio_bytes = b""
-                async for chunk in communicate.stream():
-                    if chunk["type"] == "audio":
-                        audio_bytes += chunk["data"]
-                
-                if not audio_bytes:
-                    raise Exception("No audio was received from Edge TTS.")
-                
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_mp3:
-                    temp_mp3.write(audio_bytes)
-                    temp_mp3_path = temp_mp3.name
-                
-                return audio_bytes
-
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            edge_audio_bytes = loop.run_until_complete(get_audio_from_edge_tts())
-            loop.close()
-
-            if not pygame.mixer.get_init():
-                pygame.mixer.init()
-            
-            audio = AudioSegment.from_file(io.BytesIO(edge_audio_bytes), format="mp3")
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_wav:
-                audio.export(temp_wav.name, format="wav")
-                pygame.mixer.music.load(temp_wav.name)
-            
-            pygame.mixer.music.play()
-            while pygame.mixer.music.get_busy() and self._is_running:
-                self._mutex.lock()
-                self._wait_condition.wait(self._mutex, 100)
-                self._mutex.unlock()
-
-            pygame.mixer.music.stop()
-
-            if temp_mp3_path and os.path.exists(temp_mp3_path):
-                os.remove(temp_mp3_path)
-            if temp_wav.name and os.path.exists(temp_wav.name):
-                os.remove(temp_wav.name)
+            self._loop.run_forever()
+        finally:
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    def _call_in_loop(self, callback, *args):
+        self._loop_ready.wait()
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def speak(self, text, lang=None):
+        """Gửi yêu cầu phát âm từ bất kỳ luồng nào; yêu cầu đang chạy (nếu có) bị hủy."""
+        self._stop_channel()
+        self._call_in_loop(self._start_speaking, text, lang)
 
+    def stop_speaking(self):
+        """Dừng phát âm ngay, không chờ luồng kết thúc."""
+        self._stop_channel()
+        self._call_in_loop(self._cancel_current_task)
+
+    def shutdown(self):
+        self.stop_speaking()
+        self._call_in_loop(self._loop.stop)
+        self.wait()
+
+    def _stop_channel(self):
+        # Chạy trên luồng gọi (thường là luồng giao diện) trong khi event loop có thể đang gán lại hai thuộc tính này
+        channel, player = self._channel, self._player
+        if channel is not None:
+            channel.stop()
+        if player is not None:
+            player.dung()
+
+    def _cancel_current_task(self):
+        if self._current_task and not self._current_task.done():
+            self._current_task.cancel()
+        self._current_task = None
+
+    def _start_speaking(self, text, lang):
+        self._cancel_current_task()
+        self._current_task = self._loop.create_task(self._speak(text, lang))
+
+    async def _speak(self, text, lang=None):
+        lang = lang if lang else phat_hien_ngon_ngu(text)
+        edge_tts_voice, _ = choose_voices(text, lang)
+        player = None
+        try:
+            # Câu đã đọc trước đó được phát ngay từ bộ nhớ đệm, không cần gọi Edge TTS (chạy được cả khi offline)
+            bo_nho_dem_tts = lay_bo_nho_dem_tts()
+            edge_audio_bytes = bo_nho_dem_tts.lay(edge_tts_voice, text)
+            if edge_audio_bytes is None:
+                # Phát ngay khi có vài khung MP3 đầu tiên, vừa nhận vừa phát phần còn lại
+                player = TrinhPhatLuongMp3(text)
+                await self._stream_edge_tts(player, text, edge_tts_voice)
+                bo_nho_dem_tts.luu(edge_tts_voice, text, player.lay_bytes())
+            else:
+                # Giải mã MP3 ngay trong bộ nhớ thành Sound, phát trên kênh riêng (không đụng tới nhạc nền)
+                sound = tao_sound_tu_mp3(edge_audio_bytes)
+                self._channel = sound.play()
+                try:
+                    while self._channel and self._channel.get_busy():
+                        await asyncio.sleep(0.05)
+                finally:
+                    sound.stop()
+                    self._channel = None
+
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            # Fallback sang pyttsx3
+            if player is not None and player.da_phat:
+                # Đã đọc được một phần câu, chuyển sang giọng offline lúc này sẽ đọc lặp lại từ đầu
+                self.error.emit(f"Không thể phát hết âm thanh: Edge TTS lỗi ({e})")
+                return
+            # Fallback sang engine pyttsx3 dùng chung (đã khởi tạo và dựng bảng giọng sẵn trên luồng riêng)
+            offline_engine = get_offline_speech_engine()
             try:
-                engine = pyttsx3.init()
-                
-                if self.current_pyttsx3_voice:
-                    voices = engine.getProperty('voices')
-                    found_voice = False
-                    for voice_obj in voices:
-                        if self.current_pyttsx3_voice.lower() in voice_obj.name.lower() or \
-                           self.current_pyttsx3_voice.lower() in voice_obj.id.lower():
-                            engine.setProperty('voice', voice_obj.id)
-                            found_voice = True
-                            break
-                    if not found_voice:
-                        pass
-                
-                engine.say(self.text)
-                engine.runAndWait()
+                await asyncio.wrap_future(offline_engine.doc(text, lang))
+            except asyncio.CancelledError:
+                offline_engine.dung()
+                raise
             except Exception as e_pyttsx3:
                 self.error.emit(f"Không thể phát âm thanh: Edge TTS lỗi ({e}), Pyttsx3 cũng lỗi ({e_pyttsx3})")
-        
-        self.finished.emit()
 
-    def stop_speaking(self):
-        self._mutex.lock()
-        self._is_running = False
-        self._wait_condition.wakeAll()
-        self._mutex.unlock()
-        if pygame.mixer.get_init():
-            pygame.mixer.music.stop()
+        self.speech_finished.emit()
+
+    async def _stream_edge_tts(self, player, text, edge_tts_voice):
+        """Nhận luồng MP3 từ Edge TTS và đẩy dần vào mixer qua player cho tới khi phát xong."""
+        self._player = player
+
+        async def pump():
+            while player.bom():
+                await asyncio.sleep(0.02)
+
+        pump_task = asyncio.ensure_future(pump())
+        try:
+            communicate = edge_tts.Communicate(text=text, voice=edge_tts_voice)
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    player.them(chunk["data"])
+            player.ket_thuc()
+            if not len(player):
+                raise Exception("No audio was received from Edge TTS.")
+            await pump_task
+        finally:
+            pump_task.cancel()
+            player.dung()
+            self._player = None
+
+
+class AudioPrepareThread(QThread):
+    """
+    Tổng hợp trước âm thanh mặt trước và mặt sau của các thẻ trong phiên học,
+    với số yêu cầu đồng thời và tốc độ có giới hạn. Kết quả nằm trong bộ nhớ đệm TTS.
+    """
+    progress_updated = pyqtSignal(int, int)
+    prepare_finished = pyqtSignal(int, int) # số thành công, số lỗi
+
+    def __init__(self, texts, synthesize=synthesize_edge_tts, max_concurrency=SO_YEU_CAU_DONG_THOI,
+                 min_interval=KHOANG_CACH_TOI_THIEU_GIAY, parent=None):
+        super().__init__(parent)
+        self.texts = list(texts)
+        self.synthesize = synthesize
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self._loop = None
+        self._task = None
+        self._cancelled = threading.Event()
+
+    def run(self):
+        # texts là danh sách (văn bản, mã ngôn ngữ); chọn giọng ngay trên luồng này (thẻ chưa có mã phải phát hiện ngôn ngữ)
+        items = []
+        for text, lang in self.texts:
+            if self._cancelled.is_set():
+                return
+            if text and text.strip():
+                items.append((text, choose_voices(text, lang)[0]))
+
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(chuan_bi_am_thanh(
+            items, self.synthesize, lay_bo_nho_dem_tts(),
+            so_dong_thoi=self.max_concurrency,
+            khoang_cach_toi_thieu=self.min_interval,
+            bao_tien_do=self.progress_updated.emit
+        ))
+        if self._cancelled.is_set():
+            self._task.cancel()
+        try:
+            succeeded, failed = self._loop.run_until_complete(self._task)
+            self.prepare_finished.emit(succeeded, failed)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def cancel(self):
+        """Hủy việc chuẩn bị âm thanh mà không chặn luồng gọi."""
+        self._cancelled.set()
+        loop = self._loop
+        if loop is not None and self._task is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._task.cancel)
+            except RuntimeError:
+                pass # Event loop vừa đóng
+
+
+class LanguageDetectThread(QThread):
+    """
+    Phát hiện ngôn ngữ cho các mặt thẻ chưa có mã (thẻ cũ/nhập từ nơi khác) ngoài luồng giao diện.
+    Kết quả được ghi vào dữ liệu trên luồng giao diện qua tín hiệu languages_detected.
+    """
+    languages_detected = pyqtSignal(str, list) # user_id, [(mã thẻ, khóa ngôn ngữ, văn bản, mã ngôn ngữ)]
+
+    def __init__(self, user_id, items, parent=None):
+        super().__init__(parent)
+        self.user_id = user_id
+        self.items = list(items)
+        self._cancelled = threading.Event()
+
+    def run(self):
+        results = []
+        for card_id, lang_key, text in self.items:
+            if self._cancelled.is_set():
+                return
+            results.append((card_id, lang_key, text, phat_hien_ngon_ngu(text)))
+        self.languages_detected.emit(self.user_id, results)
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+_speak_service = None
+_offline_speech_engine = None
+
+
+def get_offline_speech_engine():
+    """Trả về engine đọc offline dùng chung; bảng giọng theo ngôn ngữ được dựng một lần trên luồng của engine."""
+    global _offline_speech_engine
+    if _offline_speech_engine is None:
+        _offline_speech_engine = DongCoDocOffline(
+            tu_khoa_theo_ngon_ngu={lang: voices["pyttsx3"] for lang, voices in VOICE_MAP.items()},
+            ngon_ngu_mac_dinh="en"
+        )
+    return _offline_speech_engine
+
+
+def get_speak_service():
+    """Trả về dịch vụ phát âm dùng chung, khởi động luồng ở lần gọi đầu tiên."""
+    global _speak_service
+    if _speak_service is None:
+        _speak_service = SpeakService()
+        _speak_service.start()
+        get_offline_speech_engine() # Khởi tạo sẵn để lần fallback đầu tiên không phải chờ
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(_speak_service.shutdown)
+    return _speak_service
 
 class NguoiDung:
     def __init__(self, ten_nguoi_dung, mat_khau, email, dob=None, phone=None, profile_picture_path=None, study_methods=None):
@@ -573,9 +907,49 @@ class CoSoDuLieuNguoiDung:
                 user["id"] = str(uuid.uuid4())
             if "study_methods" not in user: # Thêm trường study_methods
                 user["study_methods"] = []
+            # Thẻ cũ chưa có mã ngôn ngữ được bổ sung ở luồng nền sau khi đăng nhập (LanguageDetectThread)
             idx += 1
+        self._chuyen_anh_cu_vao_kho()
         ghi_du_lieu_json(self.user_file, self.du_lieu_nguoi_dung)
 
+        # Kho ảnh đếm tham chiếu từ dữ liệu trong bộ nhớ, luồng nền dọn ảnh không còn thẻ nào dùng
+        self.dang_ky_kho_anh()
+        kho_anh = lay_kho_anh()
+        kho_anh.dem_tham_chieu()
+        kho_anh.khoi_dong_don_dep()
+
+    def dang_ky_kho_anh(self):
+        """
+        Đặt dữ liệu của đối tượng này làm nguồn đếm tham chiếu ảnh cho file người dùng. Màn hình đăng nhập
+        và đăng ký mỗi bên tạo một đối tượng cho cùng file, nên đối tượng được dùng sau khi vào trang chủ
+        gọi lại hàm này để thay nguồn cũ (kho chỉ giữ một nguồn cho mỗi file).
+        """
+        lay_kho_anh().dang_ky_nguon_du_lieu(os.path.abspath(self.user_file), self._lay_du_lieu_cho_kho_anh)
+
+    def huy_dang_ky_kho_anh(self):
+        """Thôi làm nguồn đếm tham chiếu (đăng xuất). Không có nguồn nào thì kho không xóa ảnh nào."""
+        lay_kho_anh().huy_dang_ky_nguon_du_lieu(os.path.abspath(self.user_file), self._lay_du_lieu_cho_kho_anh)
+
+    def _lay_du_lieu_cho_kho_anh(self):
+        return self.du_lieu_nguoi_dung
+
+    def _chuyen_anh_cu_vao_kho(self):
+        """Đổi ảnh đặt tên kiểu cũ (uuid_tên) sang tên theo mã băm để gộp các ảnh trùng nội dung."""
+        kho_anh = lay_kho_anh()
+        for user in self.du_lieu_nguoi_dung:
+            for card in user.get("flashcards", []):
+                for khoa in ("image_front_path", "image_back_path"):
+                    ten_anh = card.get(khoa)
+                    if not ten_anh or kho_anh.la_ten_trong_kho(ten_anh):
+                        continue
+                    duong_dan_cu = kho_anh.duong_dan_day_du(ten_anh)
+                    if not os.path.exists(duong_dan_cu):
+                        continue
+                    try:
+                        card[khoa] = kho_anh.luu_anh(duong_dan_cu)
+                    except OSError as e:
+                        print(f"Lỗi khi chuyển ảnh '{ten_anh}' vào kho: {e}")
+
     def _tai_danh_sach_ten(self):
         return [item["username"] for item in self.du_lieu_nguoi_dung]
 
@@ -648,18 +1022,63 @@ class CoSoDuLieuNguoiDung:
                     back_text=d.get("back_text", ""),
                     image_front_path=d.get("image_front_path"),
                     image_back_path=d.get("image_back_path"),
-                    status=d.get("status", "new")
+                    status=d.get("status", "new"),
+                    front_lang=d.get("front_lang"),
+                    back_lang=d.get("back_lang")
                 ) for d in flashcard_dicts]
                 return flashcards
         return []
 
+    def lay_van_ban_chua_co_ngon_ngu(self, user_id):
+        """Trả về (mã thẻ, khóa ngôn ngữ, văn bản) của các mặt thẻ chưa có mã ngôn ngữ (thẻ cũ/nhập từ nơi khác)."""
+        cac_muc = []
+        for user_data in self.du_lieu_nguoi_dung:
+            if user_data.get("id") == user_id:
+                for card in user_data.get("flashcards", []):
+                    for khoa_van_ban, khoa_ngon_ngu in (("front_text", "front_lang"), ("back_text", "back_lang")):
+                        van_ban = card.get(khoa_van_ban, "")
+                        if card.get("id") and not card.get(khoa_ngon_ngu) and van_ban.strip():
+                            cac_muc.append((card["id"], khoa_ngon_ngu, van_ban))
+        return cac_muc
+
+    def cap_nhat_ngon_ngu_the(self, user_id, ket_qua):
+        """
+        Ghi mã ngôn ngữ đã phát hiện (mã thẻ, khóa ngôn ngữ, văn bản, mã) vào dữ liệu rồi lưu file.
+        Bỏ qua thẻ đã bị xóa, đã có mã hoặc đã đổi nội dung trong lúc phát hiện.
+        """
+        for user_data in self.du_lieu_nguoi_dung:
+            if user_data.get("id") != user_id:
+                continue
+            the_theo_ma = {card.get("id"): card for card in user_data.get("flashcards", [])}
+            da_doi = False
+            for ma_the, khoa_ngon_ngu, van_ban, ma_ngon_ngu_the in ket_qua:
+                card = the_theo_ma.get(ma_the)
+                khoa_van_ban = "front_text" if khoa_ngon_ngu == "front_lang" else "back_text"
+                if ma_ngon_ngu_the and card is not None and not card.get(khoa_ngon_ngu) and card.get(khoa_van_ban) == van_ban:
+                    card[khoa_ngon_ngu] = ma_ngon_ngu_the
+                    da_doi = True
+            if da_doi:
+                ghi_du_lieu_json(self.user_file, self.du_lieu_nguoi_dung)
+            return da_doi
+        return False
+
     def cap_nhat_flashcards_cho_nguoi_dung(self, user_id, flashcards):
         i_index = 0
         while i_index < len(self.du_lieu_nguoi_dung):
             user_data = self.du_lieu_nguoi_dung[i_index]
             if user_data.get("id") == user_id:
+                # Thẻ được nạp trước khi luồng nền bổ sung mã ngôn ngữ thì lấy lại mã đã có, không ghi đè bằng None
+                the_cu = {card.get("id"): card for card in user_data.get("flashcards", [])}
+                for card in flashcards:
+                    cu = the_cu.get(card.id)
+                    if cu is not None:
+                        if not card.front_lang and cu.get("front_text") == card.front_text:
+                            card.front_lang = cu.get("front_lang")
+                        if not card.back_lang and cu.get("back_text") == card.back_text:
+                            card.back_lang = cu.get("back_lang")
                 self.du_lieu_nguoi_dung[i_index]["flashcards"] = [card.to_dict() for card in flashcards]
                 ghi_du_lieu_json(self.user_file, self.du_lieu_nguoi_dung)
+                lay_kho_anh().dem_tham_chieu()
                 return True
             i_index += 1
         return False
@@ -790,6 +1209,16 @@ class FlashcardThemSua(QDialog):
         self.temp_image_front_path = None # Full path of selected image for front
         self.temp_image_back_path = None  # Full path of selected image for back
 
+        # Ảnh được kiểm tra, xoay, thu nhỏ và lưu vào kho trên thread pool để không đơ cửa sổ
+        self.bo_nhap_anh = BoNhapAnh(parent=self)
+        self.bo_nhap_anh.anh_xong.connect(self._on_image_ingested)
+        self.bo_nhap_anh.anh_loi.connect(self._on_image_ingest_failed)
+        self.bo_nhap_anh.tien_do.connect(self._on_image_ingest_progress)
+        self.bo_nhap_anh.hoan_tat.connect(self._on_image_ingest_finished)
+        self._image_task_side = {}
+        self._pinned_images = {} # side -> ảnh đã nhập vào kho, được ghim tới khi đóng cửa sổ
+        self._save_button_text = self.ui.pushButtonSave.text()
+
         self.ui.labelAddEditTitle.setText("Chỉnh sửa Flashcard" if self.flashcard_to_edit else "Thêm Flashcard Mới")
         
         self.ui.textEditFront.setText(self.flashcard_to_edit.front_text if self.flashcard_to_edit else "")
@@ -815,7 +1244,7 @@ class FlashcardThemSua(QDialog):
                 text_edit_widget.insertHtml(f"<img src=\"{image_url}\" /><br>")
 
     def _load_and_preview_image(self, side):
-        """Mở hộp thoại chọn ảnh, lưu đường dẫn tạm thời và hiển thị xem trước trong QTextEdit."""
+        """Mở hộp thoại chọn ảnh và gửi ảnh sang thread pool để xử lý, xem trước khi xử lý xong."""
         file_path, _ = QFileDialog.getOpenFileName(
             self,
             "Chọn ảnh",
@@ -824,53 +1253,76 @@ class FlashcardThemSua(QDialog):
         )
 
         if file_path:
-            pixmap = QPixmap(file_path)
-            if not pixmap.isNull():
-                if side == "front":
-                    self.temp_image_front_path = file_path
-                    text_edit_widget = self.ui.textEditFront
-                elif side == "back":
-                    self.temp_image_back_path = file_path
-                    text_edit_widget = self.ui.textEditBack
-                
-                image_url = QUrl.fromLocalFile(file_path).toString()
-                text_edit_widget.moveCursor(QTextCursor.MoveOperation.End) # ĐÃ SỬA LỖI TẠI ĐÂY
-                text_edit_widget.insertHtml(f"<img src=\"{image_url}\" /><br>")
-            else:
-                QMessageBox.warning(self, "Lỗi", "Không thể tải ảnh đã chọn.")
+            task_id = self.bo_nhap_anh.nhap(file_path)[0]
+            self._image_task_side[task_id] = side
+            button = self.ui.BTNaddimage_front if side == "front" else self.ui.BTNaddimage_back
+            button.setEnabled(False)
+            self.ui.pushButtonSave.setEnabled(False)
+
+    def _on_image_ingest_progress(self, done, total):
+        if done < total:
+            self.ui.pushButtonSave.setText(f"Đang xử lý ảnh ({done}/{total})...")
+
+    def _on_image_ingest_finished(self):
+        self.ui.pushButtonSave.setText(self._save_button_text)
+        self.ui.pushButtonSave.setEnabled(True)
+
+    def _on_image_ingested(self, task_id, source_path, image_name):
+        side = self._image_task_side.pop(task_id, None)
+        if side is None:
+            return
+        # Ghim ảnh để luồng dọn dẹp không xóa khi cửa sổ mở lâu hơn thời gian an toàn mà thẻ chưa được lưu
+        kho_anh = lay_kho_anh()
+        kho_anh.ghim(image_name)
+        previous_image = self._pinned_images.get(side)
+        if previous_image:
+            kho_anh.bo_ghim(previous_image)
+        self._pinned_images[side] = image_name
+        stored_path = kho_anh.duong_dan_day_du(image_name)
+        if side == "front":
+            self.temp_image_front_path = stored_path
+            text_edit_widget = self.ui.textEditFront
+            self.ui.BTNaddimage_front.setEnabled(True)
+        else:
+            self.temp_image_back_path = stored_path
+            text_edit_widget = self.ui.textEditBack
+            self.ui.BTNaddimage_back.setEnabled(True)
+
+        # Xem trước bằng ảnh đã thu nhỏ trong kho thay vì ảnh gốc
+        image_url = QUrl.fromLocalFile(os.path.abspath(stored_path)).toString()
+        text_edit_widget.moveCursor(QTextCursor.MoveOperation.End) # ĐÃ SỬA LỖI TẠI ĐÂY
+        text_edit_widget.insertHtml(f"<img src=\"{image_url}\" /><br>")
+
+    def _on_image_ingest_failed(self, task_id, source_path, error_message):
+        side = self._image_task_side.pop(task_id, None)
+        if side == "front":
+            self.ui.BTNaddimage_front.setEnabled(True)
+        elif side == "back":
+            self.ui.BTNaddimage_back.setEnabled(True)
+        QMessageBox.warning(self, "Lỗi", f"Không thể tải ảnh đã chọn.\n{error_message}")
     
     def _copy_image_to_storage(self, source_path):
         """
-        Sao chép ảnh từ đường dẫn nguồn vào thư mục 'data/flashcard_images'
-        và trả về tên file duy nhất. Tránh sao chép lại nếu đã có.
+        Lưu ảnh vào kho 'data/flashcard_images' theo mã băm nội dung và trả về tên file.
+        Ảnh trùng nội dung với ảnh đã có sẽ dùng lại file cũ, không sao chép lại.
         """
         if not source_path:
             return None
-        
-        flashcard_image_dir = os.path.join("data", "flashcard_images")
-        
-        abs_source_path = os.path.abspath(source_path)
-        abs_flashcard_image_dir = os.path.abspath(flashcard_image_dir)
-
-        if abs_source_path.startswith(abs_flashcard_image_dir) and os.path.exists(source_path):
-            return os.path.basename(source_path)
-
-        if not os.path.exists(source_path):
-            return None
-
-        os.makedirs(flashcard_image_dir, exist_ok=True)
-        file_name = os.path.basename(source_path)
-        unique_file_name = f"{uuid.uuid4().hex}_{file_name}"
-        destination_path = os.path.join(flashcard_image_dir, unique_file_name)
 
         try:
-            shutil.copy2(source_path, destination_path)
-            return unique_file_name
+            image_name = lay_kho_anh().luu_anh(source_path)
         except Exception:
             QMessageBox.critical(self, "Lỗi sao chép", "Không thể sao chép tệp ảnh. Vui lòng kiểm tra quyền truy cập.")
             return None
+        if image_name is None:
+            QMessageBox.critical(self, "Lỗi", "Không tìm thấy tệp ảnh đã chọn. Vui lòng chọn lại ảnh.")
+        return image_name
 
     def _validate_and_save(self):
+        if self.bo_nhap_anh.dang_xu_ly():
+            QMessageBox.information(self, "Thông báo", "Ảnh đang được xử lý, vui lòng đợi trong giây lát.")
+            return
+
         front_text = self.ui.textEditFront.toPlainText().strip()
         back_text = self.ui.textEditBack.toPlainText().strip()
 
@@ -888,27 +1340,14 @@ class FlashcardThemSua(QDialog):
             return
 
         image_front_name = self._copy_image_to_storage(self.temp_image_front_path)
+        if self.temp_image_front_path and not image_front_name:
+            return # Không lưu thẻ thiếu ảnh mới mà không báo; cửa sổ vẫn mở để chọn lại
         image_back_name = self._copy_image_to_storage(self.temp_image_back_path)
+        if self.temp_image_back_path and not image_back_name:
+            return
 
-        # Nếu đang chỉnh sửa và có ảnh mới -> xóa ảnh cũ
-        if self.flashcard_to_edit:
-            # Mặt trước
-            if self.temp_image_front_path:
-                old_front_path = os.path.join("data", "flashcard_images", self.flashcard_to_edit.image_front_path)
-                if os.path.exists(old_front_path):
-                    try:
-                        os.remove(old_front_path)
-                    except Exception as e:
-                        print(f"Lỗi khi xóa ảnh cũ mặt trước: {e}")
-
-            # Mặt sau
-            if self.temp_image_back_path:
-                old_back_path = os.path.join("data", "flashcard_images", self.flashcard_to_edit.image_back_path)
-                if os.path.exists(old_back_path):
-                    try:
-                        os.remove(old_back_path)
-                    except Exception as e:
-                        print(f"Lỗi khi xóa ảnh cũ mặt sau: {e}")
+        # Không xóa ảnh cũ ở đây: một ảnh có thể được nhiều thẻ dùng chung,
+        # ảnh không còn thẻ nào tham chiếu sẽ được luồng dọn dẹp của kho ảnh xóa.
 
         # Nếu ảnh mới không có (người dùng không đổi) -> giữ nguyên ảnh cũ
         if not image_front_name and self.flashcard_to_edit:
@@ -917,10 +1356,22 @@ class FlashcardThemSua(QDialog):
         if not image_back_name and self.flashcard_to_edit:
             image_back_name = self.flashcard_to_edit.image_back_path
 
+        # Phát hiện ngôn ngữ một lần khi lưu (chỉ khi nội dung thay đổi) để lúc học chỉ cần tra giọng đọc
+        if self.flashcard_to_edit and self.flashcard_to_edit.front_text == front_text:
+            front_lang = self.flashcard_to_edit.front_lang
+        else:
+            front_lang = phat_hien_ngon_ngu(front_text)
+        if self.flashcard_to_edit and self.flashcard_to_edit.back_text == back_text:
+            back_lang = self.flashcard_to_edit.back_lang
+        else:
+            back_lang = phat_hien_ngon_ngu(back_text)
+
         # Tạo hoặc cập nhật flashcard
         if self.flashcard_to_edit:
             self.flashcard_to_edit.front_text = front_text
             self.flashcard_to_edit.back_text = back_text
+            self.flashcard_to_edit.front_lang = front_lang
+            self.flashcard_to_edit.back_lang = back_lang
             self.flashcard_to_edit.image_front_path = image_front_name
             self.flashcard_to_edit.image_back_path = image_back_name
             self.edited_flashcard = self.flashcard_to_edit
@@ -929,12 +1380,24 @@ class FlashcardThemSua(QDialog):
                 front_text=front_text,
                 back_text=back_text,
                 image_front_path=image_front_name,
-                image_back_path=image_back_name
+                image_back_path=image_back_name,
+                front_lang=front_lang,
+                back_lang=back_lang
             )
 
         self.card_saved.emit(self.edited_flashcard)
         self.close()
 
+    def done(self, result):
+        # Mọi cách đóng cửa sổ (Lưu, Hủy, Esc, nút X) đều qua done(): thẻ đã lưu thì đã tham chiếu ảnh,
+        # còn ảnh của thẻ bị bỏ thì bỏ ghim để luồng dọn dẹp xóa
+        self.bo_nhap_anh.huy()
+        kho_anh = lay_kho_anh()
+        for image_name in self._pinned_images.values():
+            kho_anh.bo_ghim(image_name)
+        self._pinned_images.clear()
+        super().done(result)
+
 class FlashcardQuanLy(QDialog):
     """
     Cửa sổ pop-up Quản lý Flashcard và Thống kê.
@@ -1125,7 +1588,8 @@ class FlashcardQuanLy(QDialog):
                 QMessageBox.information(self, "Thông báo", "Không có flashcard nào trong bộ sưu tập của bạn.")
                 return
 
-        self.study_popup_instance = FlashcardHoc(cards_to_study, self.user_id, self.db, self)
+        prepare_audio = hasattr(self.ui, 'checkBoxPrepareAudio') and self.ui.checkBoxPrepareAudio.isChecked()
+        self.study_popup_instance = FlashcardHoc(cards_to_study, self.user_id, self.db, self, prepare_audio=prepare_audio)
         self.study_popup_instance.finished.connect(self._handle_study_finished)
         self.study_popup_instance.show()
 
@@ -1133,23 +1597,98 @@ class FlashcardQuanLy(QDialog):
         self.load_flashcards()
         self.update_statistics()
 
+class FlipCardOverlay(QWidget):
+    """
+    Lớp phủ vẽ hiệu ứng lật thẻ từ ảnh chụp sẵn của hai mặt.
+    Mỗi khung hình chỉ xoay ảnh bằng QTransform, không đổi geometry hay vẽ lại rich text của nhãn.
+    """
+    flip_finished = pyqtSignal()
+
+    def __init__(self, parent=None, duration=400):
+        super().__init__(parent)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.setAutoFillBackground(True) # Che nhãn phía dưới trong lúc lật
+        self.hide()
+
+        self._front_pixmap = QPixmap()
+        self._back_pixmap = QPixmap()
+        self._progress = 0.0
+
+        self._animation = QVariantAnimation(self)
+        self._animation.setStartValue(0.0)
+        self._animation.setEndValue(1.0)
+        self._animation.setDuration(duration)
+        self._animation.setEasingCurve(QEasingCurve.Type.InOutQuad)
+        self._animation.valueChanged.connect(self._on_value_changed)
+        self._animation.finished.connect(self._on_finished)
+
+    def is_running(self):
+        return self._animation.state() == QAbstractAnimation.State.Running
+
+    def start_flip(self, front_pixmap, back_pixmap, geometry):
+        self._front_pixmap = front_pixmap
+        self._back_pixmap = back_pixmap
+        self._progress = 0.0
+        self.setGeometry(geometry)
+        self.show()
+        self.raise_()
+        self._animation.start()
+
+    def stop_flip(self):
+        if self.is_running():
+            self._animation.stop()
+            self._on_finished()
+
+    def _on_value_changed(self, value):
+        self._progress = value
+        self.update()
+
+    def _on_finished(self):
+        self.hide()
+        self._front_pixmap = QPixmap()
+        self._back_pixmap = QPixmap()
+        self.flip_finished.emit()
+
+    def paintEvent(self, event):
+        # Nửa đầu quay mặt trước từ 0 -> 90 độ, nửa sau quay mặt sau từ -90 -> 0 độ quanh trục Y
+        if self._progress < 0.5:
+            pixmap = self._front_pixmap
+            angle = 180.0 * self._progress
+        else:
+            pixmap = self._back_pixmap
+            angle = 180.0 * self._progress - 180.0
+        if pixmap.isNull():
+            return
+
+        center_x = self.width() / 2
+        center_y = self.height() / 2
+        transform = QTransform()
+        transform.translate(center_x, center_y)
+        transform.rotate(angle, Qt.Axis.YAxis)
+        transform.translate(-center_x, -center_y)
+
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        painter.setTransform(transform)
+        painter.drawPixmap(0, 0, pixmap)
+        painter.end()
+
 class FlashcardHoc(QDialog):
     """
     Cửa sổ pop-up Học Flashcard.
     """
-    def __init__(self, flashcards_to_study, user_id, db_instance, parent=None):
+    def __init__(self, flashcards_to_study, user_id, db_instance, parent=None, prepare_audio=False):
         super().__init__(parent)
         self.ui = uic.loadUi("ui/Flashcard_Study_Popup.ui", self)
-        self.anim1 = None # Khởi tạo các biến animation là None
-        self.anim2 = None
-        self.original_card_geometry = None # Đảm bảo biến này được khởi tạo
         self.flashcards = flashcards_to_study
         self.user_id = user_id
         self.db = db_instance
         self.current_card_index = 0
         self.is_front_side = True
-        self.original_card_geometry = None
-        self.speak_thread = None
+        self.speak_service = get_speak_service()
+        self.speak_service.error.connect(self._on_speak_error)
+        self.audio_prepare_thread = None
+        self.window_title = self.windowTitle()
 
         if not self.flashcards:
             QMessageBox.information(self, "Thông báo", "Không có thẻ nào để học.")
@@ -1159,6 +1698,9 @@ class FlashcardHoc(QDialog):
         self.setup_card_display()
         self.show_current_card()
 
+        if prepare_audio:
+            self.start_audio_preparation()
+
         self.ui.pushButtonFlip.clicked.connect(self.flip_card_animation)
         self.ui.pushButtonPrevious.clicked.connect(self.show_previous_card)
         self.ui.pushButtonNext.clicked.connect(self.show_next_card)
@@ -1174,6 +1716,9 @@ class FlashcardHoc(QDialog):
         self.ui.label_flashcard.setWordWrap(True)
         self.ui.label_flashcard.setTextFormat(Qt.TextFormat.RichText)
 
+        self.flip_overlay = FlipCardOverlay(self.ui.label_flashcard.parentWidget())
+        self.flip_overlay.flip_finished.connect(lambda: self.ui.pushButtonFlip.setEnabled(True))
+
     def show_current_card(self):
         if not self.flashcards:
             self.ui.label_flashcard.setText("Không có thẻ nào để học.")
@@ -1225,46 +1770,18 @@ class FlashcardHoc(QDialog):
         self.ui.pushButtonNext.setEnabled(self.current_card_index < len(self.flashcards) - 1)
 
     def flip_card_animation(self):
+        if self.flip_overlay.is_running():
+            return
         # Vô hiệu hoá nút Flip để tránh bấm liên tục
         self.ui.pushButtonFlip.setEnabled(False)
 
-        # Dừng animation cũ nếu chúng đang chạy
-        if self.anim1 and self.anim1.state() == QAbstractAnimation.State.Running:
-            self.anim1.stop()
-        if self.anim2 and self.anim2.state() == QAbstractAnimation.State.Running:
-            self.anim2.stop()
-
-        self.original_card_geometry = self.ui.label_flashcard.geometry()
-        center_x = self.original_card_geometry.x() + self.original_card_geometry.width() / 2
-
-        animation_duration = 200
-
-        self.anim1 = QPropertyAnimation(self.ui.label_flashcard, b"geometry")
-        self.anim1.setDuration(animation_duration)
-        self.anim1.setStartValue(self.original_card_geometry)
-        self.anim1.setEndValue(QRect(int(center_x), self.original_card_geometry.y(), 0, self.original_card_geometry.height()))
-        self.anim1.setEasingCurve(QEasingCurve.Type.OutQuad)
-        self.anim1.finished.connect(self.mid_flip_action)
-        self.anim1.start()
-    
-    def mid_flip_action(self):
+        # Chụp hai mặt thẻ một lần, sau đó lớp phủ chỉ xoay hai ảnh này
+        front_pixmap = self.ui.label_flashcard.grab()
         self.is_front_side = not self.is_front_side
         self.show_current_card()
+        back_pixmap = self.ui.label_flashcard.grab()
 
-        animation_duration = 200
-        center_x_for_anim2_start = self.original_card_geometry.x() + self.original_card_geometry.width() / 2
-
-        self.anim2 = QPropertyAnimation(self.ui.label_flashcard, b"geometry")
-        self.anim2.setDuration(animation_duration)
-        self.anim2.setStartValue(QRect(int(center_x_for_anim2_start), self.original_card_geometry.y(), 0, self.original_card_geometry.height()))
-        self.anim2.setEndValue(self.original_card_geometry)
-        self.anim2.setEasingCurve(QEasingCurve.Type.InQuad)
-
-        # ✅ Bật lại nút flip sau khi animation hoàn tất
-        self.anim2.finished.connect(lambda: self.ui.pushButtonFlip.setEnabled(True))
-
-        self.anim2.start()
-            
+        self.flip_overlay.start_flip(front_pixmap, back_pixmap, self.ui.label_flashcard.geometry())
 
     def evaluate_card(self, status):
         if not self.flashcards:
@@ -1293,27 +1810,47 @@ class FlashcardHoc(QDialog):
         
         current_card = self.flashcards[self.current_card_index]
         text_to_speak = current_card.front_text if self.is_front_side else current_card.back_text
+        lang = current_card.front_lang if self.is_front_side else current_card.back_lang
 
         if not text_to_speak.strip():
             QMessageBox.information(self, "Thông báo", "Văn bản trống, không thể phát âm.")
             return
 
-        if self.speak_thread and self.speak_thread.isRunning():
-            self.speak_thread.stop_speaking()
-            self.speak_thread.wait()
+        # Không chờ câu trước dừng: dịch vụ phát âm tự hủy yêu cầu cũ, chỉ đọc câu mới nhất
+        self.speak_service.speak(text_to_speak, lang)
+
+    def start_audio_preparation(self):
+        """Tổng hợp trước âm thanh hai mặt của mọi thẻ theo thứ tự học, chạy nền."""
+        texts = []
+        for card in self.flashcards:
+            texts.append((card.front_text, card.front_lang))
+            texts.append((card.back_text, card.back_lang))
+        self.audio_prepare_thread = AudioPrepareThread(texts, parent=self)
+        self.audio_prepare_thread.progress_updated.connect(self._on_audio_prepare_progress)
+        self.audio_prepare_thread.prepare_finished.connect(self._on_audio_prepare_finished)
+        self.audio_prepare_thread.start()
+
+    def _on_audio_prepare_progress(self, done, total):
+        self.setWindowTitle(f"{self.window_title} - Đang chuẩn bị âm thanh {done}/{total}")
+
+    def _on_audio_prepare_finished(self, succeeded, failed):
+        if failed:
+            self.setWindowTitle(f"{self.window_title} - Âm thanh: {succeeded} sẵn sàng, {failed} lỗi")
+        else:
+            self.setWindowTitle(self.window_title)
 
-        self.speak_thread = SpeakService(text_to_speak)
-        self.speak_thread.error.connect(lambda msg: QMessageBox.warning(self, "Lỗi Phát Âm", msg))
-        self.speak_thread.finished.connect(lambda: None)
-        self.speak_thread.start()
+    def _on_speak_error(self, message):
+        QMessageBox.warning(self, "Lỗi Phát Âm", message)
 
     def show_previous_card(self):
+        self.flip_overlay.stop_flip()
         if self.current_card_index > 0:
             self.current_card_index -= 1
             self.is_front_side = True
             self.show_current_card()
 
     def show_next_card(self):
+        self.flip_overlay.stop_flip()
         if self.current_card_index < len(self.flashcards) - 1:
             self.current_card_index += 1
             self.is_front_side = True
@@ -1322,11 +1859,18 @@ class FlashcardHoc(QDialog):
             QMessageBox.information(self, "Hoàn thành", "Bạn đã hoàn thành phiên học!")
             self.close()
 
-    def closeEvent(self, event):
-        if self.speak_thread and self.speak_thread.isRunning():
-            self.speak_thread.stop_speaking()
-            self.speak_thread.wait()
-        super().closeEvent(event)
+    def done(self, result):
+        # Mọi cách đóng hộp thoại (nút X, Esc, close() khi học xong) đều qua done(); closeEvent không chạy khi nhấn Esc.
+        # Chờ luồng chuẩn bị âm thanh dừng hẳn trước khi hộp thoại (cha của luồng) có thể bị xóa.
+        if self.audio_prepare_thread and self.audio_prepare_thread.isRunning():
+            self.audio_prepare_thread.cancel()
+            self.audio_prepare_thread.wait()
+        self.speak_service.stop_speaking()
+        try:
+            self.speak_service.error.disconnect(self._on_speak_error)
+        except TypeError:
+            pass # Không làm gì nếu chưa được kết nối hoặc đã ngắt ở lần gọi trước
+        super().done(result)
 
 class Nhap(QDialog):
     def __init__(self, parent=None):
@@ -1490,6 +2034,7 @@ class TrangChu(QMainWindow):
         self.selected_profile_image_path_temp = None
         self.current_user_data = None
         self.db = None
+        self.language_detect_thread = None
         self.user_id = None
         self.dialogs = [] 
         # Timer chính cho đếm ngược
@@ -1704,11 +2249,16 @@ class TrangChu(QMainWindow):
         if self.bo_dem_dich.isActive():
             self.bo_dem_dich.stop()
 
-        van_ban_da_dich = self.dich_gia.translate(
-            text=van_ban,
-            target=dich,
-            source=nguon if nguon != 'auto' else None
-        )
+        # Tra bộ nhớ dịch trước, chỉ gọi mạng khi câu này chưa từng được dịch
+        bo_nho_dich = lay_bo_nho_dich()
+        van_ban_da_dich = bo_nho_dich.lay(nguon, dich, van_ban)
+        if van_ban_da_dich is None:
+            van_ban_da_dich = self.dich_gia.translate(
+                text=van_ban,
+                target=dich,
+                source=nguon if nguon != 'auto' else None
+            )
+            bo_nho_dich.luu(nguon, dich, van_ban, van_ban_da_dich)
         self.output_text_3.setPlainText(van_ban_da_dich)
 
     def ngon_ngu_thay_doi(self):
@@ -1862,6 +2412,9 @@ class TrangChu(QMainWindow):
             self.hop_thong_bao.warning(self, "Lỗi", "Không thể cập nhật thông tin người dùng.")
 
     def dang_xuat(self):
+        self.stop_language_detection()
+        if self.db is not None:
+            self.db.huy_dang_ky_kho_anh()
         self.close()
         man_hinh_dang_nhap.show()
 
@@ -1872,15 +2425,41 @@ class TrangChu(QMainWindow):
         self.thiet_lap_thoi_gian(0)
 
     def set_current_user(self, user_data, db_instance):
+        if self.db is not None and self.db is not db_instance:
+            self.db.huy_dang_ky_kho_anh() # Đổi người dùng/đối tượng dữ liệu: bỏ nguồn của đối tượng cũ
         self.current_user_data = user_data
         self.db = db_instance
         self.user_id = user_data.get("id")
+        self.db.dang_ky_kho_anh()
+        self.start_language_detection()
         
         # Gọi tất cả các hàm cần thiết sau khi thiết lập user
         self.hien_thi_thong_tin_nguoi_dung()
         self.hien_thi_anh_dai_dien()
         self.tai_va_hien_thi_phuong_phap_hoc()
 
+    def start_language_detection(self):
+        """Bổ sung mã ngôn ngữ cho thẻ cũ của người dùng ở luồng nền, không chặn màn hình lúc đăng nhập."""
+        self.stop_language_detection()
+        items = self.db.lay_van_ban_chua_co_ngon_ngu(self.user_id)
+        if not items:
+            return
+        if self.language_detect_thread is None:
+            # Lần đầu: dừng luồng khi thoát ứng dụng để QThread không bị hủy lúc còn chạy
+            QApplication.instance().aboutToQuit.connect(self.stop_language_detection)
+        self.language_detect_thread = LanguageDetectThread(self.user_id, items, parent=self)
+        self.language_detect_thread.languages_detected.connect(self._on_languages_detected)
+        self.language_detect_thread.start()
+
+    def stop_language_detection(self):
+        if self.language_detect_thread is not None and self.language_detect_thread.isRunning():
+            self.language_detect_thread.cancel()
+            self.language_detect_thread.wait()
+
+    def _on_languages_detected(self, user_id, results):
+        if self.db is not None:
+            self.db.cap_nhat_ngon_ngu_the(user_id, results)
+
     def tai_va_hien_thi_phuong_phap_hoc(self):
         self.ui.comboBoxStudy.clear()
         self.ui.comboBoxTime.clear()
@@ -2314,9 +2893,11 @@ class DangKy(QMainWindow):
             self.xu_ly_dang_ky()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Cần cho các tiến trình phiên âm khi đóng gói thành file chạy
     if not os.path.exists("data/avatars"):
         os.makedirs("data/avatars")
     ung_dung = QApplication(sys.argv)
+    ung_dung.aboutToQuit.connect(lay_kho_anh().dung_don_dep) # Dừng luồng dọn ảnh trước khi thoát
     man_hinh_dang_nhap = DangNhap()
     man_hinh_trang_chu = TrangChu()
     man_hinh_dang_ky = DangKy()
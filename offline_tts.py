@@ -0,0 +1,113 @@
+# offline_tts.py
+import concurrent.futures
+import queue
+import threading
+
+import pyttsx3
+
+
+def _ma_ngon_ngu_cua_giong(voice_obj):
+    """Lấy các mã ngôn ngữ chính (vd: 'en', 'vi') từ thuộc tính languages của giọng pyttsx3."""
+    cac_ma = set()
+    for ngon_ngu in getattr(voice_obj, "languages", None) or []:
+        if isinstance(ngon_ngu, bytes):
+            # espeak trả về bytes với byte đầu là độ ưu tiên, vd: b'\x05en-us'
+            ngon_ngu = ngon_ngu.lstrip(bytes(range(32))).decode("utf-8", errors="ignore")
+        ngon_ngu = str(ngon_ngu).strip().lower().replace("_", "-")
+        if ngon_ngu:
+            cac_ma.add(ngon_ngu.split("-")[0])
+    return cac_ma
+
+
+def xay_bang_giong(cac_giong, tu_khoa_theo_ngon_ngu):
+    """
+    Dựng bảng mã ngôn ngữ -> id giọng đọc một lần duy nhất.
+    Ưu tiên giọng khai báo đúng ngôn ngữ, sau đó mới khớp theo từ khóa trong tên/id (vd: 'vietnamese').
+    """
+    bang_giong = {}
+    for voice_obj in cac_giong:
+        for ma in _ma_ngon_ngu_cua_giong(voice_obj):
+            bang_giong.setdefault(ma, voice_obj.id)
+
+    for ma, tu_khoa in tu_khoa_theo_ngon_ngu.items():
+        if ma in bang_giong or not tu_khoa:
+            continue
+        tu_khoa = tu_khoa.lower()
+        for voice_obj in cac_giong:
+            if tu_khoa in (voice_obj.name or "").lower() or tu_khoa in (voice_obj.id or "").lower():
+                bang_giong[ma] = voice_obj.id
+                break
+    return bang_giong
+
+
+class DongCoDocOffline:
+    """
+    Một engine pyttsx3 duy nhất chạy trên luồng riêng suốt vòng đời ứng dụng.
+    Engine chỉ được khởi tạo và quét danh sách giọng một lần; mỗi lần đọc chỉ là tra bảng và say().
+    """
+    def __init__(self, tu_khoa_theo_ngon_ngu=None, ngon_ngu_mac_dinh="en"):
+        self.tu_khoa_theo_ngon_ngu = tu_khoa_theo_ngon_ngu or {}
+        self.ngon_ngu_mac_dinh = ngon_ngu_mac_dinh
+        self.bang_giong = {}
+        self._engine = None
+        self._loi_khoi_tao = None
+        self._giong_hien_tai = None
+        self._hang_doi = queue.Queue()
+        self._san_sang = threading.Event()
+        self._luong = threading.Thread(target=self._vong_lap, name="DongCoDocOffline", daemon=True)
+        self._luong.start()
+
+    def _vong_lap(self):
+        try:
+            self._engine = pyttsx3.init()
+            self.bang_giong = xay_bang_giong(self._engine.getProperty('voices'), self.tu_khoa_theo_ngon_ngu)
+        except Exception as e:
+            self._loi_khoi_tao = e
+        finally:
+            self._san_sang.set()
+
+        while True:
+            yeu_cau = self._hang_doi.get()
+            if yeu_cau is None:
+                break
+            van_ban, ma_ngon_ngu, ket_qua = yeu_cau
+            if not ket_qua.set_running_or_notify_cancel():
+                continue # Yêu cầu đã bị hủy khi còn trong hàng đợi
+            if self._loi_khoi_tao is not None:
+                ket_qua.set_exception(self._loi_khoi_tao)
+                continue
+            try:
+                id_giong = self.bang_giong.get(ma_ngon_ngu) or self.bang_giong.get(self.ngon_ngu_mac_dinh)
+                if id_giong and id_giong != self._giong_hien_tai:
+                    self._engine.setProperty('voice', id_giong)
+                    self._giong_hien_tai = id_giong
+                self._engine.say(van_ban)
+                self._engine.runAndWait()
+                ket_qua.set_result(None)
+            except Exception as e:
+                ket_qua.set_exception(e)
+
+    def doc(self, van_ban, ma_ngon_ngu=None):
+        """Đưa văn bản vào hàng đợi đọc, trả về concurrent.futures.Future hoàn tất khi đọc xong."""
+        ket_qua = concurrent.futures.Future()
+        self._hang_doi.put((van_ban, ma_ngon_ngu, ket_qua))
+        return ket_qua
+
+    def dung(self):
+        """Bỏ các yêu cầu đang chờ và dừng câu đang đọc."""
+        while True:
+            try:
+                yeu_cau = self._hang_doi.get_nowait()
+            except queue.Empty:
+                break
+            if yeu_cau is not None:
+                yeu_cau[2].cancel()
+        if self._engine is not None:
+            try:
+                self._engine.stop()
+            except Exception:
+                pass
+
+    def tat(self):
+        self.dung()
+        self._hang_doi.put(None)
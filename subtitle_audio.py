@@ -0,0 +1,96 @@
+# subtitle_audio.py
+import concurrent.futures
+import os
+import subprocess
+import tempfile
+import threading
+
+import numpy as np
+
+TAN_SO_LAY_MAU_ASR = 16000
+KICH_THUOC_KHOI_DOC = 1 << 20  # Đọc stdout của ffmpeg từng khối 1 MB
+
+
+def lenh_trich_xuat_am_thanh(duong_dan_video, tan_so=TAN_SO_LAY_MAU_ASR, bat_dau=None, do_dai=None):
+    """
+    Lệnh ffmpeg giải mã luồng âm thanh đầu tiên thẳng thành PCM float32 mono ra stdout.
+    Có bat_dau/do_dai (giây) thì chỉ giải mã đoạn đó (-ss trước -i: tua thẳng, không giải mã từ đầu).
+    """
+    lenh = ["ffmpeg", "-nostdin", "-v", "error"]
+    if bat_dau is not None:
+        lenh += ["-ss", f"{bat_dau:.3f}"]
+    if do_dai is not None:
+        lenh += ["-t", f"{do_dai:.3f}"]
+    return lenh + [
+        "-i", duong_dan_video,
+        "-map", "0:a:0",  # Chỉ lấy luồng âm thanh đầu tiên
+        "-vn",
+        "-ac", "1",
+        "-ar", str(tan_so),
+        "-f", "f32le",
+        "-"
+    ]
+
+
+def trich_xuat_am_thanh(duong_dan_video, tan_so=TAN_SO_LAY_MAU_ASR, da_huy=None, duong_dan_pcm=None,
+                        bat_dau=None, do_dai=None):
+    """
+    Trích xuất âm thanh đúng định dạng đầu vào của Whisper (16 kHz mono float32) và trả về np.memmap.
+
+    Dữ liệu PCM được chép từ pipe của ffmpeg vào một file tạm ẩn danh (tự xóa khi đóng) rồi ánh xạ
+    vào bộ nhớ, nên không phải mã hóa MP3 rồi giải mã lại, và video nhiều giờ cũng không phải nằm
+    hết trong RAM. Lỗi của ffmpeg được nâng thành subprocess.CalledProcessError như subprocess.run.
+    da_huy (threading.Event) được đặt thì dừng ffmpeg và nâng concurrent.futures.CancelledError.
+    Có duong_dan_pcm thì PCM được ghi vào file đó (để bộ nhớ đệm giai đoạn giữ lại) thay vì file ẩn danh;
+    file bị xóa nếu trích xuất thất bại. bat_dau/do_dai (giây) giới hạn việc trích xuất trong một đoạn.
+    """
+    lenh = lenh_trich_xuat_am_thanh(duong_dan_video, tan_so, bat_dau, do_dai)
+    if duong_dan_pcm:
+        tep_pcm = open(duong_dan_pcm, "w+b")
+    else:
+        tep_pcm = tempfile.TemporaryFile(prefix="zentask_pcm_")
+
+    def bo_tep_pcm():
+        tep_pcm.close()
+        if duong_dan_pcm and os.path.exists(duong_dan_pcm):
+            os.remove(duong_dan_pcm)
+
+    tien_trinh = subprocess.Popen(lenh, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # Đọc stderr trên luồng riêng để ffmpeg không bị chặn khi pipe stderr đầy
+    loi = []
+    luong_loi = threading.Thread(target=lambda: loi.append(tien_trinh.stderr.read()), daemon=True)
+    luong_loi.start()
+    try:
+        while True:
+            if da_huy is not None and da_huy.is_set():
+                raise concurrent.futures.CancelledError()
+            khoi = tien_trinh.stdout.read(KICH_THUOC_KHOI_DOC)
+            if not khoi:
+                break
+            tep_pcm.write(khoi)
+    except BaseException:
+        tien_trinh.kill()
+        bo_tep_pcm()
+        raise
+    finally:
+        tien_trinh.stdout.close()
+        ma_thoat = tien_trinh.wait()
+        luong_loi.join()
+
+    stderr = b"".join(loi).decode("utf-8", errors="replace")
+    if ma_thoat != 0:
+        bo_tep_pcm()
+        raise subprocess.CalledProcessError(ma_thoat, lenh, stderr=stderr)
+
+    so_mau = tep_pcm.tell() // np.dtype(np.float32).itemsize
+    if so_mau == 0:
+        bo_tep_pcm()
+        raise ValueError("Video không có âm thanh để nhận diện.")
+    tep_pcm.flush()
+    return np.memmap(tep_pcm, dtype=np.float32, mode="r", shape=(so_mau,))
+
+
+def doc_am_thanh_pcm(duong_dan_pcm):
+    """Ánh xạ file PCM float32 mono đã trích xuất trước đó (vd: từ bộ nhớ đệm giai đoạn) thành np.memmap."""
+    return np.memmap(duong_dan_pcm, dtype=np.float32, mode="r")
@@ -0,0 +1,235 @@
+# subtitle_cache.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+THU_MUC_CACHE_PHU_DE = os.path.join("data", "subtitle_cache")
+DUNG_LUONG_TOI_DA_CACHE_PHU_DE = 5 * 1024 * 1024 * 1024  # 5 GB (âm thanh PCM chiếm phần lớn)
+TI_LE_SAU_DON_DEP = 0.9  # Dọn xuống dưới 90% dung lượng để không phải quét lại ngay ở lần lưu kế tiếp
+KICH_THUOC_KHOI_BAM = 4 * 1024 * 1024
+
+GIAI_DOAN_AM_THANH = "audio"  # PCM 16 kHz mono float32 (.f32)
+GIAI_DOAN_PHIEN_AM = "transcript"  # Các đoạn Whisper gốc (.json)
+GIAI_DOAN_DICH = "translation"  # Các đoạn đã dịch (.json)
+GIAI_DOAN_SRT = "srt"  # File phụ đề hoàn chỉnh (.srt)
+DUOI_TEP_THEO_GIAI_DOAN = {
+    GIAI_DOAN_AM_THANH: ".f32",
+    GIAI_DOAN_PHIEN_AM: ".json",
+    GIAI_DOAN_DICH: ".json",
+    GIAI_DOAN_SRT: ".srt",
+}
+
+
+def bam_noi_dung_tep(duong_dan):
+    """SHA-256 của toàn bộ nội dung file, đọc từng khối để không nạp cả video vào bộ nhớ."""
+    bam = hashlib.sha256()
+    with open(duong_dan, "rb") as f:
+        for khoi in iter(lambda: f.read(KICH_THUOC_KHOI_BAM), b""):
+            bam.update(khoi)
+    return bam.hexdigest()
+
+
+def _kich_thuoc_tep(duong_dan):
+    try:
+        return os.path.getsize(duong_dan)
+    except OSError:
+        return 0
+
+
+class BoNhoDemGiaiDoan:
+    """
+    Lưu kết quả từng giai đoạn của pipeline phụ đề, khóa theo mã băm nội dung video cộng tham số
+    của giai đoạn (và khóa của giai đoạn trước). Chạy lại cùng video chỉ làm lại các giai đoạn có
+    tham số khác: năm ngôn ngữ phụ đề chỉ tốn một lần tách âm thanh và một lần phiên âm.
+
+    Mã băm video được ghi nhớ theo (đường dẫn, kích thước, mtime) để không phải đọc lại file nhiều GB.
+    Tổng dung lượng được cộng dồn ở mỗi lần lưu (chỉ quét thư mục một lần lúc đầu); khi vượt dung
+    lượng, các kết quả lâu không dùng nhất (mtime cũ nhất) bị xóa trước. Chỉ mục băm không bao giờ bị xóa.
+    """
+    def __init__(self, thu_muc=THU_MUC_CACHE_PHU_DE, dung_luong_toi_da=DUNG_LUONG_TOI_DA_CACHE_PHU_DE):
+        self.thu_muc = os.path.abspath(thu_muc)
+        self.dung_luong_toi_da = dung_luong_toi_da
+        self._khoa = threading.Lock()
+        self._duong_dan_chi_muc = os.path.join(self.thu_muc, "hash_index.json")
+        self._chi_muc_bam = None
+        self._tong_kich_thuoc = 0  # Tổng dung lượng kết quả các giai đoạn, cộng dồn ở mỗi lần lưu
+        self._da_quet = False
+        self._dang_don_dep = False
+
+    # --- Mã băm video ---
+
+    def _tai_chi_muc(self):
+        if self._chi_muc_bam is None:
+            try:
+                with open(self._duong_dan_chi_muc, "r", encoding="utf-8") as f:
+                    self._chi_muc_bam = json.load(f)
+            except (OSError, ValueError):
+                self._chi_muc_bam = {}
+        return self._chi_muc_bam
+
+    def bam_video(self, duong_dan_video):
+        duong_dan = os.path.abspath(duong_dan_video)
+        thong_tin = os.stat(duong_dan)
+        dau_hieu = f"{thong_tin.st_size}:{thong_tin.st_mtime_ns}"
+        with self._khoa:
+            muc = self._tai_chi_muc().get(duong_dan)
+            if muc and muc.get("signature") == dau_hieu:
+                return muc["sha256"]
+
+        ma_bam = bam_noi_dung_tep(duong_dan)
+        with self._khoa:
+            self._tai_chi_muc()[duong_dan] = {"signature": dau_hieu, "sha256": ma_bam}
+            self._ghi_nguyen_tu(self._duong_dan_chi_muc, json.dumps(self._chi_muc_bam).encode("utf-8"))
+        return ma_bam
+
+    # --- Khóa và đường dẫn ---
+
+    @staticmethod
+    def tao_khoa(khoa_dau_vao, giai_doan, **tham_so):
+        """Khóa của một giai đoạn: băm của khóa đầu vào (mã băm video hoặc khóa giai đoạn trước) và tham số."""
+        noi_dung = json.dumps({"input": khoa_dau_vao, "stage": giai_doan, "params": tham_so},
+                              sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(noi_dung.encode("utf-8")).hexdigest()
+
+    def duong_dan(self, giai_doan, khoa):
+        return os.path.join(self.thu_muc, giai_doan, khoa[:2], khoa + DUOI_TEP_THEO_GIAI_DOAN[giai_doan])
+
+    def co(self, giai_doan, khoa):
+        duong_dan = self.duong_dan(giai_doan, khoa)
+        try:
+            if os.path.getsize(duong_dan) == 0:
+                return False
+        except OSError:
+            return False
+        try:
+            os.utime(duong_dan, None)  # Đánh dấu vừa dùng cho LRU
+        except OSError:
+            pass
+        return True
+
+    # --- Đọc/ghi ---
+
+    def _ghi_nguyen_tu(self, duong_dan, du_lieu):
+        os.makedirs(os.path.dirname(duong_dan), exist_ok=True)
+        fd, duong_dan_tam = tempfile.mkstemp(dir=os.path.dirname(duong_dan), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(du_lieu)
+            os.replace(duong_dan_tam, duong_dan)
+        finally:
+            if os.path.exists(duong_dan_tam):
+                os.remove(duong_dan_tam)
+
+    def lay_json(self, giai_doan, khoa):
+        """Trả về dữ liệu JSON đã lưu hoặc None nếu chưa có hay file hỏng."""
+        if not self.co(giai_doan, khoa):
+            return None
+        try:
+            with open(self.duong_dan(giai_doan, khoa), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def luu_json(self, giai_doan, khoa, du_lieu):
+        self._luu_ket_qua(self.duong_dan(giai_doan, khoa), json.dumps(du_lieu, ensure_ascii=False).encode("utf-8"))
+
+    def lay_van_ban(self, giai_doan, khoa):
+        if not self.co(giai_doan, khoa):
+            return None
+        try:
+            with open(self.duong_dan(giai_doan, khoa), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def luu_van_ban(self, giai_doan, khoa, van_ban):
+        self._luu_ket_qua(self.duong_dan(giai_doan, khoa), van_ban.encode("utf-8"))
+
+    def _luu_ket_qua(self, duong_dan, du_lieu):
+        kich_thuoc_cu = _kich_thuoc_tep(duong_dan)
+        self._ghi_nguyen_tu(duong_dan, du_lieu)
+        self._don_dep_neu_can(len(du_lieu) - kich_thuoc_cu)
+
+    def duong_dan_tam_cho(self, giai_doan, khoa):
+        """Đường dẫn tạm cạnh file đích, cho các giai đoạn tự ghi file lớn (vd: PCM) rồi gọi xac_nhan()."""
+        duong_dan = self.duong_dan(giai_doan, khoa)
+        os.makedirs(os.path.dirname(duong_dan), exist_ok=True)
+        return duong_dan + ".partial"
+
+    def xac_nhan(self, giai_doan, khoa):
+        """Đổi file tạm thành kết quả chính thức (chỉ xảy ra khi giai đoạn đã chạy xong)."""
+        duong_dan_tam = self.duong_dan_tam_cho(giai_doan, khoa)
+        duong_dan = self.duong_dan(giai_doan, khoa)
+        so_byte_them = _kich_thuoc_tep(duong_dan_tam) - _kich_thuoc_tep(duong_dan)
+        os.replace(duong_dan_tam, duong_dan)
+        self._don_dep_neu_can(so_byte_them)
+
+    # --- Giới hạn dung lượng ---
+
+    def _don_dep_neu_can(self, so_byte_them):
+        """
+        Cộng phần dung lượng vừa thay đổi vào tổng. Chỉ quét thư mục ở lần đầu và khi tổng vượt dung lượng;
+        việc quét và xóa chạy ngoài khóa, mỗi lúc chỉ một luồng dọn dẹp.
+        """
+        with self._khoa:
+            self._tong_kich_thuoc += so_byte_them
+            if self._dang_don_dep:
+                return
+            if self._da_quet and self._tong_kich_thuoc <= self.dung_luong_toi_da:
+                return
+            self._dang_don_dep = True
+            tong_luc_bat_dau = self._tong_kich_thuoc
+
+        con_lai = None
+        try:
+            con_lai = self._quet_va_xoa_cu_nhat()
+        finally:
+            with self._khoa:
+                if con_lai is not None:
+                    # Giữ phần thay đổi từ các lần lưu diễn ra trong lúc đang quét
+                    self._tong_kich_thuoc = con_lai + (self._tong_kich_thuoc - tong_luc_bat_dau)
+                    self._da_quet = True
+                self._dang_don_dep = False
+
+    def _quet_va_xoa_cu_nhat(self):
+        """Quét kết quả của các giai đoạn (không gồm chỉ mục băm, file tạm), xóa cũ nhất khi vượt dung lượng."""
+        cac_tep = []
+        for giai_doan, duoi in DUOI_TEP_THEO_GIAI_DOAN.items():
+            for thu_muc_goc, _, cac_ten in os.walk(os.path.join(self.thu_muc, giai_doan)):
+                for ten in cac_ten:
+                    if not ten.endswith(duoi):
+                        continue
+                    duong_dan = os.path.join(thu_muc_goc, ten)
+                    try:
+                        thong_tin = os.stat(duong_dan)
+                    except OSError:
+                        continue
+                    cac_tep.append((thong_tin.st_mtime, thong_tin.st_size, duong_dan))
+        tong = sum(kich_thuoc for _, kich_thuoc, _ in cac_tep)
+        if tong <= self.dung_luong_toi_da:
+            return tong
+        muc_tieu = self.dung_luong_toi_da * TI_LE_SAU_DON_DEP
+        for _, kich_thuoc, duong_dan in sorted(cac_tep):
+            if tong <= muc_tieu:
+                break
+            try:
+                os.remove(duong_dan)
+                tong -= kich_thuoc
+            except OSError:
+                pass
+        return tong
+
+
+_bo_nho_dem_giai_doan = None
+_khoa_bo_nho_dem = threading.Lock()
+
+
+def lay_bo_nho_dem_phu_de():
+    """Trả về bộ nhớ đệm giai đoạn dùng chung cho mọi việc tạo phụ đề."""
+    global _bo_nho_dem_giai_doan
+    with _khoa_bo_nho_dem:
+        if _bo_nho_dem_giai_doan is None:
+            _bo_nho_dem_giai_doan = BoNhoDemGiaiDoan()
+        return _bo_nho_dem_giai_doan
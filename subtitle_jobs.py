@@ -0,0 +1,196 @@
+# subtitle_jobs.py
+import datetime
+import os
+import shutil
+import threading
+import uuid
+
+from data_json import tai_du_lieu_json, ghi_du_lieu_json
+
+TEP_TRANG_THAI_VIEC = "subtitle_jobs.json"  # Nằm trong data/ như các file dữ liệu khác
+THU_MUC_VIEC = os.path.join("data", "subtitle_jobs")
+SO_VIEC_DONG_THOI_MAC_DINH = 1
+
+TRANG_THAI_CHO = "pending"
+TRANG_THAI_DANG_CHAY = "running"
+TRANG_THAI_TAM_DUNG = "paused"
+TRANG_THAI_XONG = "done"
+TRANG_THAI_LOI = "failed"
+TRANG_THAI_DA_HUY = "cancelled"
+CAC_TRANG_THAI_KET_THUC = (TRANG_THAI_XONG, TRANG_THAI_LOI, TRANG_THAI_DA_HUY)
+
+
+class HangDoiPhuDe:
+    """
+    Hàng đợi việc tạo phụ đề, lưu trạng thái (và số việc đồng thời) vào data/subtitle_jobs.json sau mỗi thay đổi.
+
+    Mỗi việc có thư mục làm việc riêng (data/subtitle_jobs/<id>/) nên nhiều video chạy cùng lúc
+    không ghi đè file của nhau. Việc đang chạy khi ứng dụng tắt được đưa về hàng chờ ở lần mở sau.
+    Lớp này chỉ giữ trạng thái; việc chạy do bên giao diện đảm nhận qua lay_viec_ke_tiep().
+    """
+    def __init__(self, ten_tep=TEP_TRANG_THAI_VIEC, thu_muc_viec=THU_MUC_VIEC,
+                 so_viec_dong_thoi=SO_VIEC_DONG_THOI_MAC_DINH):
+        self.ten_tep = ten_tep
+        self.thu_muc_viec = os.path.abspath(thu_muc_viec)
+        self._khoa = threading.RLock()
+        du_lieu = tai_du_lieu_json(self.ten_tep) or []
+        if isinstance(du_lieu, list):
+            du_lieu = {"jobs": du_lieu}  # Định dạng cũ: chỉ có danh sách việc
+        self.so_viec_dong_thoi = du_lieu.get("concurrency") or so_viec_dong_thoi
+        self.cac_viec = du_lieu.get("jobs", [])
+        for viec in self.cac_viec:
+            if viec.get("status") == TRANG_THAI_DANG_CHAY:
+                viec["status"] = TRANG_THAI_CHO  # Bị ngắt giữa chừng: chạy lại khi mở ứng dụng
+        self.luu()
+        self._xoa_thu_muc_mo_coi()
+
+    def luu(self):
+        with self._khoa:
+            ghi_du_lieu_json(self.ten_tep, {"concurrency": self.so_viec_dong_thoi, "jobs": self.cac_viec})
+
+    def dat_so_viec_dong_thoi(self, so_viec):
+        with self._khoa:
+            self.so_viec_dong_thoi = so_viec
+            self.luu()
+
+    def lay_viec(self, ma_viec):
+        with self._khoa:
+            for viec in self.cac_viec:
+                if viec["id"] == ma_viec:
+                    return viec
+        return None
+
+    def them_viec(self, duong_dan_video, ngon_ngu, che_do_dau_ra, preset_ghep_cung, bo_may_asr=None):
+        ma_viec = uuid.uuid4().hex
+        thu_muc = os.path.join(self.thu_muc_viec, ma_viec)
+        os.makedirs(thu_muc, exist_ok=True)
+        viec = {
+            "id": ma_viec,
+            "video_path": os.path.abspath(duong_dan_video),
+            "language": ngon_ngu,
+            "output_mode": che_do_dau_ra,
+            "burn_preset": preset_ghep_cung,
+            "asr_backend": bo_may_asr,  # None: bộ máy nhận diện giọng nói mặc định
+            "status": TRANG_THAI_CHO,
+            "progress": 0,
+            "work_dir": thu_muc,
+            "srt_path": os.path.join(thu_muc, "subtitles.srt"),
+            "output_path": None,
+            "error": None,
+            "metrics": [],  # Thời gian từng giai đoạn của lần chạy gần nhất (sự kiện "stage" của subtitles)
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds")
+        }
+        with self._khoa:
+            self.cac_viec.append(viec)
+            self.luu()
+        return viec
+
+    def cap_nhat(self, ma_viec, luu_ngay=True, **thay_doi):
+        with self._khoa:
+            viec = self.lay_viec(ma_viec)
+            if viec is None:
+                return None
+            viec.update(thay_doi)
+            if luu_ngay:
+                self.luu()
+            return viec
+
+    def so_viec_dang_chay(self):
+        with self._khoa:
+            return sum(1 for viec in self.cac_viec if viec["status"] == TRANG_THAI_DANG_CHAY)
+
+    def lay_viec_ke_tiep(self):
+        """Trả về việc chờ lâu nhất và đánh dấu đang chạy, hoặc None nếu đã đủ số việc đồng thời."""
+        with self._khoa:
+            if self.so_viec_dang_chay() >= self.so_viec_dong_thoi:
+                return None
+            for viec in self.cac_viec:
+                if viec["status"] == TRANG_THAI_CHO:
+                    viec.update(status=TRANG_THAI_DANG_CHAY, progress=0, error=None, metrics=[])
+                    self.luu()
+                    return viec
+        return None
+
+    def tam_dung(self, ma_viec):
+        """Tạm dừng việc đang chờ hoặc đang chạy. Trả về True nếu trạng thái thay đổi."""
+        with self._khoa:
+            viec = self.lay_viec(ma_viec)
+            if viec is None or viec["status"] not in (TRANG_THAI_CHO, TRANG_THAI_DANG_CHAY):
+                return False
+            self.cap_nhat(ma_viec, status=TRANG_THAI_TAM_DUNG)
+            return True
+
+    def tiep_tuc(self, ma_viec):
+        """Đưa việc đã tạm dừng, lỗi hoặc đã hủy về hàng chờ."""
+        with self._khoa:
+            viec = self.lay_viec(ma_viec)
+            if viec is None or viec["status"] not in (TRANG_THAI_TAM_DUNG, TRANG_THAI_LOI, TRANG_THAI_DA_HUY):
+                return False
+            self.cap_nhat(ma_viec, status=TRANG_THAI_CHO, error=None)
+            return True
+
+    def huy(self, ma_viec):
+        with self._khoa:
+            viec = self.lay_viec(ma_viec)
+            if viec is None or viec["status"] in CAC_TRANG_THAI_KET_THUC:
+                return False
+            self.cap_nhat(ma_viec, status=TRANG_THAI_DA_HUY)
+            return True
+
+    def xoa(self, ma_viec):
+        """Xóa việc không còn chạy khỏi hàng đợi cùng thư mục làm việc (video đầu ra, bản xem trước, SRT)."""
+        with self._khoa:
+            viec = self.lay_viec(ma_viec)
+            if viec is None or viec["status"] == TRANG_THAI_DANG_CHAY:
+                return False
+            self.cac_viec.remove(viec)
+            self.luu()
+        self._xoa_thu_muc_viec(viec)
+        return True
+
+    def xoa_viec_da_xong(self):
+        """Xóa mọi việc đã hoàn tất, lỗi hoặc đã hủy. Trả về số việc đã xóa."""
+        with self._khoa:
+            cac_viec_xoa = [viec for viec in self.cac_viec if viec["status"] in CAC_TRANG_THAI_KET_THUC]
+            if not cac_viec_xoa:
+                return 0
+            self.cac_viec = [viec for viec in self.cac_viec if viec["status"] not in CAC_TRANG_THAI_KET_THUC]
+            self.luu()
+        for viec in cac_viec_xoa:
+            self._xoa_thu_muc_viec(viec)
+        return len(cac_viec_xoa)
+
+    def _xoa_thu_muc_mo_coi(self):
+        """Xóa thư mục làm việc không thuộc việc nào (vd: còn sót lại khi ứng dụng tắt đột ngột lúc đang xóa)."""
+        if not os.path.isdir(self.thu_muc_viec):
+            return
+        cac_ma = {viec["id"] for viec in self.cac_viec}
+        with os.scandir(self.thu_muc_viec) as cac_muc:
+            for muc in cac_muc:
+                if muc.is_dir() and muc.name not in cac_ma:
+                    shutil.rmtree(muc.path, ignore_errors=True)
+
+    def _xoa_thu_muc_viec(self, viec):
+        # work_dir đọc từ file JSON: chỉ xóa khi nó thật sự nằm trong thư mục việc
+        thu_muc = os.path.abspath(viec.get("work_dir") or "")
+        if os.path.dirname(thu_muc) == self.thu_muc_viec:
+            shutil.rmtree(thu_muc, ignore_errors=True)
+
+    def dua_ve_hang_cho(self):
+        """Đưa các việc đang chạy về hàng chờ (khi đóng cửa sổ) để lần sau chạy tiếp."""
+        with self._khoa:
+            for viec in self.cac_viec:
+                if viec["status"] == TRANG_THAI_DANG_CHAY:
+                    viec["status"] = TRANG_THAI_CHO
+            self.luu()
+
+
+_hang_doi_phu_de = None
+
+
+def lay_hang_doi_phu_de():
+    """Trả về hàng đợi phụ đề dùng chung, để mở lại hộp thoại không tạo hai hàng đợi cùng ghi một file."""
+    global _hang_doi_phu_de
+    if _hang_doi_phu_de is None:
+        _hang_doi_phu_de = HangDoiPhuDe()
+    return _hang_doi_phu_de
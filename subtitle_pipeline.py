@@ -0,0 +1,216 @@
+# subtitle_pipeline.py
+"""
+Chạy nối tiếp dạng đường ống các giai đoạn phiên âm → dịch → ghi SRT.
+
+Mỗi giai đoạn chạy trên luồng riêng và trao dữ liệu qua hàng đợi có giới hạn: đoạn phiên âm được
+dịch ngay khi cửa sổ âm thanh của nó xong, và file SRT được ghi thêm sau mỗi lô dịch nên dùng được
+từ sớm. Tổng thời gian vì vậy gần bằng giai đoạn chậm nhất thay vì tổng các giai đoạn.
+Module này không dùng Qt.
+"""
+import concurrent.futures
+import datetime
+import queue
+import threading
+import time
+
+import srt
+
+from subtitle_translation import (
+    dich_cac_doan, GioiHanTocLuong, BoNgatMach, SO_LUONG_DICH_DONG_THOI, SO_DOAN_TOI_DA_MOI_LO, KHOANG_CACH_TOI_THIEU_GIAY
+)
+
+KICH_THUOC_HANG_DOI_DOAN = 256  # Số đoạn phiên âm tối đa chờ dịch
+THOI_GIAN_CHO_HANG_DOI_GIAY = 0.2  # Chu kỳ kiểm tra hủy khi chờ hàng đợi
+_KET_THUC = object()
+
+
+def _dat_vao(hang_doi, muc, dung):
+    """put() có giới hạn nhưng vẫn thoát được khi giai đoạn khác đã dừng."""
+    while not dung.is_set():
+        try:
+            hang_doi.put(muc, timeout=THOI_GIAN_CHO_HANG_DOI_GIAY)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _lay_ra(hang_doi, dung):
+    while not dung.is_set():
+        try:
+            return hang_doi.get(timeout=THOI_GIAN_CHO_HANG_DOI_GIAY)
+        except queue.Empty:
+            pass
+    return _KET_THUC
+
+
+class BoGhiSrtTangDan:
+    """Ghi phụ đề vào file SRT theo từng lô; file luôn là một SRT hợp lệ sau mỗi lần ghi."""
+    def __init__(self, duong_dan):
+        self.duong_dan = duong_dan
+        self.so_phu_de = 0
+        self.so_byte = 0
+        self._tep = open(duong_dan, "w", encoding="utf-8")
+
+    def ghi(self, cac_doan):
+        cac_phu_de = [
+            srt.Subtitle(index=None, start=datetime.timedelta(seconds=doan["start"]),
+                         end=datetime.timedelta(seconds=doan["end"]), content=doan["text"].strip())
+            for doan in cac_doan
+        ]
+        # Cùng quy tắc bỏ phụ đề rỗng/sai mốc và đánh số như srt.compose, nối tiếp số thứ tự các lô trước
+        cac_phu_de = list(srt.sort_and_reindex(cac_phu_de, start_index=self.so_phu_de + 1))
+        van_ban = "".join(phu_de.to_srt() for phu_de in cac_phu_de)
+        self._tep.write(van_ban)
+        self._tep.flush()
+        self.so_byte += len(van_ban.encode("utf-8"))
+        self.so_phu_de += len(cac_phu_de)
+
+    def dong(self):
+        self._tep.close()
+
+
+def chay_duong_ong_phu_de(nguon_doan, duong_dan_srt, ham_dich=None, bo_nho_dich=None, ma_nguon="auto",
+                          ma_dich=None, so_luong_dich=SO_LUONG_DICH_DONG_THOI,
+                          so_doan_toi_da_moi_lo=SO_DOAN_TOI_DA_MOI_LO,
+                          kich_thuoc_hang_doi=KICH_THUOC_HANG_DOI_DOAN, bao_tien_do=None, da_huy=None,
+                          thong_ke=None):
+    """
+    Đọc các đoạn {"start", "end", "text"} từ nguon_doan (vd: generator phien_am_tung_doan), dịch theo lô
+    bằng ham_dich (None thì giữ nguyên văn bản) và ghi dần vào duong_dan_srt theo đúng thứ tự.
+
+    Trả về (các đoạn gốc, các đoạn đã dịch, số đoạn dịch lỗi); đoạn dịch lỗi giữ nguyên văn bản gốc.
+    bao_tien_do(số đoạn đã ghi, số đoạn đã phiên âm) được gọi sau mỗi lô. Lỗi ở bất kỳ giai đoạn nào
+    dừng cả đường ống và được nâng lại ở luồng gọi; da_huy được đặt thì nâng concurrent.futures.CancelledError.
+
+    Nếu truyền dict thong_ke, hàm ghi vào đó thời gian của từng giai đoạn (giây) để biết giai đoạn nào chậm nhất:
+    "transcribe_s" (từ lúc bắt đầu tới khi nguon_doan hết), "translate_s" (tổng thời gian các lô dịch,
+    có thể lớn hơn thời gian thực vì các lô chạy song song), "write_s", "wall_s", cùng số byte văn bản
+    đã dịch ("translate_bytes") và số byte SRT đã ghi ("srt_bytes").
+    """
+    dung = threading.Event()
+    loi = []
+    hang_doi_doan = queue.Queue(maxsize=kich_thuoc_hang_doi)
+    # Số lô đang dịch hoặc chờ ghi có giới hạn: bộ ghi chậm thì giai đoạn dịch cũng chậm lại
+    hang_doi_lo = queue.Queue(maxsize=2 * max(1, so_luong_dich))
+    gioi_han_toc = GioiHanTocLuong(KHOANG_CACH_TOI_THIEU_GIAY)
+    bo_ngat_mach = BoNgatMach()  # Dịch vụ dịch sập thì các lô sau báo lỗi ngay, không chờ thử lại
+    cac_doan_goc = []
+    so_doan_da_nhan = 0
+    thong_ke = thong_ke if thong_ke is not None else {}
+    thong_ke.update(transcribe_s=0.0, translate_s=0.0, write_s=0.0, wall_s=0.0, translate_bytes=0, srt_bytes=0)
+    khoa_thong_ke = threading.Lock()
+    bat_dau_tong = time.perf_counter()
+    pool_dich = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, so_luong_dich))
+
+    def bao_loi(e):
+        loi.append(e)
+        dung.set()
+
+    def phien_am():
+        nonlocal so_doan_da_nhan
+        try:
+            for doan in nguon_doan:
+                if da_huy is not None and da_huy.is_set():
+                    raise concurrent.futures.CancelledError()
+                cac_doan_goc.append(doan)
+                so_doan_da_nhan += 1
+                if not _dat_vao(hang_doi_doan, doan, dung):
+                    break
+            thong_ke["transcribe_s"] = time.perf_counter() - bat_dau_tong
+            _dat_vao(hang_doi_doan, _KET_THUC, dung)
+        except BaseException as e:
+            bao_loi(e)
+        finally:
+            if hasattr(nguon_doan, "close"):
+                nguon_doan.close()  # Dừng pool phiên âm nếu đường ống dừng giữa chừng
+
+    def dich_lo(cac_doan):
+        if ham_dich is None:
+            return cac_doan, [doan["text"] for doan in cac_doan]
+        bat_dau = time.perf_counter()
+        cac_van_ban = [doan["text"] for doan in cac_doan]
+        ban_dich = dich_cac_doan(
+            cac_van_ban, ham_dich, so_luong=1, gioi_han_toc=gioi_han_toc, bo_ngat_mach=bo_ngat_mach,
+            bo_nho_dich=bo_nho_dich, ma_nguon=ma_nguon, ma_dich=ma_dich, da_huy=da_huy
+        )
+        with khoa_thong_ke:
+            thong_ke["translate_s"] += time.perf_counter() - bat_dau
+            thong_ke["translate_bytes"] += sum(len(van_ban.encode("utf-8")) for van_ban in cac_van_ban)
+        return cac_doan, ban_dich
+
+    def gom_lo():
+        # Gửi lô ngay khi hàng đợi tạm hết: một cửa sổ phiên âm xong thường thành đúng một lô
+        try:
+            lo = []
+            while True:
+                muc = None
+                if not lo:
+                    muc = _lay_ra(hang_doi_doan, dung)
+                elif len(lo) < so_doan_toi_da_moi_lo:
+                    try:
+                        muc = hang_doi_doan.get_nowait()
+                    except queue.Empty:
+                        pass
+                if muc is not None and muc is not _KET_THUC:
+                    lo.append(muc)
+                    continue
+                if lo:
+                    if not _dat_vao(hang_doi_lo, pool_dich.submit(dich_lo, lo), dung):
+                        return
+                    lo = []
+                if muc is _KET_THUC:
+                    break
+            _dat_vao(hang_doi_lo, _KET_THUC, dung)
+        except BaseException as e:
+            bao_loi(e)
+
+    cac_luong = [threading.Thread(target=phien_am, daemon=True), threading.Thread(target=gom_lo, daemon=True)]
+    for luong in cac_luong:
+        luong.start()
+
+    bo_ghi = BoGhiSrtTangDan(duong_dan_srt)
+    cac_doan_da_dich = []
+    so_doan_loi = 0
+    try:
+        while True:
+            tuong_lai = _lay_ra(hang_doi_lo, dung)
+            if tuong_lai is _KET_THUC:
+                break
+            while True:
+                try:
+                    cac_doan, ban_dich = tuong_lai.result(timeout=THOI_GIAN_CHO_HANG_DOI_GIAY)
+                    break
+                except concurrent.futures.TimeoutError:
+                    if dung.is_set():
+                        raise loi[0] if loi else concurrent.futures.CancelledError()
+            lo_da_dich = []
+            for doan, van_ban_dich in zip(cac_doan, ban_dich):
+                if van_ban_dich is None:
+                    so_doan_loi += 1
+                lo_da_dich.append({
+                    "start": doan["start"],
+                    "end": doan["end"],
+                    "text": van_ban_dich if van_ban_dich else doan["text"]
+                })
+            bat_dau = time.perf_counter()
+            bo_ghi.ghi(lo_da_dich)
+            thong_ke["write_s"] += time.perf_counter() - bat_dau
+            cac_doan_da_dich.extend(lo_da_dich)
+            if bao_tien_do:
+                bao_tien_do(len(cac_doan_da_dich), so_doan_da_nhan)
+        if loi:
+            raise loi[0]
+        if da_huy is not None and da_huy.is_set():
+            raise concurrent.futures.CancelledError()
+        for luong in cac_luong:
+            luong.join()
+    except BaseException:
+        dung.set()
+        raise
+    finally:
+        bo_ghi.dong()
+        pool_dich.shutdown(wait=False, cancel_futures=True)
+        thong_ke["wall_s"] = time.perf_counter() - bat_dau_tong
+        thong_ke["srt_bytes"] = bo_ghi.so_byte
+    return cac_doan_goc, cac_doan_da_dich, so_doan_loi
@@ -0,0 +1,230 @@
+# subtitle_transcribe.py
+"""
+Nhận diện giọng nói song song theo cửa sổ cho pipeline phụ đề.
+
+Âm thanh (16 kHz mono float32) được cắt tại các khoảng lặng thành các cửa sổ vài phút, mỗi cửa sổ
+được một tiến trình con phiên âm, rồi ghép lại với mốc thời gian toàn cục. Các tiến trình con thuộc
+pool dùng chung do bộ quản lý mô hình giữ giữa các video (xem whisper_worker).
+"""
+import concurrent.futures
+import concurrent.futures.process
+import os
+
+import numpy as np
+
+from asr_backends import lay_bo_may
+from whisper_models import TEN_MO_HINH_MAC_DINH, lay_quan_ly_whisper
+
+TAN_SO_LAY_MAU = 16000  # Whisper làm việc với âm thanh 16 kHz mono
+DO_DAI_CUA_SO_GIAY = 300  # Cửa sổ tối đa 5 phút, giữ bộ nhớ của mỗi tiến trình con có giới hạn
+DO_DAI_CUA_SO_TOI_THIEU_GIAY = 60
+VUNG_TIM_IM_LANG_GIAY = 20  # Tìm khoảng lặng trong ±20 giây quanh điểm cắt dự kiến
+DO_DAI_KHUNG_RMS_GIAY = 0.03
+CHONG_LAP_GIAY = 1.0  # Mỗi cửa sổ lấy thêm 1 giây hai bên để không mất từ nằm sát điểm cắt
+SO_LUONG_MOI_TIEN_TRINH = 2  # Số luồng tính toán (torch/CTranslate2) cho mỗi tiến trình con
+
+
+def so_tien_trinh_mac_dinh():
+    return max(1, (os.cpu_count() or 1) // SO_LUONG_MOI_TIEN_TRINH)
+
+
+def tim_diem_cat(am_thanh, do_dai_cua_so_giay=DO_DAI_CUA_SO_GIAY,
+                 vung_tim_giay=VUNG_TIM_IM_LANG_GIAY, tan_so=TAN_SO_LAY_MAU):
+    """
+    Trả về danh sách chỉ số mẫu [0, c1, c2, ..., N] chia âm thanh thành các cửa sổ.
+    Mỗi điểm cắt là khung có năng lượng RMS thấp nhất quanh vị trí dự kiến. Chỉ vùng tìm kiếm
+    được đọc vào bộ nhớ nên hoạt động được với np.memmap của file nhiều giờ.
+    """
+    tong_so_mau = len(am_thanh)
+    cua_so = int(do_dai_cua_so_giay * tan_so)
+    vung_tim = min(int(vung_tim_giay * tan_so), cua_so // 2)
+    khung = max(1, int(DO_DAI_KHUNG_RMS_GIAY * tan_so))
+
+    cac_diem_cat = [0]
+    while tong_so_mau - cac_diem_cat[-1] > cua_so + vung_tim:
+        muc_tieu = cac_diem_cat[-1] + cua_so
+        dau = muc_tieu - vung_tim
+        so_khung = (2 * vung_tim) // khung
+        if so_khung == 0:
+            cac_diem_cat.append(muc_tieu)
+            continue
+        doan = np.asarray(am_thanh[dau:dau + so_khung * khung], dtype=np.float32)
+        nang_luong = np.sqrt(np.mean(np.square(doan.reshape(so_khung, khung)), axis=1))
+        cac_diem_cat.append(dau + int(np.argmin(nang_luong)) * khung + khung // 2)
+    cac_diem_cat.append(tong_so_mau)
+    return cac_diem_cat
+
+
+def phat_hien_ngon_ngu_am_thanh(model, am_thanh, bo_may=None):
+    """Phát hiện ngôn ngữ một lần trên 30 giây đầu để mọi cửa sổ dùng chung một ngôn ngữ."""
+    return lay_bo_may(bo_may).phat_hien_ngon_ngu(model, am_thanh)
+
+
+def _rut_gon_doan(doan, lech_giay=0.0):
+    return {
+        "start": float(doan["start"]) + lech_giay,
+        "end": float(doan["end"]) + lech_giay,
+        "text": doan["text"]
+    }
+
+
+class BoGhepCuaSo:
+    """
+    Ghép dần kết quả các cửa sổ theo thứ tự thời gian, kể cả khi các cửa sổ xong không theo thứ tự.
+
+    Mỗi đoạn được cộng mốc thời gian bắt đầu của cửa sổ (kể cả phần chồng lấp), rồi chỉ giữ đoạn bắt
+    đầu trong phần riêng của cửa sổ đó để loại đoạn trùng ở vùng chồng lấp. Đoạn cuối cùng được giữ lại
+    tới khi có đoạn kế tiếp, vì thời điểm kết thúc của nó có thể phải rút ngắn cho khỏi đè lên đoạn sau.
+    """
+    def __init__(self, cac_diem_cat, tan_so=TAN_SO_LAY_MAU):
+        self.cac_diem_cat = cac_diem_cat
+        self.tan_so = tan_so
+        self._dang_cho = {}
+        self._ke_tiep = 0
+        self._doan_cuoi = None
+
+    def them(self, chi_so, mau_bat_dau, cac_doan):
+        """Nhận kết quả cửa sổ chi_so, trả về các đoạn đã chắc chắn (có thể rỗng nếu còn chờ cửa sổ trước)."""
+        self._dang_cho[chi_so] = (mau_bat_dau, cac_doan)
+        san_sang = []
+        while self._ke_tiep in self._dang_cho:
+            mau_bat_dau, cac_doan = self._dang_cho.pop(self._ke_tiep)
+            san_sang.extend(self._ghep_cua_so(self._ke_tiep, mau_bat_dau, cac_doan))
+            self._ke_tiep += 1
+        return san_sang
+
+    def ket_thuc(self):
+        """Trả về đoạn còn giữ lại sau cửa sổ cuối cùng."""
+        con_lai = [self._doan_cuoi] if self._doan_cuoi is not None else []
+        self._doan_cuoi = None
+        return con_lai
+
+    def _ghep_cua_so(self, chi_so, mau_bat_dau, cac_doan):
+        lech_giay = mau_bat_dau / self.tan_so
+        bien_trai = self.cac_diem_cat[chi_so] / self.tan_so
+        bien_phai = self.cac_diem_cat[chi_so + 1] / self.tan_so
+        la_cua_so_cuoi = chi_so >= len(self.cac_diem_cat) - 2
+        san_sang = []
+        for doan in cac_doan:
+            doan = _rut_gon_doan(doan, lech_giay)
+            if doan["start"] < bien_trai or (doan["start"] >= bien_phai and not la_cua_so_cuoi):
+                continue
+            truoc = self._doan_cuoi
+            if truoc is not None:
+                if doan["text"].strip() == truoc["text"].strip() and doan["start"] < truoc["end"]:
+                    continue  # Cùng một câu được hai cửa sổ nhận ra
+                if truoc["start"] < doan["start"] < truoc["end"]:
+                    truoc["end"] = doan["start"]  # Không để hai phụ đề đè lên nhau
+                san_sang.append(truoc)
+            self._doan_cuoi = doan
+        return san_sang
+
+
+def ghep_cac_cua_so(cac_cua_so, cac_diem_cat, tan_so=TAN_SO_LAY_MAU):
+    """
+    Ghép kết quả tất cả các cửa sổ một lần (xem BoGhepCuaSo).
+    cac_cua_so là danh sách (mẫu bắt đầu của cửa sổ, các đoạn với mốc thời gian tương đối).
+    """
+    bo_ghep = BoGhepCuaSo(cac_diem_cat, tan_so)
+    doan_da_ghep = []
+    for chi_so, (mau_bat_dau, cac_doan) in enumerate(cac_cua_so):
+        doan_da_ghep.extend(bo_ghep.them(chi_so, mau_bat_dau, cac_doan))
+    doan_da_ghep.extend(bo_ghep.ket_thuc())
+    return doan_da_ghep
+
+
+def _lay_cua_so(am_thanh, cac_diem_cat, chi_so, chong_lap):
+    """Trả về (mẫu bắt đầu, mẫu âm thanh) của cửa sổ chi_so kèm phần chồng lấp hai bên."""
+    bat_dau = max(0, cac_diem_cat[chi_so] - chong_lap)
+    ket_thuc = min(len(am_thanh), cac_diem_cat[chi_so + 1] + chong_lap)
+    return bat_dau, np.array(am_thanh[bat_dau:ket_thuc], dtype=np.float32)
+
+
+def phien_am_tung_doan(am_thanh, ten_mo_hinh=None, ngon_ngu=None, so_tien_trinh=None,
+                       bao_tien_do=None, do_dai_cua_so_giay=DO_DAI_CUA_SO_GIAY, da_huy=None, bo_may=None):
+    """
+    Phiên âm âm thanh 16 kHz mono (np.ndarray hoặc np.memmap) và trả dần (generator) các đoạn
+    {"start", "end", "text"} theo mốc thời gian toàn cục, ngay khi các cửa sổ liền trước đã xong,
+    để các giai đoạn sau (dịch, ghi SRT) bắt đầu mà không chờ hết video.
+
+    Chỉ có một tiến trình hoặc không chạy trên CPU thì các cửa sổ được phiên âm lần lượt trong tiến trình
+    hiện tại bằng mô hình đã được giữ sẵn. Ngược lại, các cửa sổ được gửi dần vào pool tiến trình dùng chung
+    (tối đa hai cửa sổ chờ cho mỗi tiến trình) nên bộ nhớ không phụ thuộc độ dài video. bao_tien_do(số cửa
+    sổ xong, tổng số cửa sổ). da_huy (threading.Event) được đặt thì bỏ các cửa sổ chưa chạy của việc này và
+    nâng concurrent.futures.CancelledError; đóng generator giữa chừng cũng vậy. Pool vẫn được giữ lại.
+    bo_may là tên bộ máy ASR trong asr_backends (None: bộ máy mặc định của bộ quản lý mô hình).
+    """
+    ten_mo_hinh = ten_mo_hinh or TEN_MO_HINH_MAC_DINH
+    bo_may = bo_may or lay_quan_ly_whisper().bo_may
+    bo_may_asr = lay_bo_may(bo_may)
+    so_tien_trinh = so_tien_trinh or so_tien_trinh_mac_dinh()
+    tong_giay = len(am_thanh) / TAN_SO_LAY_MAU
+    do_dai_cua_so_giay = max(DO_DAI_CUA_SO_TOI_THIEU_GIAY, min(do_dai_cua_so_giay, tong_giay / so_tien_trinh))
+    cac_diem_cat = tim_diem_cat(am_thanh, do_dai_cua_so_giay)
+    so_cua_so = len(cac_diem_cat) - 1
+    chong_lap = int(CHONG_LAP_GIAY * TAN_SO_LAY_MAU)
+    bo_ghep = BoGhepCuaSo(cac_diem_cat)
+    if bao_tien_do:
+        bao_tien_do(0, so_cua_so)
+
+    quan_ly = lay_quan_ly_whisper()
+    with quan_ly.su_dung(ten_mo_hinh, bo_may) as model:
+        if so_cua_so <= 1:
+            cac_doan = bo_may_asr.phien_am(model, am_thanh, ngon_ngu)
+            if bao_tien_do:
+                bao_tien_do(1, 1)
+            yield from cac_doan
+            return
+        if ngon_ngu is None:
+            ngon_ngu = bo_may_asr.phat_hien_ngon_ngu(model, am_thanh)
+        if so_tien_trinh <= 1 or bo_may_asr.thiet_bi(model) != "cpu":
+            # Trên GPU một tiến trình đã tận dụng hết phần cứng, chia tiến trình chỉ tốn thêm bộ nhớ
+            for chi_so in range(so_cua_so):
+                if da_huy is not None and da_huy.is_set():
+                    raise concurrent.futures.CancelledError()
+                bat_dau, mau = _lay_cua_so(am_thanh, cac_diem_cat, chi_so, chong_lap)
+                cac_doan = bo_may_asr.phien_am(model, mau, ngon_ngu)
+                if bao_tien_do:
+                    bao_tien_do(chi_so + 1, so_cua_so)
+                yield from bo_ghep.them(chi_so, bat_dau, cac_doan)
+            yield from bo_ghep.ket_thuc()
+            return
+
+    cac_mau_bat_dau = [None] * so_cua_so
+    da_xong = 0
+    # Các tiến trình con đã tải mô hình từ video trước được dùng lại, nên phiên âm bắt đầu ngay
+    with quan_ly.su_dung_pool(so_tien_trinh, ten_mo_hinh, bo_may) as pool:
+        dang_cho = set()
+        try:
+            ke_tiep = 0
+            while ke_tiep < so_cua_so or dang_cho:
+                if da_huy is not None and da_huy.is_set():
+                    raise concurrent.futures.CancelledError()
+                while ke_tiep < so_cua_so and len(dang_cho) < 2 * so_tien_trinh:
+                    cac_mau_bat_dau[ke_tiep], mau = _lay_cua_so(am_thanh, cac_diem_cat, ke_tiep, chong_lap)
+                    dang_cho.add(pool.gui(ke_tiep, mau, ngon_ngu))
+                    ke_tiep += 1
+                xong, dang_cho = concurrent.futures.wait(
+                    dang_cho, timeout=0.5, return_when=concurrent.futures.FIRST_COMPLETED)
+                for tuong_lai in xong:
+                    chi_so, cac_doan = tuong_lai.result()
+                    da_xong += 1
+                    if bao_tien_do:
+                        bao_tien_do(da_xong, so_cua_so)
+                    yield from bo_ghep.them(chi_so, cac_mau_bat_dau[chi_so], cac_doan)
+        except concurrent.futures.process.BrokenProcessPool:
+            quan_ly.dong_pool(pool)
+            raise
+        finally:
+            # Bị hủy, lỗi hoặc generator bị đóng giữa chừng: bỏ các cửa sổ chưa chạy của việc này,
+            # không chờ cửa sổ đang chạy; pool vẫn phục vụ các việc khác
+            for tuong_lai in dang_cho:
+                tuong_lai.cancel()
+    yield from bo_ghep.ket_thuc()
+
+
+def phien_am_song_song(am_thanh, ten_mo_hinh=None, ngon_ngu=None, so_tien_trinh=None,
+                       bao_tien_do=None, do_dai_cua_so_giay=DO_DAI_CUA_SO_GIAY, da_huy=None, bo_may=None):
+    """Phiên âm toàn bộ âm thanh và trả về danh sách đoạn (xem phien_am_tung_doan)."""
+    return list(phien_am_tung_doan(am_thanh, ten_mo_hinh, ngon_ngu, so_tien_trinh,
+                                   bao_tien_do, do_dai_cua_so_giay, da_huy, bo_may))
@@ -0,0 +1,234 @@
+# subtitle_translation.py
+"""
+Dịch phụ đề theo lô và song song.
+
+Các đoạn phụ đề được gộp thành lô (mỗi đoạn một dòng) dưới giới hạn ký tự của dịch vụ dịch,
+các lô chạy trên một pool luồng có giới hạn, có thử lại với thời gian chờ tăng dần, giới hạn
+tốc độ và ngắt mạch khi dịch vụ dịch lỗi liên tục. Hàm dịch được truyền vào nên có thể thay bằng hàm gọi tới một máy chủ dịch giả lập khi kiểm thử.
+"""
+import concurrent.futures
+import random
+import threading
+import time
+
+from deep_translator import GoogleTranslator
+
+from text_utils import chuan_hoa_giu_dong
+
+DAU_PHAN_CACH = "\n"  # Mỗi đoạn một dòng: dịch vụ dịch giữ nguyên ngắt dòng nên tách lại được ổn định
+SO_KY_TU_TOI_DA_MOI_LO = 4500  # GoogleTranslator giới hạn 5000 ký tự mỗi yêu cầu
+SO_DOAN_TOI_DA_MOI_LO = 40
+SO_LUONG_DICH_DONG_THOI = 4
+SO_LAN_THU_LAI = 3
+THOI_GIAN_CHO_CO_BAN_GIAY = 1.0
+KHOANG_CACH_TOI_THIEU_GIAY = 0.2  # Tối đa 5 yêu cầu dịch mỗi giây
+SO_LAN_LOI_NGAT_MACH = 2  # Số lần gọi lỗi liên tiếp (đã thử lại hết) trước khi ngắt mạch
+THOI_GIAN_NGAT_MACH_GIAY = 30.0
+
+
+class GioiHanTocLuong:
+    """Giới hạn tốc độ dùng chung giữa các luồng: hai yêu cầu bắt đầu cách nhau ít nhất khoang_cach giây."""
+    def __init__(self, khoang_cach):
+        self.khoang_cach = khoang_cach
+        self._lan_ke_tiep = 0.0
+        self._khoa = threading.Lock()
+
+    def cho(self):
+        with self._khoa:
+            bay_gio = time.monotonic()
+            thoi_diem = max(bay_gio, self._lan_ke_tiep)
+            self._lan_ke_tiep = thoi_diem + self.khoang_cach
+        if thoi_diem > bay_gio:
+            time.sleep(thoi_diem - bay_gio)
+
+
+class BoNgatMach:
+    """
+    Ngắt mạch dùng chung giữa các luồng: sau so_lan_loi lần gọi lỗi liên tiếp (mỗi lần đã thử lại hết),
+    mọi lần gọi thất bại ngay trong thoi_gian_mo giây thay vì lần lượt chờ hết các lần thử lại.
+    Hết thời gian đó thì cho gọi thử lại; một lần thành công đóng mạch.
+    """
+    def __init__(self, so_lan_loi=SO_LAN_LOI_NGAT_MACH, thoi_gian_mo=THOI_GIAN_NGAT_MACH_GIAY):
+        self.so_lan_loi = so_lan_loi
+        self.thoi_gian_mo = thoi_gian_mo
+        self._so_loi = 0
+        self._mo_den = 0.0
+        self._khoa = threading.Lock()
+
+    def dang_mo(self):
+        with self._khoa:
+            return self._so_loi >= self.so_lan_loi and time.monotonic() < self._mo_den
+
+    def bao_thanh_cong(self):
+        with self._khoa:
+            self._so_loi = 0
+
+    def bao_loi(self):
+        with self._khoa:
+            self._so_loi += 1
+            if self._so_loi >= self.so_lan_loi:
+                self._mo_den = time.monotonic() + self.thoi_gian_mo
+
+
+def chuan_hoa_dong(van_ban):
+    """Đưa một đoạn về đúng một dòng để dấu phân cách không bị lẫn với ngắt dòng trong đoạn."""
+    return " ".join(van_ban.split())
+
+
+def chia_lo(cac_van_ban, so_ky_tu_toi_da=SO_KY_TU_TOI_DA_MOI_LO, so_doan_toi_da=SO_DOAN_TOI_DA_MOI_LO):
+    """Gộp các chỉ số đoạn thành lô theo thứ tự, mỗi lô không vượt giới hạn ký tự và số đoạn."""
+    cac_lo = []
+    lo_hien_tai = []
+    do_dai = 0
+    for chi_so, van_ban in enumerate(cac_van_ban):
+        do_dai_doan = len(van_ban) + len(DAU_PHAN_CACH)
+        if lo_hien_tai and (do_dai + do_dai_doan > so_ky_tu_toi_da or len(lo_hien_tai) >= so_doan_toi_da):
+            cac_lo.append(lo_hien_tai)
+            lo_hien_tai = []
+            do_dai = 0
+        lo_hien_tai.append(chi_so)
+        do_dai += do_dai_doan
+    if lo_hien_tai:
+        cac_lo.append(lo_hien_tai)
+    return cac_lo
+
+
+def goi_co_thu_lai(ham, van_ban, gioi_han_toc=None, so_lan_thu=SO_LAN_THU_LAI,
+                   thoi_gian_cho=THOI_GIAN_CHO_CO_BAN_GIAY, da_huy=None, bo_ngat_mach=None):
+    """
+    Gọi ham(van_ban); lỗi thì chờ 1s, 2s, 4s... (có nhiễu ngẫu nhiên) rồi thử lại.
+    Khi bo_ngat_mach đang mở thì nâng RuntimeError ngay, không gọi ham.
+    """
+    for lan in range(so_lan_thu + 1):
+        if da_huy is not None and da_huy.is_set():
+            raise concurrent.futures.CancelledError()
+        if bo_ngat_mach is not None and bo_ngat_mach.dang_mo():
+            raise RuntimeError("Dịch vụ dịch đang lỗi liên tục, tạm ngừng gửi yêu cầu.")
+        if gioi_han_toc is not None:
+            gioi_han_toc.cho()
+        try:
+            ket_qua = ham(van_ban)
+        except Exception:
+            if lan == so_lan_thu:
+                if bo_ngat_mach is not None:
+                    bo_ngat_mach.bao_loi()
+                raise
+        else:
+            if bo_ngat_mach is not None:
+                bo_ngat_mach.bao_thanh_cong()
+            return ket_qua
+        time.sleep(thoi_gian_cho * (2 ** lan) * random.uniform(0.8, 1.2))
+
+
+def dich_cac_doan(cac_van_ban, ham_dich, so_luong=SO_LUONG_DICH_DONG_THOI,
+                  so_ky_tu_toi_da=SO_KY_TU_TOI_DA_MOI_LO, so_doan_toi_da=SO_DOAN_TOI_DA_MOI_LO,
+                  so_lan_thu=SO_LAN_THU_LAI, thoi_gian_cho=THOI_GIAN_CHO_CO_BAN_GIAY,
+                  khoang_cach_toi_thieu=KHOANG_CACH_TOI_THIEU_GIAY, bao_tien_do=None, da_huy=None,
+                  bo_nho_dich=None, ma_nguon="auto", ma_dich=None, gioi_han_toc=None, bo_ngat_mach=None):
+    """
+    Dịch danh sách văn bản, trả về danh sách bản dịch cùng thứ tự (None cho đoạn dịch lỗi).
+
+    ham_dich(str) -> str dịch một chuỗi (có thể nhiều dòng). Đoạn trùng nhau chỉ được gửi đi một lần.
+    Nếu bản dịch của một lô không còn đúng số dòng thì lô đó được dịch lại từng đoạn một; nếu lô vẫn
+    lỗi sau khi thử lại hết thì cả lô được coi là dịch lỗi. bao_tien_do(số đoạn xong, tổng số đoạn).
+    da_huy là threading.Event tùy chọn để dừng sớm. Nếu có bo_nho_dich (translation_memory.BoNhoDich),
+    các đoạn đã từng dịch sang ma_dich được lấy từ đó và chỉ phần còn lại mới gọi ham_dich.
+    gioi_han_toc (GioiHanTocLuong) và bo_ngat_mach (BoNgatMach) truyền vào khi nhiều lần gọi chạy song song
+    phải dùng chung một giới hạn tốc độ và một ngắt mạch.
+    """
+    cac_dong = [chuan_hoa_dong(van_ban) for van_ban in cac_van_ban]
+    ket_qua = [None] * len(cac_dong)
+    can_dich = [i for i, dong in enumerate(cac_dong) if dong]
+    for i, dong in enumerate(cac_dong):
+        if not dong:
+            ket_qua[i] = ""
+
+    if bo_nho_dich is not None:
+        da_co = bo_nho_dich.lay_nhieu(ma_nguon, ma_dich, [cac_dong[i] for i in can_dich])
+        for i in can_dich:
+            ket_qua[i] = da_co.get(chuan_hoa_giu_dong(cac_dong[i]))
+        can_dich = [i for i in can_dich if ket_qua[i] is None]
+
+    if gioi_han_toc is None:
+        gioi_han_toc = GioiHanTocLuong(khoang_cach_toi_thieu)
+    if bo_ngat_mach is None:
+        bo_ngat_mach = BoNgatMach()
+    tong_so = len(can_dich)
+    da_xong = 0
+    khoa_tien_do = threading.Lock()
+
+    # Câu lặp lại (vd: "Cảm ơn.", "[Tiếng nhạc]") chỉ gửi đi dịch một lần
+    cac_chi_so_theo_dong = {}
+    for i in can_dich:
+        cac_chi_so_theo_dong.setdefault(cac_dong[i], []).append(i)
+    cac_dong_can_dich = list(cac_chi_so_theo_dong)
+
+    def goi(van_ban):
+        return goi_co_thu_lai(ham_dich, van_ban, gioi_han_toc, so_lan_thu, thoi_gian_cho, da_huy, bo_ngat_mach)
+
+    def dich_tung_dong(cac_dong_lo):
+        ban_dich = []
+        for dong in cac_dong_lo:
+            try:
+                ban_dich.append(goi(dong))
+            except concurrent.futures.CancelledError:
+                raise
+            except Exception:
+                ban_dich.append(None)
+        return ban_dich
+
+    def dich_lo(cac_dong_lo):
+        nonlocal da_xong
+        try:
+            van_ban_dich = goi(DAU_PHAN_CACH.join(cac_dong_lo)) or ""
+            ban_dich = van_ban_dich.split(DAU_PHAN_CACH) if len(cac_dong_lo) > 1 else [van_ban_dich]
+        except concurrent.futures.CancelledError:
+            raise
+        except Exception:
+            # Đã thử lại hết (hoặc mạch đang ngắt): không gọi lại từng đoạn, cả lô coi như lỗi
+            ban_dich = [None] * len(cac_dong_lo)
+        if len(ban_dich) != len(cac_dong_lo):
+            ban_dich = dich_tung_dong(cac_dong_lo)  # Lệch số dòng: không biết dòng nào thuộc đoạn nào
+
+        cac_cap = []
+        so_doan = 0
+        for dong, dong_dich in zip(cac_dong_lo, ban_dich):
+            dong_dich = dong_dich.strip() if dong_dich and dong_dich.strip() else None
+            cac_cap.append((dong, dong_dich))
+            for i in cac_chi_so_theo_dong[dong]:
+                ket_qua[i] = dong_dich
+                so_doan += 1
+        if bo_nho_dich is not None:
+            bo_nho_dich.luu_nhieu(ma_nguon, ma_dich, cac_cap)
+        with khoa_tien_do:
+            da_xong += so_doan
+            if bao_tien_do:
+                bao_tien_do(da_xong, tong_so)
+
+    cac_lo = chia_lo(cac_dong_can_dich, so_ky_tu_toi_da, so_doan_toi_da)
+    cac_lo = [[cac_dong_can_dich[j] for j in lo] for lo in cac_lo]
+    if not cac_lo:
+        return ket_qua
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(so_luong, len(cac_lo)))) as pool:
+        cac_tac_vu = [pool.submit(dich_lo, lo) for lo in cac_lo]
+        try:
+            for tac_vu in concurrent.futures.as_completed(cac_tac_vu):
+                tac_vu.result()
+        except BaseException:
+            for tac_vu in cac_tac_vu:
+                tac_vu.cancel()
+            raise
+    return ket_qua
+
+
+def tao_ham_dich_google(ma_ngon_ngu_dich, ma_ngon_ngu_nguon="auto"):
+    """Hàm dịch dùng GoogleTranslator; mỗi luồng giữ một đối tượng dịch riêng."""
+    du_lieu_luong = threading.local()
+
+    def dich(van_ban):
+        if not hasattr(du_lieu_luong, "translator"):
+            du_lieu_luong.translator = GoogleTranslator(source=ma_ngon_ngu_nguon, target=ma_ngon_ngu_dich)
+        return du_lieu_luong.translator.translate(van_ban)
+
+    return dich
@@ -0,0 +1,375 @@
+# subtitle_video.py
+import concurrent.futures
+import datetime
+import json
+import os
+import subprocess
+import threading
+
+import srt
+
+CHE_DO_PHU_DE_MEM = "soft"  # Ghép SRT thành một luồng phụ đề, sao chép nguyên hình và tiếng (-c copy)
+CHE_DO_GHEP_CUNG = "burn"  # Vẽ phụ đề lên từng khung hình, phải mã hóa lại video bằng libx264
+
+CAC_CHE_DO_DAU_RA = [
+    (CHE_DO_PHU_DE_MEM, "Phụ đề mềm (nhanh, bật/tắt được)"),
+    (CHE_DO_GHEP_CUNG, "Ghép cứng vào hình (mã hóa lại)"),
+]
+
+# Tên hiển thị -> (preset của libx264, CRF)
+CAC_PRESET_GHEP_CUNG = {
+    "Nhanh": ("veryfast", 23),
+    "Cân bằng": ("medium", 23),
+    "Chất lượng cao": ("slow", 20),
+}
+PRESET_GHEP_CUNG_MAC_DINH = "Cân bằng"
+
+# Codec phụ đề theo định dạng chứa: MP4/MOV chỉ nhận mov_text, MKV giữ nguyên SRT
+CODEC_PHU_DE_THEO_DUOI = {
+    ".mp4": "mov_text",
+    ".m4v": "mov_text",
+    ".mov": "mov_text",
+    ".mkv": "srt",
+}
+
+# Mã ngôn ngữ ISO 639-2 ghi vào metadata của luồng phụ đề để trình phát hiển thị đúng tên
+MA_NGON_NGU_ISO639_2 = {
+    "en": "eng",
+    "vi": "vie",
+    "es": "spa",
+    "fr": "fra",
+    "de": "deu",
+    "zh-CN": "zho",
+}
+
+
+def duoi_tep_dau_ra(che_do, duong_dan_video):
+    """
+    Chọn định dạng chứa cho video đầu ra. Phụ đề mềm giữ MP4/MOV/MKV như video gốc, các định dạng
+    khác (vd: AVI không chứa được luồng phụ đề) chuyển sang MKV vì MKV nhận được mọi codec khi -c copy.
+    Ghép cứng luôn ra MP4 (H.264).
+    """
+    if che_do != CHE_DO_PHU_DE_MEM:
+        return ".mp4"
+    duoi = os.path.splitext(duong_dan_video)[1].lower()
+    return duoi if duoi in CODEC_PHU_DE_THEO_DUOI else ".mkv"
+
+
+def duong_dan_srt_cho_bo_loc(duong_dan_srt):
+    """Trên Windows, đường dẫn phụ đề trong -vf phải dùng dấu / và escape dấu ':' của ổ đĩa."""
+    return os.path.abspath(duong_dan_srt).replace(os.sep, '/').replace(':', r'\:')
+
+
+def lenh_phu_de_mem(duong_dan_video, duong_dan_srt, duong_dan_dau_ra, ma_ngon_ngu=None):
+    """Lệnh ffmpeg ghép SRT thành luồng phụ đề, sao chép nguyên luồng hình và tiếng."""
+    duoi = os.path.splitext(duong_dan_dau_ra)[1].lower()
+    lenh = [
+        "ffmpeg",
+        "-nostdin",
+        "-i", os.path.abspath(duong_dan_video),
+        "-i", os.path.abspath(duong_dan_srt),
+        "-map", "0:v",
+        "-map", "0:a?",
+        "-map", "1:0",
+        "-c", "copy",
+        "-c:s", CODEC_PHU_DE_THEO_DUOI.get(duoi, "srt"),
+    ]
+    if ma_ngon_ngu in MA_NGON_NGU_ISO639_2:
+        lenh += ["-metadata:s:s:0", f"language={MA_NGON_NGU_ISO639_2[ma_ngon_ngu]}"]
+    if duoi in (".mp4", ".m4v", ".mov"):
+        lenh += ["-movflags", "+faststart"]
+    lenh += ["-y", os.path.abspath(duong_dan_dau_ra)]
+    return lenh
+
+
+def lenh_ghep_cung(duong_dan_video, duong_dan_srt, duong_dan_dau_ra, preset=PRESET_GHEP_CUNG_MAC_DINH):
+    """Lệnh ffmpeg vẽ phụ đề lên hình và mã hóa lại bằng libx264 theo preset đã chọn."""
+    preset_x264, crf = CAC_PRESET_GHEP_CUNG.get(preset, CAC_PRESET_GHEP_CUNG[PRESET_GHEP_CUNG_MAC_DINH])
+    return [
+        "ffmpeg",
+        "-nostdin",
+        "-i", os.path.abspath(duong_dan_video),
+        "-vf", f"subtitles='{duong_dan_srt_cho_bo_loc(duong_dan_srt)}'",
+        "-c:v", "libx264",
+        "-preset", preset_x264,
+        "-crf", str(crf),
+        "-c:a", "copy",  # Sao chép luồng âm thanh gốc mà không mã hóa lại
+        "-y",
+        os.path.abspath(duong_dan_dau_ra)
+    ]
+
+
+def chay_lenh(lenh, da_huy=None):
+    """
+    Chạy lệnh như subprocess.run(..., capture_output=True, text=True, check=True) nhưng dừng
+    tiến trình và nâng concurrent.futures.CancelledError khi da_huy (threading.Event) được đặt.
+    """
+    tien_trinh = subprocess.Popen(lenh, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                  text=True, encoding="utf-8", errors="replace")
+    dau_ra = {}
+    luong_doc = [
+        threading.Thread(target=lambda: dau_ra.__setitem__("stdout", tien_trinh.stdout.read()), daemon=True),
+        threading.Thread(target=lambda: dau_ra.__setitem__("stderr", tien_trinh.stderr.read()), daemon=True),
+    ]
+    for luong in luong_doc:
+        luong.start()
+    while True:
+        try:
+            tien_trinh.wait(timeout=0.2)
+            break
+        except subprocess.TimeoutExpired:
+            if da_huy is not None and da_huy.is_set():
+                tien_trinh.kill()
+                tien_trinh.wait()
+                raise concurrent.futures.CancelledError()
+    for luong in luong_doc:
+        luong.join()
+    if tien_trinh.returncode != 0:
+        raise subprocess.CalledProcessError(tien_trinh.returncode, lenh,
+                                            output=dau_ra.get("stdout"), stderr=dau_ra.get("stderr"))
+    return subprocess.CompletedProcess(lenh, tien_trinh.returncode, dau_ra.get("stdout"), dau_ra.get("stderr"))
+
+
+# --- Ghép cứng song song: cắt video tại keyframe, mỗi đoạn một tiến trình ffmpeg, rồi nối lại không mã hóa lại ---
+
+DO_DAI_DOAN_TOI_THIEU_GIAY = 30  # Video ngắn hơn 2 đoạn như vậy thì mã hóa một lần cho gọn
+
+
+def _chay_ffprobe(lenh):
+    ket_qua = subprocess.run(lenh, capture_output=True, text=True, check=True)
+    return ket_qua.stdout
+
+
+def lay_thong_tin_thoi_gian(duong_dan_video):
+    """Trả về (thời điểm bắt đầu, thời lượng) của video tính bằng giây."""
+    dau_ra = _chay_ffprobe([
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=start_time,duration",
+        "-of", "json",
+        os.path.abspath(duong_dan_video)
+    ])
+    dinh_dang = json.loads(dau_ra).get("format", {})
+    return float(dinh_dang.get("start_time") or 0.0), float(dinh_dang.get("duration") or 0.0)
+
+
+def lay_thoi_diem_keyframe(duong_dan_video):
+    """Đọc thời điểm các keyframe của luồng hình từ thông tin gói (không giải mã khung hình nên rất nhanh)."""
+    dau_ra = _chay_ffprobe([
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        os.path.abspath(duong_dan_video)
+    ])
+    cac_keyframe = []
+    for dong in dau_ra.splitlines():
+        phan = dong.strip().split(",")
+        if len(phan) >= 2 and "K" in phan[1] and phan[0] not in ("", "N/A"):
+            cac_keyframe.append(float(phan[0]))
+    return sorted(cac_keyframe)
+
+
+def chon_diem_cat(cac_keyframe, thoi_luong, so_doan, do_dai_toi_thieu=DO_DAI_DOAN_TOI_THIEU_GIAY):
+    """
+    Chọn tối đa so_doan - 1 keyframe gần nhất với các điểm chia đều video làm điểm cắt.
+    Trả về danh sách mốc [0, c1, ..., thoi_luong] (tính từ đầu video).
+    """
+    so_doan = max(1, min(so_doan, int(thoi_luong // do_dai_toi_thieu)))
+    cac_moc = [0.0]
+    for i in range(1, so_doan):
+        muc_tieu = thoi_luong * i / so_doan
+        if not cac_keyframe:
+            break
+        gan_nhat = min(cac_keyframe, key=lambda t: abs(t - muc_tieu))
+        if gan_nhat - cac_moc[-1] >= do_dai_toi_thieu and thoi_luong - gan_nhat >= do_dai_toi_thieu:
+            cac_moc.append(gan_nhat)
+    cac_moc.append(thoi_luong)
+    return cac_moc
+
+
+def cat_phu_de_theo_doan(cac_phu_de, bat_dau, ket_thuc):
+    """Lấy các phụ đề chồng lên [bat_dau, ket_thuc) và dời mốc thời gian về đầu đoạn."""
+    bat_dau_td = datetime.timedelta(seconds=bat_dau)
+    ket_thuc_td = datetime.timedelta(seconds=ket_thuc)
+    cac_phu_de_doan = []
+    for phu_de in cac_phu_de:
+        if phu_de.end <= bat_dau_td or phu_de.start >= ket_thuc_td:
+            continue
+        cac_phu_de_doan.append(srt.Subtitle(
+            index=len(cac_phu_de_doan) + 1,
+            start=max(phu_de.start, bat_dau_td) - bat_dau_td,
+            end=min(phu_de.end, ket_thuc_td) - bat_dau_td,
+            content=phu_de.content
+        ))
+    return cac_phu_de_doan
+
+
+def _duong_dan_cho_concat(duong_dan):
+    return "file '" + os.path.abspath(duong_dan).replace("\\", "/").replace("'", r"'\''") + "'"
+
+
+def ghep_cung_song_song(duong_dan_video, duong_dan_srt, duong_dan_dau_ra, thu_muc_tam,
+                        preset=PRESET_GHEP_CUNG_MAC_DINH, so_doan=None, bao_tien_do=None, da_huy=None):
+    """
+    Ghép cứng phụ đề bằng nhiều tiến trình ffmpeg song song.
+
+    Video được cắt tại các keyframe thành tối đa so_doan đoạn (mặc định bằng số nhân CPU). Mỗi đoạn
+    chỉ mã hóa phần hình với phụ đề đã dời mốc thời gian, các đoạn cùng tham số x264 nên được nối
+    bằng concat demuxer với -c copy, âm thanh gốc được sao chép nguyên một lần ở bước nối.
+    Video quá ngắn hoặc không đọc được keyframe thì mã hóa một lần như lenh_ghep_cung.
+    bao_tien_do(số đoạn xong, tổng số đoạn). da_huy (threading.Event) dừng mọi tiến trình ffmpeg đang chạy.
+    """
+    so_nhan = os.cpu_count() or 1
+    so_doan = so_doan or so_nhan
+    thoi_diem_dau, thoi_luong = lay_thong_tin_thoi_gian(duong_dan_video)
+    cac_moc = [0.0, thoi_luong]
+    if so_doan > 1 and thoi_luong >= 2 * DO_DAI_DOAN_TOI_THIEU_GIAY:
+        cac_keyframe = [t - thoi_diem_dau for t in lay_thoi_diem_keyframe(duong_dan_video)]
+        cac_moc = chon_diem_cat(cac_keyframe, thoi_luong, so_doan)
+
+    so_doan = len(cac_moc) - 1
+    if so_doan <= 1:
+        chay_lenh(lenh_ghep_cung(duong_dan_video, duong_dan_srt, duong_dan_dau_ra, preset), da_huy)
+        if bao_tien_do:
+            bao_tien_do(1, 1)
+        return
+
+    with open(duong_dan_srt, "r", encoding="utf-8") as f:
+        cac_phu_de = list(srt.parse(f.read()))
+
+    preset_x264, crf = CAC_PRESET_GHEP_CUNG.get(preset, CAC_PRESET_GHEP_CUNG[PRESET_GHEP_CUNG_MAC_DINH])
+    so_luong_moi_doan = max(1, so_nhan // so_doan)
+    os.makedirs(thu_muc_tam, exist_ok=True)
+    cac_tep_doan = []
+    cac_lenh = []
+    for i in range(so_doan):
+        bat_dau, ket_thuc = cac_moc[i], cac_moc[i + 1]
+        tep_srt = os.path.join(thu_muc_tam, f"segment_{i:03d}.srt")
+        with open(tep_srt, "w", encoding="utf-8") as f:
+            f.write(srt.compose(cat_phu_de_theo_doan(cac_phu_de, bat_dau, ket_thuc)))
+        tep_doan = os.path.join(thu_muc_tam, f"segment_{i:03d}.mp4")
+        cac_tep_doan.append(tep_doan)
+        lenh = [
+            "ffmpeg",
+            "-nostdin",
+            "-ss", f"{bat_dau:.6f}",  # Điểm cắt là keyframe nên tua nhanh ở đầu vào vẫn chính xác
+            "-i", os.path.abspath(duong_dan_video),
+            "-t", f"{ket_thuc - bat_dau:.6f}",
+            "-map", "0:v:0",
+            "-an",
+        ]
+        if os.path.getsize(tep_srt) > 0:
+            lenh += ["-vf", f"subtitles='{duong_dan_srt_cho_bo_loc(tep_srt)}'"]
+        lenh += [
+            "-c:v", "libx264",
+            "-preset", preset_x264,
+            "-crf", str(crf),
+            "-threads", str(so_luong_moi_doan),
+            "-y", os.path.abspath(tep_doan)
+        ]
+        cac_lenh.append(lenh)
+
+    da_xong = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=so_doan) as pool:
+        cac_tac_vu = [pool.submit(chay_lenh, lenh, da_huy) for lenh in cac_lenh]
+        try:
+            for tac_vu in concurrent.futures.as_completed(cac_tac_vu):
+                tac_vu.result()
+                da_xong += 1
+                if bao_tien_do:
+                    bao_tien_do(da_xong, so_doan)
+        except BaseException:
+            for tac_vu in cac_tac_vu:
+                tac_vu.cancel()
+            raise
+
+    danh_sach = os.path.join(thu_muc_tam, "segments.txt")
+    with open(danh_sach, "w", encoding="utf-8") as f:
+        f.write("\n".join(_duong_dan_cho_concat(tep) for tep in cac_tep_doan) + "\n")
+    chay_lenh([
+        "ffmpeg",
+        "-nostdin",
+        "-f", "concat", "-safe", "0", "-i", danh_sach,
+        "-i", os.path.abspath(duong_dan_video),
+        "-map", "0:v:0",
+        "-map", "1:a?",
+        "-c", "copy",
+        "-movflags", "+faststart",
+        "-y", os.path.abspath(duong_dan_dau_ra)
+    ], da_huy)
+
+
+# --- Xem trước: chỉ ghép cứng 10-20 giây quanh một thời điểm để kiểm tra kiểu chữ và thời gian phụ đề ---
+
+DO_DAI_XEM_TRUOC_GIAY = 15
+DO_DAI_XEM_TRUOC_TOI_THIEU_GIAY = 10
+DO_DAI_XEM_TRUOC_TOI_DA_GIAY = 20
+PRESET_XEM_TRUOC = ("ultrafast", 28)  # Ưu tiên tốc độ, chất lượng chỉ cần đủ để nhìn phụ đề
+
+
+def cua_so_xem_truoc(thoi_diem, thoi_luong, do_dai=DO_DAI_XEM_TRUOC_GIAY):
+    """Trả về (bắt đầu, kết thúc) của đoạn xem trước có thoi_diem ở giữa, không vượt ra ngoài video."""
+    do_dai = max(DO_DAI_XEM_TRUOC_TOI_THIEU_GIAY, min(do_dai, DO_DAI_XEM_TRUOC_TOI_DA_GIAY))
+    if thoi_luong > 0:
+        do_dai = min(do_dai, thoi_luong)
+        bat_dau = min(max(0.0, thoi_diem - do_dai / 2), thoi_luong - do_dai)
+    else:
+        bat_dau = max(0.0, thoi_diem - do_dai / 2)  # Không đọc được thời lượng: để ffmpeg tự dừng ở cuối video
+    return bat_dau, bat_dau + do_dai
+
+
+def lenh_xem_truoc(duong_dan_video, duong_dan_srt_doan, duong_dan_dau_ra, bat_dau, do_dai):
+    """
+    Lệnh ffmpeg mã hóa riêng đoạn [bat_dau, bat_dau + do_dai) với phụ đề đã dời mốc về đầu đoạn.
+    -ss đặt trước -i nên ffmpeg tua thẳng tới keyframe gần nhất thay vì giải mã từ đầu video.
+    """
+    preset_x264, crf = PRESET_XEM_TRUOC
+    lenh = [
+        "ffmpeg",
+        "-nostdin",
+        "-ss", f"{bat_dau:.3f}",
+        "-i", os.path.abspath(duong_dan_video),
+        "-t", f"{do_dai:.3f}",
+        "-map", "0:v:0",
+        "-map", "0:a:0?",
+    ]
+    if duong_dan_srt_doan and os.path.getsize(duong_dan_srt_doan) > 0:
+        lenh += ["-vf", f"subtitles='{duong_dan_srt_cho_bo_loc(duong_dan_srt_doan)}'"]
+    lenh += [
+        "-c:v", "libx264",
+        "-preset", preset_x264,
+        "-crf", str(crf),
+        "-c:a", "aac",
+        "-movflags", "+faststart",
+        "-y", os.path.abspath(duong_dan_dau_ra)
+    ]
+    return lenh
+
+
+def tao_xem_truoc(duong_dan_video, duong_dan_srt, duong_dan_dau_ra, thoi_diem,
+                  do_dai=DO_DAI_XEM_TRUOC_GIAY, da_huy=None):
+    """
+    Ghép cứng phụ đề cho một đoạn ngắn quanh thoi_diem (giây) ra duong_dan_dau_ra (MP4).
+    Chỉ các phụ đề nằm trong đoạn được đưa vào bộ lọc, nên file SRT đang được ghi dần cũng dùng được.
+    Trả về (bắt đầu, kết thúc) của đoạn đã mã hóa.
+    """
+    try:
+        _, thoi_luong = lay_thong_tin_thoi_gian(duong_dan_video)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        thoi_luong = 0.0
+    bat_dau, ket_thuc = cua_so_xem_truoc(thoi_diem, thoi_luong, do_dai)
+
+    with open(duong_dan_srt, "r", encoding="utf-8") as f:
+        van_ban_srt = f.read()
+    try:
+        cac_phu_de = list(srt.parse(van_ban_srt))
+    except srt.SRTParseError:
+        # File SRT đang được ghi dần có thể dừng giữa một khối: chỉ đọc tới khối hoàn chỉnh cuối cùng
+        cac_phu_de = list(srt.parse(van_ban_srt[:van_ban_srt.rfind("\n\n") + 2]))
+    duong_dan_srt_doan = os.path.splitext(duong_dan_dau_ra)[0] + ".srt"
+    with open(duong_dan_srt_doan, "w", encoding="utf-8") as f:
+        f.write(srt.compose(cat_phu_de_theo_doan(cac_phu_de, bat_dau, ket_thuc)))
+
+    chay_lenh(lenh_xem_truoc(duong_dan_video, duong_dan_srt_doan, duong_dan_dau_ra, bat_dau, ket_thuc - bat_dau),
+              da_huy)
+    return bat_dau, ket_thuc
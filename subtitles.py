@@ -0,0 +1,453 @@
+# subtitles.py
+"""
+Pipeline tạo phụ đề không phụ thuộc Qt: tách âm thanh → phiên âm → dịch → ghi SRT → ghép vào video.
+
+Dùng chung cho hộp thoại phụ đề (ProcessingThread chỉ chuyển sự kiện thành tín hiệu Qt) và cho
+dòng lệnh trên máy chủ không có màn hình, mỗi sự kiện in ra một dòng JSON:
+
+    python -m subtitles in.mp4 --lang vi --out out.mp4
+    python -m subtitles in.mp4 --lang vi --out preview.mp4 --preview-at 95  # chỉ 15 giây quanh 1:35
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from asr_backends import CAC_BO_MAY
+from subtitle_audio import trich_xuat_am_thanh, doc_am_thanh_pcm, TAN_SO_LAY_MAU_ASR
+from subtitle_cache import (
+    lay_bo_nho_dem_phu_de, GIAI_DOAN_AM_THANH, GIAI_DOAN_PHIEN_AM, GIAI_DOAN_DICH, GIAI_DOAN_SRT
+)
+from subtitle_pipeline import chay_duong_ong_phu_de
+from subtitle_transcribe import phien_am_tung_doan
+from subtitle_translation import tao_ham_dich_google
+from subtitle_video import (
+    CHE_DO_PHU_DE_MEM, CAC_CHE_DO_DAU_RA, CAC_PRESET_GHEP_CUNG, PRESET_GHEP_CUNG_MAC_DINH,
+    DO_DAI_XEM_TRUOC_GIAY, lenh_phu_de_mem, ghep_cung_song_song, chay_lenh, tao_xem_truoc,
+    cua_so_xem_truoc, lay_thong_tin_thoi_gian
+)
+from translation_memory import lay_bo_nho_dich
+from whisper_models import lay_quan_ly_whisper
+
+MA_NGON_NGU_THEO_TEN = {
+    "English": "en",
+    "Tiếng Việt": "vi",
+    "Español": "es",
+    "Français": "fr",
+    "Deutsch": "de",
+    "中文": "zh-CN",  # Mã tiếng Trung giản thể cho GoogleTranslator
+}
+MA_NGON_NGU_GOC = "en"  # Whisper được coi là cho phụ đề tiếng Anh, không cần dịch
+LE_AM_THANH_XEM_TRUOC_GIAY = 5.0  # Phiên âm thêm hai bên đoạn xem trước để câu vắt qua mép đoạn không bị cắt
+
+SU_KIEN_TIEN_DO = "progress"
+SU_KIEN_NHAT_KY = "log"
+SU_KIEN_GIAI_DOAN = "stage"
+
+
+def ma_ngon_ngu(ten_hoac_ma):
+    """
+    Nhận tên hiển thị ("Tiếng Việt") hoặc mã ("vi") và trả về mã cho dịch vụ dịch.
+    Ngôn ngữ chưa hỗ trợ thì nâng ValueError thay vì lặng lẽ tạo phụ đề tiếng Anh.
+    """
+    if ten_hoac_ma in MA_NGON_NGU_THEO_TEN.values():
+        return ten_hoac_ma
+    if ten_hoac_ma in MA_NGON_NGU_THEO_TEN:
+        return MA_NGON_NGU_THEO_TEN[ten_hoac_ma]
+    raise ValueError(f"Ngôn ngữ phụ đề không hỗ trợ: {ten_hoac_ma} "
+                     f"(chọn một trong: {', '.join(MA_NGON_NGU_THEO_TEN.values())})")
+
+
+def mo_ta_loi(loi):
+    """Thông báo lỗi cho người dùng, kèm lệnh và stderr nếu lỗi đến từ ffmpeg."""
+    if isinstance(loi, subprocess.CalledProcessError):
+        return f"Lỗi FFmpeg: Lệnh: {' '.join(loi.cmd)}\nStderr: {loi.stderr}"
+    return f"Đã xảy ra lỗi trong quá trình xử lý: {type(loi).__name__}: {loi}"
+
+
+class BoTaoPhuDe:
+    """
+    Chạy toàn bộ pipeline phụ đề cho một video. Tiến độ và nhật ký được báo qua bao_su_kien(dict):
+    {"type": "progress", "percent": int} và {"type": "log", "message": str}. Sau mỗi giai đoạn còn có
+    {"type": "stage", "stage", "seconds", "bytes", "audio_seconds", "rtf", "cached"} (rtf = thời gian giai
+    đoạn / độ dài âm thanh) để biết giai đoạn nào chiếm nhiều thời gian; danh sách này cũng nằm ở cac_giai_doan.
+
+    Mỗi giai đoạn lưu kết quả vào bộ nhớ đệm theo mã băm nội dung video + tham số của giai đoạn, nên chạy
+    lại cùng video (ngôn ngữ khác, hoặc sau khi tạm dừng) bắt đầu từ kết quả gần nhất còn dùng được.
+    da_huy (threading.Event) được đặt thì chay() nâng concurrent.futures.CancelledError.
+    Có xem_truoc_tai (giây) thì thay vì ghép cả video, chỉ ghép cứng một đoạn do_dai_xem_truoc giây quanh
+    thời điểm đó (preset nhanh nhất) để kiểm tra kiểu chữ và thời gian phụ đề trong vài giây. Khi chưa có
+    SRT đã lưu, chỉ âm thanh quanh đoạn đó được trích xuất, phiên âm và dịch (không lưu vào bộ nhớ đệm
+    giai đoạn vì không phải kết quả của cả video), nên lần xem trước đầu tiên cũng không phải chờ cả video.
+    """
+    def __init__(self, duong_dan_video, duong_dan_srt, duong_dan_video_ra, ngon_ngu,
+                 che_do_dau_ra=CHE_DO_PHU_DE_MEM, preset_ghep_cung=PRESET_GHEP_CUNG_MAC_DINH,
+                 bao_su_kien=None, da_huy=None, bo_may_asr=None, xem_truoc_tai=None,
+                 do_dai_xem_truoc=DO_DAI_XEM_TRUOC_GIAY, ham_dich=None):
+        self.duong_dan_video = duong_dan_video
+        self.duong_dan_srt = duong_dan_srt
+        self.duong_dan_video_ra = duong_dan_video_ra
+        self.ma_ngon_ngu = ma_ngon_ngu(ngon_ngu)
+        self.che_do_dau_ra = che_do_dau_ra
+        self.preset_ghep_cung = preset_ghep_cung
+        self.bo_may_asr = bo_may_asr  # Tên trong asr_backends; None: bộ máy mặc định
+        self.xem_truoc_tai = xem_truoc_tai
+        self.do_dai_xem_truoc = do_dai_xem_truoc
+        self.ham_dich = ham_dich  # ham_dich(str) -> str như subtitle_translation; None: Google Translate
+        self.bao_su_kien = bao_su_kien
+        self.da_huy = da_huy if da_huy is not None else threading.Event()
+        self._ty_le_phien_am = 0.0
+        self._do_dai_am_thanh = None
+        self.cac_giai_doan = []
+
+    def huy(self):
+        self.da_huy.set()
+
+    def _kiem_tra_huy(self):
+        if self.da_huy.is_set():
+            raise concurrent.futures.CancelledError()
+
+    def _bao(self, loai, **du_lieu):
+        if self.bao_su_kien:
+            self.bao_su_kien(dict(type=loai, **du_lieu))
+
+    def _tien_do(self, phan_tram):
+        self._bao(SU_KIEN_TIEN_DO, percent=int(phan_tram))
+
+    def _nhat_ky(self, thong_diep):
+        self._bao(SU_KIEN_NHAT_KY, message=thong_diep)
+
+    def _bao_giai_doan(self, giai_doan, bat_dau=None, giay=None, so_byte=None, da_luu=False):
+        """Ghi lại và báo thời gian một giai đoạn (tính từ bat_dau = time.perf_counter(), hoặc truyền sẵn giay)."""
+        if giay is None:
+            giay = time.perf_counter() - bat_dau
+        do_dai = self._do_dai_am_thanh
+        giai_doan = {
+            "stage": giai_doan,
+            "seconds": round(giay, 4),
+            "bytes": so_byte,
+            "audio_seconds": round(do_dai, 3) if do_dai else None,
+            "rtf": round(giay / do_dai, 4) if do_dai else None,
+            "cached": da_luu
+        }
+        self.cac_giai_doan.append(giai_doan)
+        self._bao(SU_KIEN_GIAI_DOAN, **giai_doan)
+
+    def chay(self):
+        """Chạy hết pipeline và trả về đường dẫn video đầu ra."""
+        bat_dau_tong = time.perf_counter()
+        self.cac_giai_doan = []
+        self._nhat_ky("Bắt đầu xử lý video...")
+        self._tien_do(5)
+
+        cache = lay_bo_nho_dem_phu_de()
+        self._nhat_ky("Kiểm tra kết quả đã lưu của video...")
+        bat_dau = time.perf_counter()
+        ma_bam_video = cache.bam_video(self.duong_dan_video)
+        self._bao_giai_doan("hash", bat_dau, so_byte=os.path.getsize(self.duong_dan_video))
+        quan_ly = lay_quan_ly_whisper()
+        ten_mo_hinh = quan_ly.ten_mo_hinh
+        bo_may_asr = self.bo_may_asr or quan_ly.bo_may
+        khoa_am_thanh = cache.tao_khoa(ma_bam_video, GIAI_DOAN_AM_THANH, sample_rate=TAN_SO_LAY_MAU_ASR)
+        khoa_phien_am = cache.tao_khoa(khoa_am_thanh, GIAI_DOAN_PHIEN_AM, backend=bo_may_asr,
+                                       model=ten_mo_hinh, language=None)
+        khoa_dich = None
+        if self.ma_ngon_ngu != MA_NGON_NGU_GOC:
+            khoa_dich = cache.tao_khoa(khoa_phien_am, GIAI_DOAN_DICH, source="auto", target=self.ma_ngon_ngu)
+        khoa_srt = cache.tao_khoa(khoa_dich or khoa_phien_am, GIAI_DOAN_SRT)
+        duong_dan_pcm = cache.duong_dan(GIAI_DOAN_AM_THANH, khoa_am_thanh)
+        if os.path.exists(duong_dan_pcm):
+            # Độ dài âm thanh để tính RTF ngay cả khi không cần trích xuất lại
+            self._do_dai_am_thanh = os.path.getsize(duong_dan_pcm) / 4 / TAN_SO_LAY_MAU_ASR
+        self._kiem_tra_huy()
+
+        van_ban_srt = cache.lay_van_ban(GIAI_DOAN_SRT, khoa_srt)
+        if van_ban_srt is not None:
+            self._nhat_ky("Dùng lại file SRT đã tạo trước đó cho video và ngôn ngữ này.")
+            bat_dau = time.perf_counter()
+            with open(self.duong_dan_srt, "w", encoding="utf-8") as f:
+                f.write(van_ban_srt)
+            self._bao_giai_doan("write_srt", bat_dau, so_byte=len(van_ban_srt.encode("utf-8")), da_luu=True)
+        elif self.xem_truoc_tai is not None:
+            self._tao_srt_xem_truoc(cache, khoa_am_thanh, khoa_phien_am, khoa_dich, ten_mo_hinh, bo_may_asr)
+        else:
+            self._tao_srt(cache, khoa_am_thanh, khoa_phien_am, khoa_dich, khoa_srt, ten_mo_hinh, bo_may_asr)
+        self._nhat_ky(f"Đã tạo file SRT: {os.path.basename(self.duong_dan_srt)}")
+        self._tien_do(90)
+
+        bat_dau = time.perf_counter()
+        if self.xem_truoc_tai is not None:
+            self._tao_xem_truoc()
+            giai_doan = "preview"
+        else:
+            self._ghep_phu_de()
+            self._nhat_ky("Đã ghép phụ đề vào video.")
+            giai_doan = "mux" if self.che_do_dau_ra == CHE_DO_PHU_DE_MEM else "burn"
+        self._bao_giai_doan(giai_doan, bat_dau, so_byte=os.path.getsize(self.duong_dan_video_ra))
+        self._bao_giai_doan("total", bat_dau_tong)
+        self._tien_do(100)
+        return self.duong_dan_video_ra
+
+    def _trich_xuat_am_thanh(self, cache, khoa_am_thanh):
+        """1. Trích xuất âm thanh từ video bằng FFmpeg (hoặc mở lại file PCM đã lưu)."""
+        bat_dau = time.perf_counter()
+        da_luu = cache.co(GIAI_DOAN_AM_THANH, khoa_am_thanh)
+        if da_luu:
+            self._nhat_ky("Dùng lại âm thanh đã trích xuất.")
+        else:
+            self._nhat_ky("Trích xuất âm thanh từ video bằng FFmpeg...")
+            self._tien_do(10)
+            # FFmpeg giải mã thẳng ra PCM 16 kHz mono float32 qua pipe (đúng định dạng Whisper cần),
+            # ghi vào file tạm của bộ nhớ đệm và chỉ thành kết quả chính thức khi trích xuất xong
+            trich_xuat_am_thanh(self.duong_dan_video, da_huy=self.da_huy,
+                                duong_dan_pcm=cache.duong_dan_tam_cho(GIAI_DOAN_AM_THANH, khoa_am_thanh))
+            cache.xac_nhan(GIAI_DOAN_AM_THANH, khoa_am_thanh)
+            self._nhat_ky("Đã trích xuất âm thanh thành công.")
+        self._tien_do(20)
+        am_thanh = doc_am_thanh_pcm(cache.duong_dan(GIAI_DOAN_AM_THANH, khoa_am_thanh))
+        self._do_dai_am_thanh = len(am_thanh) / TAN_SO_LAY_MAU_ASR
+        self._bao_giai_doan("extract", bat_dau, so_byte=am_thanh.nbytes, da_luu=da_luu)
+        return am_thanh
+
+    def _tao_srt(self, cache, khoa_am_thanh, khoa_phien_am, khoa_dich, khoa_srt, ten_mo_hinh, bo_may_asr):
+        """
+        2-4. Nhận diện giọng nói, dịch và ghi SRT chạy đồng thời qua các hàng đợi có giới hạn:
+        mỗi cửa sổ âm thanh phiên âm xong được dịch ngay, và file SRT được ghi thêm sau mỗi lô
+        nên có thể mở xem trước khi cả video xong.
+        """
+        doan_da_dich_luu = cache.lay_json(GIAI_DOAN_DICH, khoa_dich) if khoa_dich else None
+        doan_phien_am_luu = None
+        if doan_da_dich_luu is not None:
+            self._nhat_ky("Dùng lại bản dịch đã lưu.")
+            nguon = iter(doan_da_dich_luu)
+            khoa_dich = None  # Đã dịch, chỉ còn ghi SRT
+        else:
+            doan_phien_am_luu = cache.lay_json(GIAI_DOAN_PHIEN_AM, khoa_phien_am)
+            if doan_phien_am_luu is not None:
+                self._nhat_ky("Dùng lại kết quả nhận diện giọng nói đã lưu.")
+                nguon = iter(doan_phien_am_luu)
+            else:
+                am_thanh = self._trich_xuat_am_thanh(cache, khoa_am_thanh)
+                self._nhat_ky(f"Nhận diện giọng nói bằng {bo_may_asr} (quá trình này có thể mất thời gian)...")
+                # Cắt âm thanh tại khoảng lặng và phiên âm các cửa sổ song song trên các nhân CPU
+                nguon = phien_am_tung_doan(am_thanh, ten_mo_hinh=ten_mo_hinh,
+                                           bao_tien_do=self._bao_tien_do_phien_am, da_huy=self.da_huy,
+                                           bo_may=bo_may_asr)
+
+        if khoa_dich:
+            self._nhat_ky(f"Nhận diện và dịch phụ đề sang {self.ma_ngon_ngu}...")
+            ham_dich = self.ham_dich or tao_ham_dich_google(self.ma_ngon_ngu)
+        else:
+            if doan_da_dich_luu is None:
+                self._nhat_ky("Ngôn ngữ là Tiếng Anh, không cần dịch.")
+            ham_dich = None
+        da_co_phien_am = doan_phien_am_luu is not None or doan_da_dich_luu is not None
+        self._ty_le_phien_am = 1.0 if da_co_phien_am else 0.0
+        self._tien_do(30)
+
+        # Câu đã từng dịch được lấy từ bộ nhớ dịch, chỉ câu mới mới phải gọi mạng
+        thong_ke = {}
+        cac_doan, cac_doan_da_dich, so_doan_loi = chay_duong_ong_phu_de(
+            nguon, self.duong_dan_srt, ham_dich=ham_dich,
+            bo_nho_dich=lay_bo_nho_dich(), ma_nguon="auto", ma_dich=self.ma_ngon_ngu,
+            bao_tien_do=self._bao_tien_do_duong_ong, da_huy=self.da_huy, thong_ke=thong_ke
+        )
+        self._bao_thong_ke_duong_ong(thong_ke, cac_doan, da_co_phien_am, doan_da_dich_luu is not None)
+        if not da_co_phien_am:
+            cache.luu_json(GIAI_DOAN_PHIEN_AM, khoa_phien_am, cac_doan)
+            self._nhat_ky("Đã nhận diện giọng nói.")
+        if khoa_dich:
+            if so_doan_loi:
+                # Không lưu bản dịch thiếu để lần chạy sau còn dịch lại các đoạn lỗi
+                self._nhat_ky(f"Cảnh báo: Không thể dịch {so_doan_loi} đoạn, giữ nguyên bản gốc.")
+            else:
+                cache.luu_json(GIAI_DOAN_DICH, khoa_dich, cac_doan_da_dich)
+            self._nhat_ky("Đã dịch phụ đề.")
+        if not so_doan_loi:
+            with open(self.duong_dan_srt, "r", encoding="utf-8") as f:
+                cache.luu_van_ban(GIAI_DOAN_SRT, khoa_srt, f.read())
+
+    def _bao_thong_ke_duong_ong(self, thong_ke, cac_doan, da_co_phien_am, da_co_ban_dich):
+        # Ba giai đoạn chạy chồng lên nhau nên tổng của chúng lớn hơn "pipeline" (thời gian thực cả đường ống)
+        self._bao_giai_doan("transcribe", giay=thong_ke["transcribe_s"],
+                            so_byte=sum(len(doan["text"].encode("utf-8")) for doan in cac_doan),
+                            da_luu=da_co_phien_am)
+        if self.ma_ngon_ngu != MA_NGON_NGU_GOC:
+            self._bao_giai_doan("translate", giay=thong_ke["translate_s"], so_byte=thong_ke["translate_bytes"],
+                                da_luu=da_co_ban_dich)
+        self._bao_giai_doan("write_srt", giay=thong_ke["write_s"], so_byte=thong_ke["srt_bytes"])
+        self._bao_giai_doan("pipeline", giay=thong_ke["wall_s"])
+
+    def _tao_srt_xem_truoc(self, cache, khoa_am_thanh, khoa_phien_am, khoa_dich, ten_mo_hinh, bo_may_asr):
+        """
+        2'-4'. Như _tao_srt nhưng chỉ cho đoạn xem trước (kèm LE_AM_THANH_XEM_TRUOC_GIAY hai bên): dùng bản dịch
+        hoặc bản phiên âm đã lưu nếu có, nếu không thì chỉ trích xuất và phiên âm đoạn âm thanh đó.
+        Câu dịch được vẫn vào bộ nhớ dịch, nên lần chạy cả video sau không phải dịch lại chúng.
+        """
+        try:
+            _, thoi_luong = lay_thong_tin_thoi_gian(self.duong_dan_video)
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            thoi_luong = 0.0
+        bat_dau_doan, ket_thuc_doan = cua_so_xem_truoc(self.xem_truoc_tai, thoi_luong, self.do_dai_xem_truoc)
+        tu = max(0.0, bat_dau_doan - LE_AM_THANH_XEM_TRUOC_GIAY)
+        den = ket_thuc_doan + LE_AM_THANH_XEM_TRUOC_GIAY
+
+        def trong_doan(cac_doan):
+            return [doan for doan in cac_doan if doan["end"] > tu and doan["start"] < den]
+
+        doan_da_dich_luu = cache.lay_json(GIAI_DOAN_DICH, khoa_dich) if khoa_dich else None
+        doan_phien_am_luu = None
+        if doan_da_dich_luu is not None:
+            self._nhat_ky("Dùng lại bản dịch đã lưu cho đoạn xem trước.")
+            nguon = iter(trong_doan(doan_da_dich_luu))
+            khoa_dich = None
+        else:
+            doan_phien_am_luu = cache.lay_json(GIAI_DOAN_PHIEN_AM, khoa_phien_am)
+            if doan_phien_am_luu is not None:
+                self._nhat_ky("Dùng lại kết quả nhận diện giọng nói đã lưu cho đoạn xem trước.")
+                nguon = iter(trong_doan(doan_phien_am_luu))
+            else:
+                bat_dau = time.perf_counter()
+                da_luu = cache.co(GIAI_DOAN_AM_THANH, khoa_am_thanh)
+                if da_luu:
+                    am_thanh_ca_video = doc_am_thanh_pcm(cache.duong_dan(GIAI_DOAN_AM_THANH, khoa_am_thanh))
+                    am_thanh = am_thanh_ca_video[int(tu * TAN_SO_LAY_MAU_ASR):int(den * TAN_SO_LAY_MAU_ASR)]
+                else:
+                    self._nhat_ky(f"Trích xuất âm thanh từ giây {tu:.1f} đến {den:.1f}...")
+                    am_thanh = trich_xuat_am_thanh(self.duong_dan_video, da_huy=self.da_huy,
+                                                   bat_dau=tu, do_dai=den - tu)
+                self._do_dai_am_thanh = len(am_thanh) / TAN_SO_LAY_MAU_ASR
+                self._bao_giai_doan("extract", bat_dau, so_byte=am_thanh.nbytes, da_luu=da_luu)
+                self._tien_do(20)
+                self._nhat_ky(f"Nhận diện giọng nói đoạn xem trước bằng {bo_may_asr}...")
+                nguon = _doi_moc(phien_am_tung_doan(am_thanh, ten_mo_hinh=ten_mo_hinh,
+                                                    bao_tien_do=self._bao_tien_do_phien_am, da_huy=self.da_huy,
+                                                    bo_may=bo_may_asr), tu)
+
+        ham_dich = (self.ham_dich or tao_ham_dich_google(self.ma_ngon_ngu)) if khoa_dich else None
+        da_co_phien_am = doan_phien_am_luu is not None or doan_da_dich_luu is not None
+        self._ty_le_phien_am = 1.0 if da_co_phien_am else 0.0
+        self._tien_do(30)
+        thong_ke = {}
+        cac_doan, _, so_doan_loi = chay_duong_ong_phu_de(
+            nguon, self.duong_dan_srt, ham_dich=ham_dich,
+            bo_nho_dich=lay_bo_nho_dich(), ma_nguon="auto", ma_dich=self.ma_ngon_ngu,
+            bao_tien_do=self._bao_tien_do_duong_ong, da_huy=self.da_huy, thong_ke=thong_ke
+        )
+        self._bao_thong_ke_duong_ong(thong_ke, cac_doan, da_co_phien_am, doan_da_dich_luu is not None)
+        if so_doan_loi:
+            self._nhat_ky(f"Cảnh báo: Không thể dịch {so_doan_loi} đoạn, giữ nguyên bản gốc.")
+
+    def _bao_tien_do_phien_am(self, da_xong, tong_so):
+        self._ty_le_phien_am = da_xong / max(1, tong_so)
+        self._tien_do(30 + 40 * self._ty_le_phien_am)
+
+    def _bao_tien_do_duong_ong(self, da_ghi, da_nhan):
+        # Phần ghi SRT không thể vượt quá phần đã phiên âm; 70-85% dành cho các lô cuối cùng
+        self._tien_do(30 + 40 * self._ty_le_phien_am + 15 * self._ty_le_phien_am * da_ghi / max(1, da_nhan))
+
+    def _tao_xem_truoc(self):
+        """5'. Chỉ ghép cứng đoạn ngắn quanh thời điểm cần xem trước."""
+        self._nhat_ky(f"Tạo bản xem trước quanh giây {self.xem_truoc_tai:g}...")
+        self._tien_do(95)
+        bat_dau, ket_thuc = tao_xem_truoc(self.duong_dan_video, self.duong_dan_srt, self.duong_dan_video_ra,
+                                          self.xem_truoc_tai, self.do_dai_xem_truoc, self.da_huy)
+        self._nhat_ky(f"Đã tạo bản xem trước từ giây {bat_dau:.1f} đến {ket_thuc:.1f}.")
+
+    def _ghep_phu_de(self):
+        """5. Ghép phụ đề vào video bằng FFmpeg."""
+        if self.che_do_dau_ra == CHE_DO_PHU_DE_MEM:
+            # Chỉ thêm luồng phụ đề và sao chép nguyên hình/tiếng (-c copy): xong trong vài giây
+            self._nhat_ky("Ghép phụ đề mềm vào video...")
+            self._tien_do(95)
+            chay_lenh(lenh_phu_de_mem(self.duong_dan_video, self.duong_dan_srt, self.duong_dan_video_ra,
+                                      self.ma_ngon_ngu), self.da_huy)
+        else:
+            self._nhat_ky(f"Ghép cứng phụ đề vào video (preset {self.preset_ghep_cung}, "
+                          "quá trình này có thể mất thời gian)...")
+            # Cắt video tại keyframe và mã hóa các đoạn song song trên các nhân CPU, rồi nối lại không mã hóa lại.
+            # Các đoạn nằm trong thư mục tạm riêng cạnh file đầu ra, nên không đụng thư mục sẵn có của người
+            # dùng và hai việc ghép cứng vào cùng thư mục không ghi đè đoạn của nhau
+            thu_muc_doan = tempfile.mkdtemp(prefix="burn_segments_",
+                                            dir=os.path.dirname(os.path.abspath(self.duong_dan_video_ra)))
+            try:
+                ghep_cung_song_song(
+                    self.duong_dan_video, self.duong_dan_srt, self.duong_dan_video_ra, thu_muc_doan,
+                    preset=self.preset_ghep_cung,
+                    bao_tien_do=lambda da_xong, tong_so: self._tien_do(90 + 9 * da_xong / max(1, tong_so)),
+                    da_huy=self.da_huy
+                )
+            finally:
+                shutil.rmtree(thu_muc_doan, ignore_errors=True)
+        self._nhat_ky("Lệnh FFmpeg đã chạy hoàn tất để ghép phụ đề.")
+
+
+def _doi_moc(cac_doan, lech_giay):
+    """Cộng lech_giay vào mốc thời gian của các đoạn (phiên âm một đoạn âm thanh cắt từ giữa video)."""
+    try:
+        for doan in cac_doan:
+            yield dict(doan, start=doan["start"] + lech_giay, end=doan["end"] + lech_giay)
+    finally:
+        cac_doan.close()  # Đường ống dừng giữa chừng: đóng luôn generator phiên âm để bỏ các cửa sổ chưa chạy
+
+
+def _doc_ngon_ngu(gia_tri):
+    try:
+        return ma_ngon_ngu(gia_tri)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _in_su_kien(su_kien):
+    print(json.dumps(su_kien, ensure_ascii=False), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m subtitles",
+        description="Tạo phụ đề cho video (không cần giao diện); tiến độ in ra stdout, mỗi dòng một sự kiện JSON.")
+    parser.add_argument("video", help="Video đầu vào")
+    parser.add_argument("--lang", type=_doc_ngon_ngu, default=MA_NGON_NGU_GOC,
+                        help="Ngôn ngữ phụ đề, mã (vi, es, zh-CN...) hoặc tên hiển thị; mặc định en (không dịch)")
+    parser.add_argument("--out", required=True, help="Video đầu ra")
+    parser.add_argument("--srt", help="File SRT đầu ra (mặc định cùng tên với video đầu ra)")
+    parser.add_argument("--mode", choices=[ma for ma, _ in CAC_CHE_DO_DAU_RA], default=CHE_DO_PHU_DE_MEM,
+                        help="soft: thêm luồng phụ đề (nhanh); burn: ghép cứng vào hình")
+    parser.add_argument("--preset", choices=list(CAC_PRESET_GHEP_CUNG), default=PRESET_GHEP_CUNG_MAC_DINH,
+                        help="Preset mã hóa khi ghép cứng")
+    parser.add_argument("--preview-at", type=float, metavar="GIAY",
+                        help="Chỉ ghép cứng một đoạn ngắn quanh thời điểm này (giây) để xem trước; "
+                             "chưa có kết quả đã lưu thì cũng chỉ phiên âm và dịch âm thanh quanh đoạn đó")
+    parser.add_argument("--preview-length", type=float, default=DO_DAI_XEM_TRUOC_GIAY,
+                        help="Độ dài đoạn xem trước (10-20 giây)")
+    parser.add_argument("--asr", choices=list(CAC_BO_MAY),
+                        help="Bộ máy nhận diện giọng nói (mặc định whisper, hoặc biến môi trường ZENTASK_ASR_BACKEND)")
+    args = parser.parse_args(argv)
+
+    duong_dan_srt = args.srt or os.path.splitext(args.out)[0] + ".srt"
+    bo_tao = BoTaoPhuDe(args.video, duong_dan_srt, args.out, args.lang, che_do_dau_ra=args.mode,
+                        preset_ghep_cung=args.preset, bao_su_kien=_in_su_kien, bo_may_asr=args.asr,
+                        xem_truoc_tai=args.preview_at, do_dai_xem_truoc=args.preview_length)
+    try:
+        duong_dan_ra = bo_tao.chay()
+    except (KeyboardInterrupt, concurrent.futures.CancelledError):
+        bo_tao.huy()
+        _in_su_kien({"type": "cancelled"})
+        return 130
+    except Exception as e:
+        _in_su_kien({"type": "error", "message": mo_ta_loi(e)})
+        return 1
+    _in_su_kien({"type": "done", "output": os.path.abspath(duong_dan_ra), "srt": os.path.abspath(duong_dan_srt)})
+    return 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,16 @@
+# text_utils.py
+import unicodedata
+
+
+def chuan_hoa_van_ban(van_ban):
+    """Chuẩn hóa Unicode (NFC) và gộp mọi khoảng trắng (kể cả ngắt dòng) để cùng một câu luôn ra cùng một khóa."""
+    return " ".join(unicodedata.normalize("NFC", van_ban).split())
+
+
+def chuan_hoa_giu_dong(van_ban):
+    """
+    Như chuan_hoa_van_ban nhưng giữ ngắt dòng: gộp khoảng trắng trong từng dòng, bỏ dòng trống ở đầu và cuối.
+    Dùng cho khóa mà cấu trúc dòng là một phần của nội dung (vd: bộ nhớ dịch, bản dịch giữ đúng số dòng).
+    """
+    cac_dong = [" ".join(dong.split()) for dong in unicodedata.normalize("NFC", van_ban).splitlines()]
+    return "\n".join(cac_dong).strip("\n")
@@ -0,0 +1,136 @@
+# translation_memory.py
+import os
+import sqlite3
+import threading
+import time
+
+from text_utils import chuan_hoa_giu_dong
+
+DUONG_DAN_BO_NHO_DICH = os.path.join("data", "translation_memory.sqlite3")
+SO_MUC_TOI_DA = 200000
+TI_LE_DON_DEP = 0.1  # Khi đầy, xóa 10% số mục lâu không dùng nhất một lần để không phải dọn liên tục
+
+
+class BoNhoDich:
+    """
+    Bộ nhớ dịch lưu trong SQLite, khóa theo (ngôn ngữ nguồn, ngôn ngữ đích, văn bản đã chuẩn hóa).
+    Khóa giữ ngắt dòng: văn bản nhiều dòng chỉ khớp bản dịch có cùng cấu trúc dòng.
+    Dùng chung cho trang dịch và pipeline phụ đề để câu đã dịch rồi không phải gọi mạng lần nữa.
+    Số mục có giới hạn: vượt quá thì xóa các mục lâu không dùng nhất (LRU theo lần dùng cuối).
+    """
+    def __init__(self, duong_dan=DUONG_DAN_BO_NHO_DICH, so_muc_toi_da=SO_MUC_TOI_DA):
+        self.duong_dan = os.path.abspath(duong_dan)
+        self.so_muc_toi_da = so_muc_toi_da
+        self.so_lan_trung = 0
+        self.so_lan_truot = 0
+        self._khoa = threading.Lock()
+        os.makedirs(os.path.dirname(self.duong_dan), exist_ok=True)
+        self._ket_noi = sqlite3.connect(self.duong_dan, check_same_thread=False)
+        self._ket_noi.execute("PRAGMA journal_mode=WAL")
+        self._ket_noi.execute("PRAGMA synchronous=NORMAL")
+        self._ket_noi.execute("""
+            CREATE TABLE IF NOT EXISTS ban_dich (
+                nguon TEXT NOT NULL,
+                dich TEXT NOT NULL,
+                van_ban TEXT NOT NULL,
+                ket_qua TEXT NOT NULL,
+                lan_dung_cuoi REAL NOT NULL,
+                so_lan_dung INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (nguon, dich, van_ban)
+            )
+        """)
+        self._ket_noi.execute("CREATE INDEX IF NOT EXISTS idx_ban_dich_lan_dung ON ban_dich (lan_dung_cuoi)")
+        self._ket_noi.commit()
+        self._so_muc = self._ket_noi.execute("SELECT COUNT(*) FROM ban_dich").fetchone()[0]
+
+    @staticmethod
+    def _khoa_ngon_ngu(ma):
+        return (ma or "auto").lower()
+
+    def lay(self, nguon, dich, van_ban):
+        """Trả về bản dịch đã lưu hoặc None."""
+        return self.lay_nhieu(nguon, dich, [van_ban]).get(chuan_hoa_giu_dong(van_ban))
+
+    def lay_nhieu(self, nguon, dich, cac_van_ban):
+        """Tra nhiều câu một lần. Trả về dict {chuan_hoa_giu_dong(văn bản): bản dịch} cho các câu có trong bộ nhớ."""
+        cac_khoa = list(dict.fromkeys(chuan_hoa_giu_dong(v) for v in cac_van_ban if v and v.strip()))
+        nguon, dich = self._khoa_ngon_ngu(nguon), self._khoa_ngon_ngu(dich)
+        ket_qua = {}
+        with self._khoa:
+            for i in range(0, len(cac_khoa), 500):  # SQLite giới hạn số tham số mỗi câu lệnh
+                phan = cac_khoa[i:i + 500]
+                dau_hoi = ",".join("?" * len(phan))
+                for van_ban, ban_dich in self._ket_noi.execute(
+                        f"SELECT van_ban, ket_qua FROM ban_dich WHERE nguon = ? AND dich = ? AND van_ban IN ({dau_hoi})",
+                        [nguon, dich] + phan):
+                    ket_qua[van_ban] = ban_dich
+            if ket_qua:
+                bay_gio = time.time()
+                self._ket_noi.executemany(
+                    "UPDATE ban_dich SET lan_dung_cuoi = ?, so_lan_dung = so_lan_dung + 1 "
+                    "WHERE nguon = ? AND dich = ? AND van_ban = ?",
+                    [(bay_gio, nguon, dich, van_ban) for van_ban in ket_qua]
+                )
+                self._ket_noi.commit()
+            self.so_lan_trung += len(ket_qua)
+            self.so_lan_truot += len(cac_khoa) - len(ket_qua)
+        return ket_qua
+
+    def luu(self, nguon, dich, van_ban, ban_dich):
+        self.luu_nhieu(nguon, dich, [(van_ban, ban_dich)])
+
+    def luu_nhieu(self, nguon, dich, cac_cap):
+        """Lưu danh sách (văn bản, bản dịch); bỏ qua cặp rỗng."""
+        nguon, dich = self._khoa_ngon_ngu(nguon), self._khoa_ngon_ngu(dich)
+        bay_gio = time.time()
+        cac_dong = [(nguon, dich, chuan_hoa_giu_dong(van_ban), ban_dich, bay_gio)
+                    for van_ban, ban_dich in cac_cap
+                    if van_ban and van_ban.strip() and ban_dich and ban_dich.strip()]
+        if not cac_dong:
+            return
+        with self._khoa:
+            truoc = self._ket_noi.total_changes
+            self._ket_noi.executemany(
+                "INSERT OR IGNORE INTO ban_dich (nguon, dich, van_ban, ket_qua, lan_dung_cuoi) VALUES (?, ?, ?, ?, ?)",
+                cac_dong
+            )
+            self._so_muc += self._ket_noi.total_changes - truoc
+            self._ket_noi.executemany(
+                "UPDATE ban_dich SET ket_qua = ?, lan_dung_cuoi = ? WHERE nguon = ? AND dich = ? AND van_ban = ?",
+                [(ket_qua, lan_dung, n, d, v) for n, d, v, ket_qua, lan_dung in cac_dong]
+            )
+            if self._so_muc > self.so_muc_toi_da:
+                so_xoa = self._so_muc - self.so_muc_toi_da + int(self.so_muc_toi_da * TI_LE_DON_DEP)
+                self._ket_noi.execute(
+                    "DELETE FROM ban_dich WHERE rowid IN "
+                    "(SELECT rowid FROM ban_dich ORDER BY lan_dung_cuoi LIMIT ?)", (so_xoa,)
+                )
+                self._so_muc = self._ket_noi.execute("SELECT COUNT(*) FROM ban_dich").fetchone()[0]
+            self._ket_noi.commit()
+
+    def thong_ke(self):
+        with self._khoa:
+            tong = self.so_lan_trung + self.so_lan_truot
+            return {
+                "so_muc": self._so_muc,
+                "so_lan_trung": self.so_lan_trung,
+                "so_lan_truot": self.so_lan_truot,
+                "ti_le_trung": self.so_lan_trung / tong if tong else 0.0
+            }
+
+    def dong(self):
+        with self._khoa:
+            self._ket_noi.close()
+
+
+_bo_nho_dich = None
+_khoa_bo_nho_dich = threading.Lock()
+
+
+def lay_bo_nho_dich():
+    """Trả về bộ nhớ dịch dùng chung cho toàn ứng dụng."""
+    global _bo_nho_dich
+    with _khoa_bo_nho_dich:
+        if _bo_nho_dich is None:
+            _bo_nho_dich = BoNhoDich()
+        return _bo_nho_dich
@@ -0,0 +1,252 @@
+# tts_audio.py
+import collections
+import io
+import threading
+
+import pygame
+
+DUNG_LUONG_BAN_DAU = 64 * 1024
+BYTE_UOC_TINH_MOI_KY_TU = 512  # Edge TTS (mp3 48 kbps) cho khoảng 400-500 byte cho mỗi ký tự được đọc
+
+
+class BoDemAmThanh:
+    """
+    Bộ đệm nhận các khối âm thanh: cấp phát trước theo độ dài văn bản, nhân đôi khi thiếu chỗ,
+    ghi bằng memoryview nên không sao chép lại toàn bộ dữ liệu ở mỗi khối như khi dùng bytes +=.
+    """
+    def __init__(self, dung_luong=DUNG_LUONG_BAN_DAU):
+        self._du_lieu = bytearray(max(1, dung_luong))
+        self._do_dai = 0
+
+    @classmethod
+    def cho_van_ban(cls, van_ban):
+        return cls(max(DUNG_LUONG_BAN_DAU, len(van_ban) * BYTE_UOC_TINH_MOI_KY_TU))
+
+    def __len__(self):
+        return self._do_dai
+
+    def them(self, khoi):
+        can_co = self._do_dai + len(khoi)
+        if can_co > len(self._du_lieu):
+            dung_luong_moi = len(self._du_lieu)
+            while dung_luong_moi < can_co:
+                dung_luong_moi *= 2
+            du_lieu_moi = bytearray(dung_luong_moi)
+            du_lieu_moi[:self._do_dai] = memoryview(self._du_lieu)[:self._do_dai]
+            self._du_lieu = du_lieu_moi
+        memoryview(self._du_lieu)[self._do_dai:can_co] = khoi
+        self._do_dai = can_co
+
+    def xem(self, bat_dau=0, ket_thuc=None):
+        """Trả về memoryview (không sao chép) của phần dữ liệu đã ghi."""
+        ket_thuc = self._do_dai if ket_thuc is None else min(ket_thuc, self._do_dai)
+        return memoryview(self._du_lieu)[bat_dau:ket_thuc]
+
+    def lay_bytes(self):
+        return bytes(self.xem())
+
+
+def khoi_tao_mixer():
+    if not pygame.mixer.get_init():
+        pygame.mixer.init()
+
+
+def tao_sound_tu_mp3(du_lieu_mp3):
+    """Giải mã MP3 ngay trong bộ nhớ thành pygame.mixer.Sound (PCM), không cần file tạm hay ffmpeg."""
+    khoi_tao_mixer()
+    return pygame.mixer.Sound(file=io.BytesIO(du_lieu_mp3))
+
+
+# --- Phát MP3 dạng luồng: cắt theo ranh giới khung MP3, giải mã từng đoạn và xếp hàng trên một kênh ---
+
+BANG_BITRATE_MPEG1_L3 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+BANG_BITRATE_MPEG2_L3 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+BANG_TAN_SO_LAY_MAU = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],  # MPEG-2.5
+}
+KHUNG_DOAN_DAU = 8  # Đoạn đầu ngắn (~0.2 giây với Edge TTS) để có tiếng sớm nhất
+KHUNG_MOI_DOAN = 40  # Các đoạn sau khoảng 1 giây
+KHUNG_CHONG_LAP = 2  # Giải mã thêm vài khung phía trước rồi bỏ đi (bit reservoir, overlap-add của IMDCT)
+TRE_GIAI_MA = 529  # Độ trễ của bộ lọc tổng hợp trong bộ giải mã MP3 (mẫu), đã nằm sẵn trong phần đệm cuối của LAME
+
+
+def doc_tieu_de_khung_mp3(du_lieu, vi_tri):
+    """
+    Đọc tiêu đề khung MPEG Layer III tại vi_tri.
+    Trả về (độ dài khung, số mẫu của khung, tần số lấy mẫu) hoặc None nếu không phải tiêu đề hợp lệ.
+    """
+    if vi_tri + 4 > len(du_lieu):
+        return None
+    b0, b1, b2 = du_lieu[vi_tri], du_lieu[vi_tri + 1], du_lieu[vi_tri + 2]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    phien_ban = (b1 >> 3) & 0x03
+    lop = (b1 >> 1) & 0x03
+    chi_so_bitrate = b2 >> 4
+    chi_so_tan_so = (b2 >> 2) & 0x03
+    dem = (b2 >> 1) & 0x01
+    if phien_ban == 1 or lop != 1 or chi_so_bitrate in (0, 15) or chi_so_tan_so == 3:
+        return None
+
+    tan_so = BANG_TAN_SO_LAY_MAU[phien_ban][chi_so_tan_so]
+    if phien_ban == 3:
+        bitrate = BANG_BITRATE_MPEG1_L3[chi_so_bitrate] * 1000
+        return 144 * bitrate // tan_so + dem, 1152, tan_so
+    bitrate = BANG_BITRATE_MPEG2_L3[chi_so_bitrate] * 1000
+    return 72 * bitrate // tan_so + dem, 576, tan_so
+
+
+def doc_khung_thong_tin(du_lieu, vi_tri, do_dai):
+    """
+    Nhận diện khung Xing/Info đầu luồng (khung không có âm thanh). Trả về (độ trễ mã hóa, số mẫu đệm cuối)
+    theo thẻ LAME, (0, 0) nếu là khung Info không có thẻ LAME, hoặc None nếu là khung âm thanh bình thường.
+    """
+    khung = bytes(du_lieu[vi_tri:vi_tri + do_dai])
+    vi_tri_the = -1
+    for ten_the in (b"Xing", b"Info"):
+        vi_tri_the = khung.find(ten_the, 4, 4 + 36)  # Ngay sau phần side info (9-32 byte)
+        if vi_tri_the >= 0:
+            break
+    if vi_tri_the < 0:
+        return None
+
+    co = int.from_bytes(khung[vi_tri_the + 4:vi_tri_the + 8], "big")
+    vi_tri_lame = vi_tri_the + 8
+    vi_tri_lame += 4 if co & 0x1 else 0  # Số khung
+    vi_tri_lame += 4 if co & 0x2 else 0  # Số byte
+    vi_tri_lame += 100 if co & 0x4 else 0  # Bảng TOC
+    vi_tri_lame += 4 if co & 0x8 else 0  # Chỉ số chất lượng
+    # Thẻ LAME: 9 byte tên bộ mã hóa, 12 byte thông tin, rồi 3 byte chứa độ trễ (12 bit) và phần đệm (12 bit)
+    vi_tri_tre = vi_tri_lame + 21
+    if vi_tri_tre + 3 > len(khung) or not khung[vi_tri_lame:vi_tri_lame + 4].isalpha():
+        return 0, 0
+    b0, b1, b2 = khung[vi_tri_tre], khung[vi_tri_tre + 1], khung[vi_tri_tre + 2]
+    return (b0 << 4) | (b1 >> 4), ((b1 & 0x0F) << 8) | b2
+
+
+def _bo_qua_id3(du_lieu, vi_tri):
+    if vi_tri == 0 and len(du_lieu) >= 10 and bytes(du_lieu[:3]) == b"ID3":
+        kich_thuoc = 0
+        for b in du_lieu[6:10]:
+            kich_thuoc = (kich_thuoc << 7) | (b & 0x7F)
+        return 10 + kich_thuoc
+    return vi_tri
+
+
+class TrinhPhatLuongMp3:
+    """
+    Nhận dần các khối MP3 từ Edge TTS và bắt đầu phát ngay khi có đủ vài khung đầu tiên,
+    thay vì chờ toàn bộ luồng. Mỗi đoạn được giải mã trong bộ nhớ thành Sound và xếp hàng
+    nối tiếp trên cùng một kênh. Gọi bom() định kỳ để đẩy đoạn kế tiếp vào kênh.
+    dung() có thể được gọi từ luồng khác (luồng giao diện), nên hàng đợi và kênh được giữ bằng khóa.
+    """
+    def __init__(self, van_ban=""):
+        self.bo_dem = BoDemAmThanh.cho_van_ban(van_ban)
+        self._khung = []  # (vị trí, độ dài, số mẫu, tần số) của các khung âm thanh đã đủ dữ liệu
+        self._vi_tri_phan_tich = 0
+        self._khung_ke_tiep = 0  # Khung đầu tiên chưa được đưa vào đoạn nào
+        self._tre_ma_hoa = 0  # Số mẫu im lặng bộ mã hóa thêm vào đầu luồng (theo thẻ LAME)
+        self._dem_cuoi = 0  # Số mẫu đệm cuối luồng (theo thẻ LAME)
+        self._hang_cho = collections.deque()
+        self._khoa = threading.Lock()
+        self._channel = None
+        self._da_nhan_het = False
+        self._da_dung = False
+        self.da_phat = False
+
+    def __len__(self):
+        return len(self.bo_dem)
+
+    def lay_bytes(self):
+        return self.bo_dem.lay_bytes()
+
+    def them(self, khoi):
+        self.bo_dem.them(khoi)
+        self._phan_tich_khung()
+        nguong = KHUNG_MOI_DOAN if self.da_phat or self._hang_cho else KHUNG_DOAN_DAU
+        if len(self._khung) - self._khung_ke_tiep >= nguong:
+            self._cat_doan(len(self._khung))
+
+    def ket_thuc(self):
+        """Báo đã nhận hết dữ liệu: đưa các khung còn lại vào đoạn cuối (bỏ phần đệm cuối nếu biết)."""
+        self._phan_tich_khung()
+        if len(self._khung) > self._khung_ke_tiep:
+            self._cat_doan(len(self._khung), bo_mau_cuoi=max(0, self._dem_cuoi - TRE_GIAI_MA))
+        self._da_nhan_het = True
+
+    def _phan_tich_khung(self):
+        du_lieu = self.bo_dem.xem()
+        vi_tri = _bo_qua_id3(du_lieu, self._vi_tri_phan_tich)
+        while True:
+            tieu_de = doc_tieu_de_khung_mp3(du_lieu, vi_tri)
+            if tieu_de is None:
+                if vi_tri + 4 > len(du_lieu):
+                    break
+                vi_tri += 1 # Dò lại byte đồng bộ
+                continue
+            do_dai, so_mau, tan_so = tieu_de
+            if vi_tri + do_dai > len(du_lieu):
+                break # Khung chưa nhận đủ
+            thong_tin = doc_khung_thong_tin(du_lieu, vi_tri, do_dai) if not self._khung else None
+            if thong_tin is not None:
+                # Không đưa khung Xing/Info vào đoạn nào: bộ giải mã sẽ coi mỗi đoạn có khung này là cả luồng
+                # và tự cắt độ trễ/phần đệm ở giữa câu. Tự áp dụng ở đoạn đầu và đoạn cuối thay vào đó.
+                self._tre_ma_hoa, self._dem_cuoi = thong_tin
+            else:
+                self._khung.append((vi_tri, do_dai, so_mau, tan_so))
+            vi_tri += do_dai
+        self._vi_tri_phan_tich = vi_tri
+        du_lieu.release()
+
+    def _cat_doan(self, den_khung, bo_mau_cuoi=0):
+        bat_dau = self._khung_ke_tiep
+        bat_dau_giai_ma = max(0, bat_dau - KHUNG_CHONG_LAP)
+        vi_tri_dau = self._khung[bat_dau_giai_ma][0]
+        vi_tri_cuoi = self._khung[den_khung - 1][0] + self._khung[den_khung - 1][1]
+        sound = tao_sound_tu_mp3(bytes(self.bo_dem.xem(vi_tri_dau, vi_tri_cuoi)))
+
+        bo_mau_dau = self._tre_ma_hoa if bat_dau == 0 else 0
+        if bat_dau_giai_ma < bat_dau or bo_mau_dau or bo_mau_cuoi:
+            # Giữ đúng số mẫu của các khung thuộc đoạn, tính từ cuối: bộ giải mã có thể bỏ hoặc trả thiếu
+            # mẫu ở các khung chồng lấp đầu đoạn (thiếu bit reservoir), còn phần cuối đoạn luôn đủ.
+            # Các đoạn vì vậy nối khít nhau, không lệch vài mẫu gây tiếng tách ở chỗ nối.
+            tan_so_mixer, kich_thuoc_mau, so_kenh = pygame.mixer.get_init()
+            tan_so_nguon = self._khung[bat_dau][3]
+            ti_le = tan_so_mixer / tan_so_nguon
+            so_byte_moi_mau = so_kenh * (abs(kich_thuoc_mau) // 8)
+            so_mau_doan = sum(self._khung[i][2] for i in range(bat_dau, den_khung))
+            so_mau_giu = max(0, so_mau_doan - bo_mau_dau - bo_mau_cuoi)
+            pcm = sound.get_raw()
+            ket_thuc = max(0, len(pcm) - round(bo_mau_cuoi * ti_le) * so_byte_moi_mau)
+            bat_dau_giu = max(0, ket_thuc - round(so_mau_giu * ti_le) * so_byte_moi_mau)
+            if bat_dau_giu > 0 or ket_thuc < len(pcm):
+                sound = pygame.mixer.Sound(buffer=pcm[bat_dau_giu:ket_thuc])
+
+        self._khung_ke_tiep = den_khung
+        with self._khoa:
+            if not self._da_dung:
+                self._hang_cho.append(sound)
+
+    def bom(self):
+        """Đẩy đoạn kế tiếp vào kênh khi kênh còn chỗ. Trả về True nếu còn đang (hoặc sẽ) phát."""
+        with self._khoa:
+            if self._da_dung:
+                return False
+            if self._hang_cho:
+                if self._channel is None or not self._channel.get_busy():
+                    self._channel = self._hang_cho.popleft().play()
+                    self.da_phat = True
+                elif self._channel.get_queue() is None:
+                    self._channel.queue(self._hang_cho.popleft())
+            dang_phat = self._channel is not None and self._channel.get_busy()
+            return dang_phat or bool(self._hang_cho) or not self._da_nhan_het
+
+    def dung(self):
+        """Dừng phát và bỏ các đoạn còn chờ; an toàn khi gọi từ luồng khác trong lúc bom() đang chạy."""
+        with self._khoa:
+            self._da_dung = True
+            self._hang_cho.clear()
+            if self._channel is not None:
+                self._channel.stop()
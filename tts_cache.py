@@ -0,0 +1,113 @@
+# tts_cache.py
+import hashlib
+import os
+import tempfile
+import threading
+
+from text_utils import chuan_hoa_van_ban
+
+THU_MUC_CACHE_TTS = os.path.join("data", "tts_cache")
+DUNG_LUONG_TOI_DA_TTS = 200 * 1024 * 1024  # 200 MB
+DUOI_TEP_AM_THANH = ".mp3"
+
+
+class BoNhoDemTTS:
+    """
+    Bộ nhớ đệm âm thanh TTS trên đĩa, khóa theo (giọng đọc, văn bản đã chuẩn hóa).
+    Khi tổng dung lượng vượt giới hạn, các file lâu không dùng nhất (mtime cũ nhất) bị xóa trước.
+    """
+    def __init__(self, thu_muc=THU_MUC_CACHE_TTS, dung_luong_toi_da=DUNG_LUONG_TOI_DA_TTS):
+        self.thu_muc = os.path.abspath(thu_muc)
+        self.dung_luong_toi_da = dung_luong_toi_da
+        self._khoa = threading.Lock()
+        self._tong_dung_luong = None
+
+    def tao_khoa(self, giong_doc, van_ban):
+        noi_dung = f"{giong_doc}\0{chuan_hoa_van_ban(van_ban)}".encode("utf-8")
+        return hashlib.sha256(noi_dung).hexdigest()
+
+    def _duong_dan(self, giong_doc, van_ban):
+        return os.path.join(self.thu_muc, self.tao_khoa(giong_doc, van_ban) + DUOI_TEP_AM_THANH)
+
+    def co(self, giong_doc, van_ban):
+        return os.path.exists(self._duong_dan(giong_doc, van_ban))
+
+    def lay(self, giong_doc, van_ban):
+        """Trả về bytes âm thanh nếu có trong bộ nhớ đệm, ngược lại trả về None."""
+        duong_dan = self._duong_dan(giong_doc, van_ban)
+        try:
+            with open(duong_dan, "rb") as f:
+                du_lieu = f.read()
+        except OSError:
+            return None
+        if not du_lieu:
+            return None
+        try:
+            os.utime(duong_dan, None)  # Đánh dấu vừa dùng cho LRU
+        except OSError:
+            pass
+        return du_lieu
+
+    def luu(self, giong_doc, van_ban, du_lieu):
+        if not du_lieu:
+            return
+        duong_dan = self._duong_dan(giong_doc, van_ban)
+        os.makedirs(self.thu_muc, exist_ok=True)
+        fd, duong_dan_tam = tempfile.mkstemp(dir=self.thu_muc, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(du_lieu)
+            with self._khoa:
+                kich_thuoc_cu = os.path.getsize(duong_dan) if os.path.exists(duong_dan) else 0
+                os.replace(duong_dan_tam, duong_dan)
+                if self._tong_dung_luong is not None:
+                    self._tong_dung_luong += len(du_lieu) - kich_thuoc_cu
+        finally:
+            if os.path.exists(duong_dan_tam):
+                os.remove(duong_dan_tam)
+        self._don_dep_neu_can()
+
+    def _quet_thu_muc(self):
+        cac_tep = []
+        if not os.path.isdir(self.thu_muc):
+            return cac_tep
+        with os.scandir(self.thu_muc) as cac_muc:
+            for muc in cac_muc:
+                if not muc.is_file() or not muc.name.endswith(DUOI_TEP_AM_THANH):
+                    continue
+                try:
+                    thong_tin = muc.stat()
+                except OSError:
+                    continue
+                cac_tep.append((thong_tin.st_mtime, thong_tin.st_size, muc.path))
+        return cac_tep
+
+    def _don_dep_neu_can(self):
+        with self._khoa:
+            if self._tong_dung_luong is None:
+                self._tong_dung_luong = sum(kich_thuoc for _, kich_thuoc, _ in self._quet_thu_muc())
+            if self._tong_dung_luong <= self.dung_luong_toi_da:
+                return
+
+            cac_tep = sorted(self._quet_thu_muc())
+            tong = sum(kich_thuoc for _, kich_thuoc, _ in cac_tep)
+            for _, kich_thuoc, duong_dan in cac_tep:
+                if tong <= self.dung_luong_toi_da:
+                    break
+                try:
+                    os.remove(duong_dan)
+                    tong -= kich_thuoc
+                except OSError:
+                    pass
+            self._tong_dung_luong = tong
+
+
+_bo_nho_dem_tts = None
+
+
+def lay_bo_nho_dem_tts():
+    """Trả về bộ nhớ đệm TTS dùng chung cho toàn ứng dụng."""
+    global _bo_nho_dem_tts
+    if _bo_nho_dem_tts is None:
+        _bo_nho_dem_tts = BoNhoDemTTS()
+    return _bo_nho_dem_tts
@@ -0,0 +1,81 @@
+# tts_prepare.py
+import asyncio
+import time
+
+SO_YEU_CAU_DONG_THOI = 4
+KHOANG_CACH_TOI_THIEU_GIAY = 0.25  # Giới hạn tốc độ: tối đa 4 yêu cầu TTS mới mỗi giây
+
+
+class GioiHanToc:
+    """Giới hạn tốc độ đơn giản: hai lần bắt đầu yêu cầu cách nhau ít nhất khoang_cach giây."""
+    def __init__(self, khoang_cach):
+        self.khoang_cach = khoang_cach
+        self._lan_ke_tiep = 0.0
+        self._khoa = asyncio.Lock()
+
+    async def cho(self):
+        async with self._khoa:
+            bay_gio = time.monotonic()
+            if bay_gio < self._lan_ke_tiep:
+                await asyncio.sleep(self._lan_ke_tiep - bay_gio)
+                bay_gio = time.monotonic()
+            self._lan_ke_tiep = bay_gio + self.khoang_cach
+
+
+async def chuan_bi_am_thanh(cac_muc, tong_hop, bo_nho_dem,
+                            so_dong_thoi=SO_YEU_CAU_DONG_THOI,
+                            khoang_cach_toi_thieu=KHOANG_CACH_TOI_THIEU_GIAY,
+                            bao_tien_do=None):
+    """
+    Tổng hợp trước âm thanh cho danh sách (văn bản, giọng đọc) và lưu vào bộ nhớ đệm TTS.
+
+    tong_hop là coroutine function (van_ban, giong_doc) -> bytes, có thể thay bằng hàm gọi
+    tới một máy chủ TTS giả lập khi kiểm thử. Các mục đã có trong bộ nhớ đệm hoặc bị trùng
+    được bỏ qua. Thứ tự bắt đầu giữ đúng thứ tự danh sách để thẻ đầu tiên sẵn sàng sớm nhất.
+    Hủy task đang chạy hàm này sẽ hủy mọi yêu cầu còn dở. Trả về (số thành công, số lỗi).
+    """
+    da_gap = set()
+    can_lam = []
+    for van_ban, giong_doc in cac_muc:
+        if not van_ban or not van_ban.strip():
+            continue
+        khoa = bo_nho_dem.tao_khoa(giong_doc, van_ban)
+        if khoa in da_gap:
+            continue
+        da_gap.add(khoa)
+        can_lam.append((van_ban, giong_doc))
+
+    tong_so = len(can_lam)
+    da_xong = 0
+    thanh_cong = 0
+    that_bai = 0
+    if bao_tien_do:
+        bao_tien_do(0, tong_so)
+
+    gioi_han_dong_thoi = asyncio.Semaphore(max(1, so_dong_thoi))
+    gioi_han_toc = GioiHanToc(khoang_cach_toi_thieu)
+
+    async def xu_ly(van_ban, giong_doc):
+        nonlocal da_xong, thanh_cong, that_bai
+        async with gioi_han_dong_thoi:
+            try:
+                if not bo_nho_dem.co(giong_doc, van_ban):
+                    await gioi_han_toc.cho()
+                    du_lieu = await tong_hop(van_ban, giong_doc)
+                    bo_nho_dem.luu(giong_doc, van_ban, du_lieu)
+                thanh_cong += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                that_bai += 1
+            da_xong += 1
+            if bao_tien_do:
+                bao_tien_do(da_xong, tong_so)
+
+    cac_task = [asyncio.ensure_future(xu_ly(van_ban, giong_doc)) for van_ban, giong_doc in can_lam]
+    try:
+        await asyncio.gather(*cac_task)
+    finally:
+        for task in cac_task:
+            task.cancel()
+    return thanh_cong, that_bai
@@ -0,0 +1,188 @@
+# whisper_models.py
+import contextlib
+import os
+import threading
+import time
+
+from asr_backends import BO_MAY_MAC_DINH, lay_bo_may
+
+TEN_MO_HINH_MAC_DINH = os.environ.get("ZENTASK_WHISPER_MODEL", "base")  # "tiny", "base", "small", "medium", "large"
+THOI_GIAN_NHAN_ROI_GIAY = 15 * 60  # Không dùng quá 15 phút thì giải phóng mô hình khỏi bộ nhớ
+
+
+class QuanLyMoHinhWhisper:
+    """
+    Giữ mô hình Whisper trong bộ nhớ cho toàn ứng dụng: chỉ tải ở lần dùng đầu tiên (hoặc tải trước
+    trong nền), các video sau dùng lại ngay. Mô hình nhàn rỗi quá lâu sẽ được giải phóng.
+    Mô hình được phân biệt theo (bộ máy ASR, tên mô hình), xem asr_backends.
+    Pool tiến trình phiên âm song song (whisper_worker) cũng được giữ ở đây theo cùng thời gian nhàn rỗi.
+    """
+    def __init__(self, ten_mo_hinh=TEN_MO_HINH_MAC_DINH, thiet_bi=None, thoi_gian_nhan_roi=THOI_GIAN_NHAN_ROI_GIAY,
+                 bo_may=BO_MAY_MAC_DINH):
+        self.ten_mo_hinh = ten_mo_hinh
+        self.bo_may = bo_may
+        self.thiet_bi = thiet_bi  # None để bộ máy tự chọn (cuda nếu có)
+        self.so_luong = None  # Số luồng tính toán khi tải mô hình (tiến trình con); None để thư viện tự chọn
+        self.thoi_gian_nhan_roi = thoi_gian_nhan_roi
+        self._mo_hinh = {}  # (bộ máy, tên mô hình) -> mô hình đã tải
+        self._khoa = threading.Lock()
+        self._khoa_tai = {}  # Mỗi tên mô hình một khóa, để tải mô hình này không chặn mô hình khác
+        self._cac_pool = {}  # (bộ máy, tên mô hình, số tiến trình) -> [PoolPhienAm, số việc đang dùng]
+        self._dang_dung = 0
+        self._lan_dung_cuoi = time.monotonic()
+        self._hen_gio = None
+
+    def _khoa_tai_cho(self, ten):
+        with self._khoa:
+            return self._khoa_tai.setdefault(ten, threading.Lock())
+
+    def _khoa_mo_hinh(self, ten_mo_hinh, bo_may):
+        return (bo_may or self.bo_may, ten_mo_hinh or self.ten_mo_hinh)
+
+    def da_tai(self, ten_mo_hinh=None, bo_may=None):
+        return self._khoa_mo_hinh(ten_mo_hinh, bo_may) in self._mo_hinh
+
+    def lay_mo_hinh(self, ten_mo_hinh=None, bo_may=None):
+        """Trả về mô hình đã tải; tải từ đĩa nếu chưa có. Nhiều luồng gọi cùng lúc chỉ tải một lần."""
+        khoa = self._khoa_mo_hinh(ten_mo_hinh, bo_may)
+        mo_hinh = self._mo_hinh.get(khoa)
+        if mo_hinh is None:
+            with self._khoa_tai_cho(khoa):
+                mo_hinh = self._mo_hinh.get(khoa)
+                if mo_hinh is None:
+                    mo_hinh = lay_bo_may(khoa[0]).tai_mo_hinh(khoa[1], thiet_bi=self.thiet_bi, so_luong=self.so_luong)
+                    with self._khoa:
+                        self._mo_hinh[khoa] = mo_hinh
+        self._danh_dau_da_dung()
+        return mo_hinh
+
+    @contextlib.contextmanager
+    def su_dung(self, ten_mo_hinh=None, bo_may=None):
+        """Dùng mô hình trong khối with; mô hình không bị giải phóng khi đang được dùng."""
+        with self._khoa:
+            self._dang_dung += 1
+        try:
+            yield self.lay_mo_hinh(ten_mo_hinh, bo_may)
+        finally:
+            with self._khoa:
+                self._dang_dung -= 1
+            self._danh_dau_da_dung()
+
+    @contextlib.contextmanager
+    def su_dung_pool(self, so_tien_trinh, ten_mo_hinh=None, bo_may=None):
+        """
+        Dùng pool tiến trình phiên âm trong khối with. Pool và mô hình đã tải trong từng tiến trình con được
+        giữ lại cho các video sau; nhiều việc chạy cùng lúc dùng chung một pool nên không tranh nhau nhân CPU.
+        """
+        from whisper_worker import PoolPhienAm  # whisper_worker import module này
+        bo_may, ten = self._khoa_mo_hinh(ten_mo_hinh, bo_may)
+        khoa = (bo_may, ten, so_tien_trinh)
+        cac_pool_cu = []
+        with self._khoa:
+            muc = self._cac_pool.get(khoa)
+            if muc is None:
+                # Đổi mô hình hoặc bộ máy thì đóng các pool cũ không còn việc nào dùng
+                cac_pool_cu = self._lay_pool_nhan_roi()
+                so_luong = max(1, (os.cpu_count() or 1) // so_tien_trinh)
+                muc = self._cac_pool[khoa] = [PoolPhienAm(ten, bo_may, so_tien_trinh, so_luong), 0]
+            muc[1] += 1
+            self._dang_dung += 1
+        for pool_cu in cac_pool_cu:
+            pool_cu.dong()
+        try:
+            yield muc[0]
+        finally:
+            with self._khoa:
+                muc[1] -= 1
+                self._dang_dung -= 1
+            self._danh_dau_da_dung()
+
+    def dong_pool(self, pool):
+        """Bỏ một pool hỏng (vd: tiến trình con bị dừng đột ngột); lần dùng sau sẽ tạo pool mới."""
+        with self._khoa:
+            for khoa, (pool_da_luu, _) in list(self._cac_pool.items()):
+                if pool_da_luu is pool:
+                    del self._cac_pool[khoa]
+        pool.dong()
+
+    def _lay_pool_nhan_roi(self, khoa_mo_hinh=None):
+        """Lấy ra (khỏi danh sách) các pool không có việc nào dùng; gọi khi đang giữ self._khoa."""
+        cac_pool = []
+        for khoa, (pool, so_viec) in list(self._cac_pool.items()):
+            if so_viec == 0 and (khoa_mo_hinh is None or khoa[:2] == khoa_mo_hinh):
+                del self._cac_pool[khoa]
+                cac_pool.append(pool)
+        return cac_pool
+
+    def tai_truoc_nen(self, ten_mo_hinh=None, bo_may=None):
+        """Tải mô hình trên một luồng nền (vd: khi vừa mở hộp thoại phụ đề). Lỗi sẽ được báo lại ở lần dùng thật."""
+        bo_may, ten = self._khoa_mo_hinh(ten_mo_hinh, bo_may)
+        if (bo_may, ten) in self._mo_hinh:
+            self._danh_dau_da_dung()
+            return None
+
+        def tai():
+            try:
+                self.lay_mo_hinh(ten, bo_may)
+            except Exception as e:
+                print(f"Không thể tải trước mô hình {bo_may} '{ten}': {e}")
+
+        luong = threading.Thread(target=tai, name="TaiTruocWhisper", daemon=True)
+        luong.start()
+        return luong
+
+    def giai_phong(self, ten_mo_hinh=None, bo_may=None):
+        """Giải phóng một mô hình (hoặc tất cả nếu không truyền tên), kể cả pool tiến trình không còn dùng."""
+        with self._khoa:
+            if ten_mo_hinh is None:
+                self._mo_hinh.clear()
+                cac_pool = self._lay_pool_nhan_roi()
+            else:
+                khoa = self._khoa_mo_hinh(ten_mo_hinh, bo_may)
+                self._mo_hinh.pop(khoa, None)
+                cac_pool = self._lay_pool_nhan_roi(khoa)
+            if not self._mo_hinh and not self._cac_pool and self._hen_gio is not None:
+                self._hen_gio.cancel()
+                self._hen_gio = None
+        for pool in cac_pool:
+            pool.dong()
+
+    def _danh_dau_da_dung(self):
+        with self._khoa:
+            self._lan_dung_cuoi = time.monotonic()
+            if self.thoi_gian_nhan_roi is None or self._hen_gio is not None:
+                return
+            self._hen_gio = threading.Timer(self.thoi_gian_nhan_roi, self._kiem_tra_nhan_roi)
+            self._hen_gio.daemon = True
+            self._hen_gio.start()
+
+    def _kiem_tra_nhan_roi(self):
+        cac_pool = []
+        with self._khoa:
+            self._hen_gio = None
+            if not self._mo_hinh and not self._cac_pool:
+                return
+            con_lai = self._lan_dung_cuoi + self.thoi_gian_nhan_roi - time.monotonic()
+            if self._dang_dung == 0 and con_lai <= 0:
+                self._mo_hinh.clear()
+                cac_pool = self._lay_pool_nhan_roi()
+            else:
+                # Vẫn đang dùng hoặc vừa được dùng: hẹn kiểm tra lại
+                self._hen_gio = threading.Timer(max(con_lai, 1.0), self._kiem_tra_nhan_roi)
+                self._hen_gio.daemon = True
+                self._hen_gio.start()
+        for pool in cac_pool:
+            pool.dong()
+
+
+_quan_ly_whisper = None
+_khoa_quan_ly = threading.Lock()
+
+
+def lay_quan_ly_whisper():
+    """Trả về bộ quản lý mô hình Whisper dùng chung cho toàn ứng dụng."""
+    global _quan_ly_whisper
+    with _khoa_quan_ly:
+        if _quan_ly_whisper is None:
+            _quan_ly_whisper = QuanLyMoHinhWhisper()
+        return _quan_ly_whisper
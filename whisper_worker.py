@@ -0,0 +1,88 @@
+# whisper_worker.py
+"""
+Tiến trình con phiên âm cho pipeline phụ đề.
+
+Pool tiến trình (kiểu spawn) do bộ quản lý mô hình giữ lại giữa các video (xem
+QuanLyMoHinhWhisper.su_dung_pool); mỗi tiến trình tải mô hình một lần khi khởi động. Module này chỉ
+import numpy và bộ máy ASR, và tiến trình con được tạo qua _NguCanhPhienAm nên không chạy lại __main__ của
+ứng dụng (main.py với PyQt6, pygame, edge_tts...): tiến trình con khởi động nhanh và không nạp Qt.
+"""
+import concurrent.futures
+import threading
+from multiprocessing import context, spawn
+
+from asr_backends import lay_bo_may
+from whisper_models import lay_quan_ly_whisper
+
+_cuc_bo = threading.local()
+_lay_du_lieu_chuan_bi_goc = spawn.get_preparation_data
+
+
+def _lay_du_lieu_chuan_bi(ten):
+    """
+    Kiểu spawn gửi kèm __main__ của tiến trình cha để tiến trình con chạy lại nó. Chỉ với tiến trình đang được
+    _TienTrinhPhienAm tạo trên chính luồng này thì bỏ phần đó đi; mọi tiến trình khác giữ nguyên như cũ.
+    Tiến trình con vẫn nhận sys.path của cha nên import được _khoi_tao_tien_trinh và _phien_am_cua_so.
+    """
+    du_lieu = _lay_du_lieu_chuan_bi_goc(ten)
+    if getattr(_cuc_bo, "bo_qua_main", False):
+        du_lieu.pop("init_main_from_name", None)
+        du_lieu.pop("init_main_from_path", None)
+    return du_lieu
+
+
+spawn.get_preparation_data = _lay_du_lieu_chuan_bi
+
+
+class _TienTrinhPhienAm(context.SpawnProcess):
+    @staticmethod
+    def _Popen(tien_trinh):
+        # Popen chuẩn bị dữ liệu và khởi động tiến trình con ngay trên luồng gọi, nên cờ cục bộ theo luồng đủ
+        _cuc_bo.bo_qua_main = True
+        try:
+            return context.SpawnProcess._Popen(tien_trinh)
+        finally:
+            _cuc_bo.bo_qua_main = False
+
+
+class _NguCanhPhienAm(context.SpawnContext):
+    """Ngữ cảnh spawn riêng của pool phiên âm: tiến trình con chỉ import module này (xem _lay_du_lieu_chuan_bi)."""
+    Process = _TienTrinhPhienAm
+
+
+def _khoi_tao_tien_trinh(ten_mo_hinh, bo_may, so_luong):
+    # Mỗi tiến trình con tải mô hình một lần và giữ suốt vòng đời của pool
+    quan_ly = lay_quan_ly_whisper()
+    quan_ly.ten_mo_hinh = ten_mo_hinh
+    quan_ly.bo_may = bo_may
+    quan_ly.so_luong = so_luong
+    quan_ly.thoi_gian_nhan_roi = None
+    quan_ly.lay_mo_hinh()
+
+
+def _phien_am_cua_so(chi_so, mau, ngon_ngu):
+    quan_ly = lay_quan_ly_whisper()
+    return chi_so, lay_bo_may(quan_ly.bo_may).phien_am(quan_ly.lay_mo_hinh(), mau, ngon_ngu)
+
+
+class PoolPhienAm:
+    """
+    Pool tiến trình phiên âm một mô hình. Tiến trình con chỉ được tạo khi gửi việc (ProcessPoolExecutor
+    tạo dần tới so_tien_trinh), luôn qua _NguCanhPhienAm dù được tạo từ luồng nào.
+    """
+    def __init__(self, ten_mo_hinh, bo_may, so_tien_trinh, so_luong):
+        self.ten_mo_hinh = ten_mo_hinh
+        self.bo_may = bo_may
+        self.so_tien_trinh = so_tien_trinh
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=so_tien_trinh,
+            mp_context=_NguCanhPhienAm(),
+            initializer=_khoi_tao_tien_trinh,
+            initargs=(ten_mo_hinh, bo_may, so_luong))
+
+    def gui(self, chi_so, mau, ngon_ngu):
+        """Gửi một cửa sổ âm thanh; Future trả về (chi_so, các đoạn với mốc thời gian tương đối)."""
+        return self._pool.submit(_phien_am_cua_so, chi_so, mau, ngon_ngu)
+
+    def dong(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)